@@ -1,5 +1,7 @@
 import streamlit as st
 
+import instrumentation
+
 # Configure page
 st.set_page_config(
     page_title="CO₂ and Harmful Gas Emissions Analysis",
@@ -7,6 +9,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# Hidden diagnostics view with the stage timings of all pages
+if st.query_params.get("diagnostics"):
+    instrumentation.render_diagnostics()
+    st.stop()
+
 # Title
 st.title("🌍 CO₂ and Harmful Gas Emissions Analysis")
 
@@ -0,0 +1,201 @@
+"""Headless benchmark of the Streamlit app.
+
+Every page runs in its own fresh process through Streamlit's AppTest: one cold render, a number of
+warm reruns and a rerun for several values of every slider, select slider and selectbox.
+Latencies (median and p95) and the peak RSS of each page are written to a JSON file, so two
+commits can be compared with a plain diff.
+
+    python streamlit/benchmark.py --output benchmark.json
+    python streamlit/benchmark.py pages/5_CO2_visualization.py --repeat 10
+
+Pages with a country group picker run on Europe unless `--scope` names another group; with
+`--baseline` the latencies are printed next to those of an earlier run, e.g. the Europe run:
+
+    python streamlit/benchmark.py --scope World --baseline benchmark.json --output world.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import numpy as np
+import multiprocessing as mp
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+APP_DIR = Path(__file__).resolve().parent
+MAIN_SCRIPT = APP_DIR / "CO2_streamlit.py"
+
+# Widgets that are changed to measure interaction latency
+WIDGET_KINDS = ("slider", "select_slider", "selectbox")
+
+
+def default_scripts():
+    return [MAIN_SCRIPT] + sorted(APP_DIR.glob("pages/*.py"), key=lambda path: int(path.name.split("_")[0]))
+
+
+def latency(seconds):
+    seconds = np.asarray(seconds)
+    return {
+        "n": int(seconds.size),
+        "median_s": round(float(np.median(seconds)), 4),
+        "p95_s": round(float(np.percentile(seconds, 95)), 4),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+
+
+def _timed_run(at, timeout):
+    start = time.perf_counter()
+    at.run(timeout=timeout)
+    return time.perf_counter() - start
+
+
+def _candidate_values(widget, count):
+    """Up to `count` values to set on a widget, other than its current value."""
+    if widget.type == "slider":
+        low, high, step = widget.min, widget.max, widget.step or 1
+        middle = low + step * round((high - low) / step / 2)
+        if isinstance(widget.value, (list, tuple)):
+            values = [[low, high], [middle, high], [low, middle]]
+        else:
+            values = [low, middle, high]
+        return [value for value in values if list(np.atleast_1d(value)) != list(np.atleast_1d(widget.value))][:count]
+
+    # Selectboxes and select sliders only know the formatted labels of their options. The label can
+    # be sent back as value when formatting it again leaves it unchanged (plain strings, numbers),
+    # and `dict.get` formatters can be inverted through their dict; other lookups cannot be set from here.
+    format_func = widget.format_func
+    mapping = getattr(format_func, "__self__", None)
+    if isinstance(mapping, dict):
+        raw = {str(format_func(key)): key for key in mapping}
+    else:
+        raw = {option: option for option in widget.options}
+    try:
+        if not all(option in raw and str(format_func(raw[option])) == option for option in widget.options):
+            return None
+    except Exception:
+        return None
+    current = str(format_func(widget.value))
+    others = [raw[option] for option in widget.options if option != current]
+    picks = np.unique(np.linspace(0, len(others) - 1, min(count, len(others))).round().astype(int))
+    return [others[i] for i in picks] if others else []
+
+
+def benchmark_script(script, repeat=5, values=3, timeout=600, scope=None):
+    """Benchmark one page; meant to run in a fresh process so the first render is cold."""
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, str(APP_DIR))
+    result = {"errors": [], "interactions": {}, "skipped_widgets": []}
+
+    at = AppTest.from_file(str(script), default_timeout=timeout)
+    if scope:
+        # Read by world_scale.select_scope, as if the user had picked it on an earlier page
+        at.session_state["scope"] = scope
+    result["cold_s"] = round(_timed_run(at, timeout), 4)
+    result["errors"] += [str(error.value) for error in at.exception]
+
+    result["warm"] = latency([_timed_run(at, timeout) for _ in range(repeat)])
+
+    widgets = [(kind, i, widget.label) for kind in WIDGET_KINDS for i, widget in enumerate(getattr(at, kind))]
+    for kind, i, label in widgets:
+        name = f"{kind}[{i}]:{label}"
+        found = getattr(at, kind)
+        if i >= len(found) or found[i].label != label:
+            result["skipped_widgets"].append({"widget": name, "reason": "not rendered after earlier interactions"})
+            continue
+
+        original = found[i].value
+        candidates = _candidate_values(found[i], values)
+        if not candidates:
+            reason = "no other values" if candidates == [] else "options use a format_func that cannot be inverted"
+            result["skipped_widgets"].append({"widget": name, "reason": reason})
+            continue
+
+        seconds = []
+        for _ in range(repeat):
+            for value in candidates:
+                getattr(at, kind)[i].set_value(value)
+                seconds.append(_timed_run(at, timeout))
+                result["errors"] += [f"{name}={value}: {error.value}" for error in at.exception]
+        result["interactions"][name] = latency(seconds)
+
+        # Back to the default state before the next widget
+        getattr(at, kind)[i].set_value(original)
+        at.run(timeout=timeout)
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(page, baseline):
+    """'cold 2.1x, warm 1.3x' of a page against the same page in a baseline report."""
+    ratios = []
+    for label, now, before in [("cold", page["cold_s"], baseline["cold_s"]),
+                               ("warm", page["warm"]["median_s"], baseline["warm"]["median_s"])]:
+        ratios.append(f"{label} {now / before:.1f}x" if before else f"{label} n/a")
+    return ", ".join(ratios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("scripts", nargs="*", help="Scripts relative to streamlit/ (default: all pages)")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to write")
+    parser.add_argument("--repeat", type=int, default=5, help="Warm reruns and rounds over widget values")
+    parser.add_argument("--values", type=int, default=3, help="Values tried per widget")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed for a single rerun")
+    parser.add_argument("--scope", help="Country group of the pages that have a picker (default: Europe)")
+    parser.add_argument("--baseline", help="Earlier report to compare the latencies with")
+    args = parser.parse_args()
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["pages"] if args.baseline else {}
+
+    scripts = [APP_DIR / script for script in args.scripts] or default_scripts()
+
+    # Keep the benchmark processes from competing for the metrics port of a running app, and
+    # measure pages without the background cache warm-up running next to them
+    os.environ.setdefault("CO2_METRICS_PORT", "0")
+    os.environ.setdefault("CO2_WARMUP", "0")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "scope": args.scope or "Europe",
+        "pages": {},
+    }
+    # One page at a time, each in a new process, so timings do not overlap and RSS is per page
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"), max_tasks_per_child=1) as pool:
+        for script in scripts:
+            name = str(script.relative_to(APP_DIR))
+            page = pool.submit(benchmark_script, script, args.repeat, args.values, args.timeout, args.scope).result()
+            report["pages"][name] = page
+            print(f"{name}: cold {page['cold_s']:.2f} s, warm median {page['warm']['median_s']:.2f} s, "
+                  f"{len(page['interactions'])} widgets, peak RSS {page['peak_rss_mb']:.0f} MB"
+                  + (f", {len(page['errors'])} errors" if page["errors"] else "")
+                  + (f" ({compare(page, baseline[name])} of baseline)" if name in baseline else ""))
+
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
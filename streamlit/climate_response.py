@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import co2_data
+
+
+FIRST_YEAR, LAST_YEAR = 1970, 2023
+
+# Climate file region rows and the OWID regions they are made of
+CLIMATE_REGIONS = {
+    "AFRTMP": ["Africa"],
+    "AMETMP": ["North America", "South America"],
+    "ASIATMP": ["Asia"],
+    "EURTMP": ["Europe"],
+    "OCETMP": ["Oceania"],
+    "WLD": ["Africa", "North America", "South America", "Asia", "Europe", "Oceania"],
+}
+
+
+@lru_cache(maxsize=None)
+def response_panel():
+    """Cumulative CO₂ (kt since 1970) and temperature anomaly (°C) for every country and region.
+
+    Returns (names, years, cumulative, temperature) where the two matrices are
+    entities x years and share the row order of `names` (indexed by ISO3 / region code).
+    """
+    years = [str(y) for y in range(FIRST_YEAR, LAST_YEAR + 1)]
+
+    df_co2 = co2_data.load_emissions()
+    co2 = df_co2.groupby('Country_code')[years].sum(min_count=1)
+
+    # Regions are the sum of their member countries
+    regions = co2_data.owid_regions(co2_data.load_gdp())
+    for code, members in CLIMATE_REGIONS.items():
+        member_codes = regions[regions.isin(members)].index
+        co2.loc[code] = co2.reindex(member_codes)[years].sum()
+
+    df_climate = co2_data.load_climate().set_index('ISO3')
+    temperature = df_climate[years].apply(pd.to_numeric, errors='coerce')
+
+    codes = co2.index.intersection(temperature.index)
+    cumulative = co2.loc[codes].fillna(0).cumsum(axis=1).to_numpy()
+    temperature = temperature.loc[codes].to_numpy()
+    names = df_climate.loc[codes, 'Country']
+    return names, np.array(years, dtype=int), cumulative, temperature
+
+
+def ols(x, y):
+    """Intercept, slope and correlation of y ~ x along the last axis, ignoring NaN pairs."""
+    mask = np.isfinite(x) & np.isfinite(y)
+    n = mask.sum(axis=-1)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = x.sum(axis=-1) / n
+        y_mean = y.sum(axis=-1) / n
+        dx = np.where(mask, x - x_mean[..., None], 0.0)
+        dy = np.where(mask, y - y_mean[..., None], 0.0)
+        sxx = (dx * dx).sum(axis=-1)
+        sxy = (dx * dy).sum(axis=-1)
+        syy = (dy * dy).sum(axis=-1)
+        slope = sxy / sxx
+        r = sxy / np.sqrt(sxx * syy)
+    return y_mean - slope * x_mean, slope, r
+
+
+def block_indices(n, block_length, n_draws, rng):
+    """Moving-block bootstrap: (n_draws x n) year indices made of consecutive blocks."""
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n - block_length + 1, size=(n_draws, n_blocks))
+    idx = starts[:, :, None] + np.arange(block_length)
+    return idx.reshape(n_draws, -1)[:, :n]
+
+
+def _bootstrap_chunk(x, y, block_length, n_draws, seed):
+    """Worker: bootstrap intercepts, slopes and correlations for every entity at once."""
+    rng = np.random.default_rng(seed)
+    idx = block_indices(x.shape[1], block_length, n_draws, rng)
+    # entities x draws x years, in batches of 100 draws to bound memory
+    batches = [ols(x[:, idx[i:i + 100]], y[:, idx[i:i + 100]]) for i in range(0, n_draws, 100)]
+    return tuple(np.concatenate(parts, axis=1) for parts in zip(*batches))
+
+
+def bootstrap_draws(x, y, block_length=5, n_draws=1000, seed=0, workers=None):
+    """Run the block bootstrap in a process pool, one chunk of draws per worker."""
+    workers = workers or os.cpu_count() or 1
+    sizes = [len(chunk) for chunk in np.array_split(np.arange(n_draws), workers) if len(chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if len(sizes) == 1:
+        chunks = [_bootstrap_chunk(x, y, block_length, sizes[0], seeds[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(sizes)) as pool:
+            chunks = list(pool.map(_bootstrap_chunk, [x] * len(sizes), [y] * len(sizes),
+                                   [block_length] * len(sizes), sizes, seeds))
+
+    return tuple(np.concatenate(parts, axis=1) for parts in zip(*chunks))
+
+
+@lru_cache(maxsize=None)
+def cached_draws(block_length=5, n_draws=1000, seed=0):
+    """Bootstrap draws for all entities, stored on disk once per data version."""
+    version = co2_data.data_version(co2_data.CO2_PATH, co2_data.GDP_PATH, co2_data.CLIMATE_PATH)
+    path = co2_data.CACHE_DIR / f"climate_bootstrap_{version}_{block_length}_{n_draws}_{seed}.npz"
+    if path.exists():
+        with np.load(path) as cached:
+            return cached['intercept'], cached['slope'], cached['r']
+
+    _, _, cumulative, temperature = response_panel()
+    intercept, slope, r = bootstrap_draws(cumulative, temperature, block_length, n_draws, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, intercept=intercept, slope=slope, r=r)
+    return intercept, slope, r
+
+
+@lru_cache(maxsize=None)
+def response_summary(block_length=5, n_draws=1000, confidence=0.95):
+    """Slope (°C per Gt of cumulative CO₂) and correlation with bootstrap intervals per entity."""
+    names, _, cumulative, temperature = response_panel()
+    # kt -> Gt so the slopes are readable
+    intercept, slope, r = ols(cumulative / 1e6, temperature)
+    _, slope_draws, r_draws = cached_draws(block_length, n_draws)
+    q = [50 * (1 - confidence), 50 * (1 + confidence)]
+    slope_low, slope_high = np.nanpercentile(slope_draws * 1e6, q, axis=1)
+    r_low, r_high = np.nanpercentile(r_draws, q, axis=1)
+
+    return pd.DataFrame({
+        "Name": names.to_numpy(),
+        "is_region": names.index.isin(list(CLIMATE_REGIONS)),
+        "intercept": intercept,
+        "slope": slope,
+        "slope_low": slope_low,
+        "slope_high": slope_high,
+        "r": r,
+        "r_low": r_low,
+        "r_high": r_high,
+    }, index=names.index).dropna(subset=["slope"])
+
+
+def regression_band(code, block_length=5, n_draws=1000, confidence=0.95, points=50):
+    """Fitted line and bootstrap band (in Gt of cumulative CO₂) for one entity."""
+    names, years, cumulative, temperature = response_panel()
+    row = names.index.get_loc(code)
+    intercept_draws, slope_draws, _ = cached_draws(block_length, n_draws)
+
+    x = cumulative[row] / 1e6
+    grid = np.linspace(np.nanmin(x), np.nanmax(x), points)
+    lines = intercept_draws[row][:, None] + slope_draws[row][:, None] * 1e6 * grid
+    q = [50 * (1 - confidence), 50 * (1 + confidence)]
+    low, high = np.nanpercentile(lines, q, axis=0)
+
+    intercept, slope, _ = ols(x, temperature[row])
+    observed = pd.DataFrame({"cumulative_gt": x, "temperature": temperature[row]}, index=years)
+    band = pd.DataFrame({"fitted": intercept + slope * grid, "low": low, "high": high}, index=grid)
+    return observed, band
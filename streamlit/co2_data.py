@@ -0,0 +1,163 @@
+import hashlib
+import threading
+import pandas as pd
+
+from functools import lru_cache
+from pathlib import Path
+
+from data_paths import (DATA_DIR, CACHE_DIR, CO2_PATH, SECTORS_PATH, GDP_PATH, POPULATION_PATH, CLIMATE_PATH,
+                        WORLD_PATH)
+
+# OWID column names used by the GDP panel
+CO2_PER_CAPITA = "Annual CO₂ emissions (per capita)"
+GDP_PER_CAPITA = "GDP per capita"
+
+# Country groups the pages can run on: Europe as the pages were written, the whole world or one
+# OWID world region
+SCOPES = ("Europe", "World", "Africa", "Asia", "North America", "South America", "Oceania")
+
+# Rows of the emissions table that are not countries
+INTERNATIONAL_CODES = ("AIR", "SEA")
+
+
+@lru_cache(maxsize=None)
+def _file_hash(path, mtime_ns, size):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def data_version(*paths):
+    """Short content hash of the given data files, used to key on-disk caches."""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = Path(path).stat()
+        digest.update(_file_hash(str(path), stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()[:12]
+
+
+def year_columns(df):
+    """Return the year columns ('1970', ..., '2023') of a wide emissions frame."""
+    return [col for col in df.columns if col.isdigit()]
+
+
+def _shared_frame(name):
+    # Imported here, shared_data imports this module
+    import shared_data
+
+    return shared_data.frame(name)
+
+
+def load_emissions():
+    df = _shared_frame("emissions")
+    return df if df is not None else pd.read_csv(CO2_PATH)
+
+
+def load_sectors():
+    df = _shared_frame("sectors")
+    return df if df is not None else pd.read_csv(SECTORS_PATH)
+
+
+def load_gdp():
+    df = _shared_frame("gdp")
+    return df if df is not None else pd.read_csv(GDP_PATH)
+
+
+def load_population():
+    df = _shared_frame("population")
+    return df if df is not None else pd.read_csv(POPULATION_PATH)
+
+
+def load_climate():
+    return pd.read_csv(CLIMATE_PATH)
+
+
+# Held while the geo stack is imported: the warm-up thread and a page importing it at the same time
+# can see a half-initialised package
+_geo_import_lock = threading.Lock()
+
+
+def import_geopandas():
+    """geopandas with its shapefile reader and projections, imported by one thread at a time."""
+    with _geo_import_lock:
+        import geopandas
+        import pyogrio
+        import pyproj
+    return geopandas
+
+
+def read_world():
+    """Natural Earth country shapes from the shapefile."""
+    # geopandas is only imported by the pages that draw maps
+    return import_geopandas().read_file(WORLD_PATH)
+
+
+@lru_cache(maxsize=None)
+def load_world():
+    """Natural Earth country shapes, once per process and from the shared datasets when they are
+    published; treat the result as read-only."""
+    import shared_data
+
+    world = shared_data.world()
+    return world if world is not None else read_world()
+
+
+def europe_emissions(df_co2):
+    """Filter the emissions table to Europe the same way every page does."""
+
+    # Filtering the data only for European countries
+    df_co2_europe = df_co2[df_co2['Region'].str.contains('Europe', case=False, na=False)]
+
+    # Add Russia, Ukraine, Belarus and Moldova which are not in a European region
+    df_russia = df_co2[df_co2['Name'].str.contains('Russian Federation', case=False, na=False)].copy()
+    df_russia['Name'] = 'Russia'
+    df_ukraine = df_co2[df_co2['Name'].str.contains('Ukraine', case=False, na=False)].copy()
+    df_belarus = df_co2[df_co2['Name'].str.contains('Belarus', case=False, na=False)].copy()
+    df_moldova = df_co2[df_co2['Name'].str.contains('Moldova', case=False, na=False)].copy()
+    df_moldova['Name'] = 'Moldova'
+
+    df_co2_europe = pd.concat([df_co2_europe, df_russia, df_ukraine, df_belarus, df_moldova]).drop_duplicates()
+    return split_serbia_montenegro(df_co2_europe)
+
+
+def split_serbia_montenegro(df_co2):
+    """Replace the joint Serbia and Montenegro row by one row each, split 96% / 4%."""
+    row = df_co2[df_co2['Name'] == 'Serbia and Montenegro'].copy()
+    years = year_columns(df_co2)
+    serbia_row = row.copy()
+    serbia_row['Country_code'] = 'SRB'
+    serbia_row['Name'] = 'Serbia'
+    serbia_row[years] = row[years] * 0.96
+    montenegro_row = row.copy()
+    montenegro_row['Country_code'] = 'MNE'
+    montenegro_row['Name'] = 'Montenegro'
+    montenegro_row[years] = row[years] * 0.04
+
+    df_co2 = df_co2[df_co2['Name'] != 'Serbia and Montenegro']
+    return pd.concat([df_co2, serbia_row, montenegro_row], ignore_index=True)
+
+
+def world_emissions(df_co2):
+    """Every country of the emissions table: no international aviation and shipping, Serbia and
+    Montenegro split like in `europe_emissions`."""
+    return split_serbia_montenegro(df_co2[~df_co2['Country_code'].isin(INTERNATIONAL_CODES)])
+
+
+def scope_emissions(df_co2, scope="Europe"):
+    """Emissions of the countries in `scope`: 'Europe' as on every page, 'World' or an OWID region."""
+    if scope == "Europe":
+        return europe_emissions(df_co2)
+    df_world = world_emissions(df_co2)
+    if scope == "World":
+        return df_world
+    regions = owid_regions(load_gdp())
+    return df_world[df_world['Country_code'].map(regions) == scope].reset_index(drop=True)
+
+
+def owid_countries(df_gdp):
+    """Keep country rows of the OWID panel (drops continents, income groups and 'World')."""
+    return df_gdp[df_gdp['Code'].notna() & (df_gdp['Entity'] != 'World')]
+
+
+def owid_regions(df_gdp):
+    """Map country code -> OWID world region ('Europe', 'Asia', ...)."""
+    regions = df_gdp.dropna(subset=['World regions according to OWID'])
+    return regions.groupby('Code')['World regions according to OWID'].first()
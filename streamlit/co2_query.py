@@ -0,0 +1,233 @@
+"""Country and year lookups on the emission data without re-deriving data frames.
+
+Every country of the emissions table (Serbia and Montenegro split, no international aviation and
+shipping) is one row and every year 1970–2023 one column of a few arrays built once per process:
+total emissions, population, GDP and the sector breakdown. A country code or name gives its row
+through a dict and a year its column by subtraction, so lookups don't search the table. Derived
+metrics (per capita, per GDP, means over a year range) are computed once and memoized.
+
+    import co2_query
+
+    co2_query.emissions(["DEU", "FRA"], range(2000, 2011), per="capita")
+    co2_query.rank("per_gdp", (1990, 2023), k=10)
+    co2_query.series("Germany")
+
+The app pages, `data_api` and `shared_data` use it. It is a module of the app, not an installed
+package. The notebooks in the repository root keep their own CSV loading: their saved outputs were
+produced that way. Arrays returned here are shared between callers and read-only.
+"""
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+import co2_data
+import shared_data
+import sector_correlation
+import world_scale
+
+FIRST_YEAR, LAST_YEAR = 1970, 2023
+
+METRICS = {
+    "total": "Total CO₂ emissions (kt)",
+    "per_capita": "CO₂ emissions per capita (t)",
+    "per_gdp": "CO₂ emissions per million USD of GDP (t)",
+}
+
+# `per` argument of `emissions` -> metric
+PER = {None: "total", "capita": "per_capita", "gdp": "per_gdp"}
+
+
+@dataclass(frozen=True)
+class Table:
+    """Arrays of all countries, row i being `codes[i]` and column j the year FIRST_YEAR + j."""
+    codes: np.ndarray
+    names: np.ndarray
+    years: np.ndarray
+    rows: dict
+    total: np.ndarray
+    population: np.ndarray
+    gdp: np.ndarray
+    sectors: np.ndarray
+    sector_columns: dict
+    by_sector: np.ndarray
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def data_version():
+    return co2_data.data_version(co2_data.CO2_PATH, co2_data.SECTORS_PATH, co2_data.GDP_PATH)
+
+
+def build_table():
+    """The arrays behind every query, from the data files."""
+    df_co2 = co2_data.load_emissions()
+    df_world = co2_data.world_emissions(df_co2).sort_values('Country_code', ignore_index=True)
+    years = np.arange(FIRST_YEAR, LAST_YEAR + 1)
+    codes = df_world['Country_code'].to_numpy()
+    total = df_world[[str(year) for year in years]].to_numpy(dtype=float)
+
+    # The short names of the Europe pages ('Russia', 'Moldova') for every scope
+    names = df_world.set_index('Country_code')['Name']
+    europe = co2_data.europe_emissions(df_co2).drop_duplicates('Country_code').set_index('Country_code')['Name']
+    names.update(europe)
+
+    df_gdp = co2_data.owid_countries(co2_data.load_gdp())
+    df_gdp = df_gdp[df_gdp['Year'].between(FIRST_YEAR, LAST_YEAR)]
+    population = df_gdp.pivot_table(index='Code', columns='Year', values='Population (historical)') \
+        .reindex(index=codes, columns=years)
+    gdp_per_capita = df_gdp.pivot_table(index='Code', columns='Year', values=co2_data.GDP_PER_CAPITA) \
+        .reindex(index=codes, columns=years)
+
+    # Sector rows of Serbia and Montenegro are split like the totals
+    sector_names, sectors, sector_years, cube = sector_correlation.sector_cube()
+    sector_rows = {code: row for row, code in enumerate(sector_names.index)}
+    by_sector = np.full((len(codes), len(sectors), len(years)), np.nan)
+    shares = {'SRB': ('SCG', 0.96), 'MNE': ('SCG', 0.04)}
+    columns = np.searchsorted(years, sector_years)
+    for row, code in enumerate(codes):
+        source, share = shares.get(code, (code, 1.0))
+        if source in sector_rows:
+            by_sector[row][:, columns] = cube[sector_rows[source]] * share
+
+    return Table(
+        codes=_read_only(codes),
+        names=_read_only(names.reindex(codes).to_numpy()),
+        years=_read_only(years),
+        rows={**{code: row for row, code in enumerate(codes)},
+              **{name: row for row, name in enumerate(names.reindex(codes))}},
+        total=_read_only(total),
+        population=_read_only(population.to_numpy(dtype=float)),
+        gdp=_read_only((gdp_per_capita * population).to_numpy(dtype=float)),
+        sectors=_read_only(np.asarray(sectors)),
+        sector_columns={sector: column for column, sector in enumerate(sectors)},
+        by_sector=_read_only(by_sector),
+    )
+
+
+@lru_cache(maxsize=None)
+def table():
+    """The arrays behind every query: mapped from the shared datasets when they are published,
+    otherwise built once per process."""
+    shared = shared_data.attach("query")
+    if shared is None:
+        return build_table()
+    codes, names, sectors = shared["codes"], shared["names"], shared["sectors"]
+    return Table(
+        codes=codes, names=names, years=shared["years"],
+        rows={**{code: row for row, code in enumerate(codes)}, **{name: row for row, name in enumerate(names)}},
+        total=shared["total"], population=shared["population"], gdp=shared["gdp"],
+        sectors=sectors, sector_columns={sector: column for column, sector in enumerate(sectors)},
+        by_sector=shared["by_sector"],
+    )
+
+
+def row(country):
+    """Row of a country given by ISO code or name."""
+    try:
+        return table().rows[country]
+    except KeyError:
+        raise KeyError(f"Unknown country: {country!r}") from None
+
+
+def rows(countries=None):
+    """Rows of the given countries (codes or names), all of them for None."""
+    if countries is None:
+        return np.arange(len(table().codes))
+    if isinstance(countries, str):
+        countries = [countries]
+    return np.array([row(country) for country in countries], dtype=int)
+
+
+def columns(years=None):
+    """Columns of the given years, all of them for None; a (first, last) tuple is a closed range."""
+    if years is None:
+        return np.arange(LAST_YEAR - FIRST_YEAR + 1)
+    if isinstance(years, tuple):
+        years = range(years[0], years[1] + 1)
+    years = np.atleast_1d(np.asarray(years, dtype=int))
+    if years.size and (years.min() < FIRST_YEAR or years.max() > LAST_YEAR):
+        raise KeyError(f"Years outside {FIRST_YEAR}–{LAST_YEAR}")
+    return years - FIRST_YEAR
+
+
+def scope_codes(scope="Europe"):
+    """Country codes of a scope in the order of `co2_data.scope_emissions`."""
+    return tuple(co2_data.scope_emissions(co2_data.load_emissions(), scope)['Country_code'])
+
+
+@lru_cache(maxsize=None)
+def metric(name, sector=None):
+    """(countries x years) values of a metric, of one sector or of all of them; NaN where unknown."""
+    data = table()
+    if sector is None:
+        kt = data.total
+    elif sector in data.sector_columns:
+        kt = data.by_sector[:, data.sector_columns[sector]]
+    else:
+        raise KeyError(f"Unknown sector: {sector!r}")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if name == "total":
+            values = kt
+        elif name == "per_capita":
+            values = kt * 1_000 / data.population
+        elif name == "per_gdp":
+            values = kt * 1_000_000_000 / data.gdp
+        else:
+            raise ValueError(f"Unknown metric: {name!r}")
+    return _read_only(np.where(np.isfinite(values), values, np.nan))
+
+
+def emissions(countries=None, years=None, sector=None, per=None):
+    """(countries x years) array of emissions: kt, or t per person (per='capita') or per million USD
+    of GDP (per='gdp'). `countries` and `years` default to all of them."""
+    if per not in PER:
+        raise ValueError(f"per must be one of {', '.join(map(repr, PER))}")
+    return metric(PER[per], sector)[np.ix_(rows(countries), columns(years))]
+
+
+def frame(countries=None, years=None, sector=None, per=None):
+    """`emissions` as a wide frame like the emissions table: Country_code, Name and one column per year."""
+    selected = rows(countries)
+    values = emissions(countries, years, sector, per)
+    df = pd.DataFrame(values, columns=[str(FIRST_YEAR + column) for column in columns(years)])
+    df.insert(0, 'Name', table().names[selected])
+    df.insert(0, 'Country_code', table().codes[selected])
+    return df
+
+
+@lru_cache(maxsize=None)
+def period_mean(name, year_range=(FIRST_YEAR, LAST_YEAR), sector=None):
+    """Mean of a metric over a closed year range, one value per country; NaN without any data."""
+    values = metric(name, sector)[:, columns(tuple(year_range))]
+    counts = np.isfinite(values).sum(axis=1)
+    sums = np.nansum(values, axis=1)
+    return _read_only(np.where(counts > 0, sums / np.maximum(counts, 1), np.nan))
+
+
+def rank(name, year_range=(FIRST_YEAR, LAST_YEAR), k=10, largest=True, countries=None, sector=None):
+    """Top `k` countries (of all or of `countries`) by the mean of a metric over `year_range`."""
+    selected = rows(countries)
+    means = period_mean(name, tuple(year_range), sector)[selected]
+    picked = selected[world_scale.top_k(means, k, largest)]
+    return pd.DataFrame({
+        'Country_code': table().codes[picked],
+        'Name': table().names[picked],
+        name: period_mean(name, tuple(year_range), sector)[picked],
+    })
+
+
+def series(country, sector=None):
+    """Every metric of one country by year, with its population and GDP."""
+    data = table()
+    index = row(country)
+    return pd.DataFrame({
+        **{name: metric(name, sector)[index] for name in METRICS},
+        'population': data.population[index],
+        'gdp': data.gdp[index],
+    }, index=pd.Index(data.years, name='Year'))
@@ -0,0 +1,324 @@
+"""One-page CO₂ profiles of every country, built in parallel.
+
+A profile shows the country's total emissions 1970–2023 with the SARIMA forecast where there is
+one, its per-capita and per-GDP rank, its sector mix, the trend cluster it belongs to and the
+countries with the most similar emission curve.
+
+All inputs are loaded once into `ProfileData`, a handful of NumPy arrays. The workers are forked
+from the process holding it, so they read the same copy instead of each unpickling or re-reading
+the CSV files (platforms without fork hand it over once per worker). A report is only built again
+when a hash of its inputs, including this file, changed since the last run.
+
+    python streamlit/country_profiles.py --output reports
+    python streamlit/country_profiles.py --format pdf --workers 4 DEU FRA SVN
+"""
+import os
+import io
+import sys
+import html
+import json
+import time
+import base64
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+import co2_data
+import similarity
+
+# Number of trend clusters and of similar countries listed per profile
+CLUSTERS = 5
+PEERS = 5
+
+# Sectors shown separately in the stack, the rest is summed into 'Other'
+TOP_SECTORS = 6
+
+# Reports are rebuilt when this file changes, not only when the data does
+CODE_VERSION = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()[:12]
+
+
+@dataclass
+class ProfileData:
+    """Everything a report needs, one row per country code."""
+    codes: np.ndarray
+    names: np.ndarray
+    years: np.ndarray
+    totals: np.ndarray            # countries x years, kt CO₂
+    sector_names: np.ndarray
+    sectors: np.ndarray           # countries x sectors x years
+    forecast_years: np.ndarray
+    forecasts: np.ndarray         # countries x forecast years, NaN without a forecast
+    rank_year: int
+    per_capita: np.ndarray        # t CO₂ per person in rank_year, NaN if unknown
+    per_gdp: np.ndarray           # kg CO₂ per $ of GDP in rank_year
+    per_capita_rank: np.ndarray   # 1 = highest, 0 if unknown
+    per_gdp_rank: np.ndarray
+    clusters: np.ndarray
+    peers: np.ndarray             # countries x PEERS row indices, most similar first
+
+    def inputs(self, i):
+        """Bytes of everything the report of row `i` shows."""
+        parts = [self.codes[i], self.names[i], self.totals[i], self.sectors[i], self.forecasts[i],
+                 self.per_capita[i], self.per_gdp[i], self.per_capita_rank[i], self.per_gdp_rank[i],
+                 self.clusters[i], self.names[self.peers[i]], self.sector_names, self.rank_year]
+        return b"".join(np.asarray(part).tobytes() for part in parts)
+
+
+def _ranks(values):
+    """1 for the largest value, 0 where the value is missing."""
+    ranks = np.zeros(len(values), dtype=int)
+    known = np.flatnonzero(np.isfinite(values))
+    ranks[known[np.argsort(-values[known])]] = np.arange(1, len(known) + 1)
+    return ranks
+
+
+def load_profile_data():
+    """Read every input once and derive the ranks, clusters and peers of all countries."""
+    from sklearn.cluster import KMeans
+
+    df_co2 = co2_data.load_emissions()
+    years = co2_data.year_columns(df_co2)
+    totals = df_co2.groupby('Country_code')[years].sum()
+    codes = totals.index
+    names = df_co2.groupby('Country_code')['Name'].first().reindex(codes)
+
+    df_sectors = co2_data.load_sectors()
+    # Memo items (international aviation and shipping) are not part of the national total
+    df_sectors = df_sectors[~df_sectors['Sector'].str.startswith('Memo')]
+    sector_names = df_sectors.groupby('Sector')[years].sum().sum(axis=1).sort_values(ascending=False).index
+    sectors = df_sectors.groupby(['Country_code', 'Sector'])[years].sum() \
+        .reindex(pd.MultiIndex.from_product([codes, sector_names]), fill_value=0)
+
+    # The forecasts are named like the Europe pages name the countries
+    df_forecasts = pd.read_csv(co2_data.DATA_DIR / "forecasts_sarima.csv", sep=';')
+    europe = co2_data.europe_emissions(df_co2)
+    df_forecasts['Country_code'] = df_forecasts['Name'].map(europe.groupby('Name')['Country_code'].first())
+    forecasts = df_forecasts.pivot_table(index='Country_code', columns='year', values='CO2_emissions') \
+        .reindex(codes)
+
+    # Ranks use the latest year in which the OWID panel has both values for most countries
+    df_gdp = co2_data.owid_countries(co2_data.load_gdp()) \
+        .dropna(subset=[co2_data.CO2_PER_CAPITA, co2_data.GDP_PER_CAPITA])
+    counts = df_gdp['Year'].value_counts()
+    rank_year = int(counts[counts >= 0.9 * counts.max()].index.max())
+    latest = df_gdp[df_gdp['Year'] == rank_year].groupby('Code')[[co2_data.CO2_PER_CAPITA, co2_data.GDP_PER_CAPITA]] \
+        .first().reindex(codes)
+    per_capita = latest[co2_data.CO2_PER_CAPITA].to_numpy()
+    per_gdp = per_capita * 1000 / latest[co2_data.GDP_PER_CAPITA].to_numpy()
+
+    _, z, _ = similarity.country_series()
+    clusters = KMeans(n_clusters=CLUSTERS, random_state=0, n_init='auto').fit_predict(z)
+    distances = similarity.distance_matrices()["correlation"].copy()
+    np.fill_diagonal(distances, np.inf)
+    nearest = np.argpartition(distances, PEERS, axis=1)[:, :PEERS]
+    peers = np.take_along_axis(nearest, np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1), axis=1)
+
+    return ProfileData(
+        codes=codes.to_numpy(dtype=str),
+        names=names.to_numpy(dtype=str),
+        years=np.array(years, dtype=int),
+        totals=totals.to_numpy(dtype=float),
+        sector_names=sector_names.to_numpy(dtype=str),
+        sectors=sectors.to_numpy(dtype=float).reshape(len(codes), len(sector_names), len(years)),
+        forecast_years=forecasts.columns.to_numpy(dtype=int),
+        forecasts=forecasts.to_numpy(dtype=float),
+        rank_year=rank_year,
+        per_capita=per_capita,
+        per_gdp=per_gdp,
+        per_capita_rank=_ranks(per_capita),
+        per_gdp_rank=_ranks(per_gdp),
+        clusters=clusters,
+        peers=peers,
+    )
+
+
+def facts(data, i):
+    """The figures a profile lists, as label -> text."""
+    totals, years = data.totals[i], data.years
+    base = totals[years == 1990][0]
+    known = int((data.per_capita_rank > 0).sum())
+    same_cluster = data.names[(data.clusters == data.clusters[i]) & (np.arange(len(data.codes)) != i)]
+
+    def rank(value, position, unit):
+        return f"{value:.2f} {unit}, rank {position} of {known}" if position else "no data"
+
+    return {
+        f"Emissions {years[-1]}": f"{totals[-1]:,.0f} kt CO₂",
+        "Change since 1990": f"{(totals[-1] / base - 1) * 100:+.1f} %" if base > 0 else "n/a",
+        f"Per capita ({data.rank_year})": rank(data.per_capita[i], data.per_capita_rank[i], "t"),
+        f"Per GDP ({data.rank_year})": rank(data.per_gdp[i], data.per_gdp_rank[i], "kg/$"),
+        f"Forecast {data.forecast_years[-1]}":
+            f"{data.forecasts[i][-1]:,.0f} kt CO₂" if np.isfinite(data.forecasts[i]).any() else "none",
+        "Trend cluster": f"{data.clusters[i] + 1} of {CLUSTERS} ({len(same_cluster)} other countries)",
+        "Most similar trend": ", ".join(data.names[data.peers[i]]),
+    }
+
+
+def draw_profile(data, i):
+    """A4 page with the facts, the emission trend with forecast and the sector stack."""
+    fig = Figure(figsize=(8.27, 11.69))
+    fig.suptitle(f"{data.names[i]} ({data.codes[i]})", fontsize=18, y=0.97)
+    thousands = FuncFormatter(lambda value, _: f"{value:,.0f}")
+
+    text = fig.add_axes([0.08, 0.74, 0.84, 0.19])
+    text.axis('off')
+    for row, (label, value) in enumerate(facts(data, i).items()):
+        text.text(0, 1 - row * 0.14, label, fontsize=10, fontweight='bold', va='top')
+        text.text(0.32, 1 - row * 0.14, value, fontsize=10, va='top', wrap=True)
+
+    trend = fig.add_axes([0.1, 0.42, 0.84, 0.27])
+    trend.plot(data.years, data.totals[i], color='dodgerblue', linewidth=2, label='Emissions')
+    if np.isfinite(data.forecasts[i]).any():
+        trend.plot(np.r_[data.years[-1], data.forecast_years], np.r_[data.totals[i][-1], data.forecasts[i]],
+                   color='orange', linewidth=2, linestyle='--', label='SARIMA forecast')
+    trend.set_title('Total CO₂ emissions')
+    trend.set_ylabel('kt CO₂')
+    trend.yaxis.set_major_formatter(thousands)
+    trend.grid(alpha=0.3)
+    trend.legend(loc='upper left')
+
+    stack = fig.add_axes([0.1, 0.06, 0.58, 0.29])
+    sectors = data.sectors[i]
+    order = np.argsort(-sectors.sum(axis=1))
+    shown, rest = order[:TOP_SECTORS], order[TOP_SECTORS:]
+    layers = np.vstack([sectors[shown], sectors[rest].sum(axis=0)])
+    labels = list(data.sector_names[shown]) + ['Other']
+    stack.stackplot(data.years, layers, labels=labels, alpha=0.85)
+    stack.set_title('Emissions by sector')
+    stack.set_ylabel('kt CO₂')
+    stack.yaxis.set_major_formatter(thousands)
+    stack.legend(loc='upper left', bbox_to_anchor=(1.02, 1), fontsize=7, frameon=False)
+    return fig
+
+
+def _html(data, i, fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    image = base64.b64encode(buffer.getvalue()).decode()
+    rows = "".join(f"<tr><th>{html.escape(label)}</th><td>{html.escape(value)}</td></tr>"
+                   for label, value in facts(data, i).items())
+    name = html.escape(data.names[i])
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>{name} · CO₂ profile</title>
+<style>body {{ font-family: system-ui, sans-serif; max-width: 60rem; margin: 2rem auto; }}
+th {{ text-align: left; padding-right: 2rem; }} img {{ max-width: 100%; }}</style></head>
+<body>
+<h1>{name} ({html.escape(data.codes[i])})</h1>
+<table>{rows}</table>
+<img src="data:image/png;base64,{image}" alt="Emission trend and sectors of {name}">
+</body>
+</html>
+"""
+
+
+# Set in the parent before the pool forks, or by `_attach` in each worker where fork is unavailable
+_data = None
+
+
+def _attach(data):
+    global _data
+    _data = data
+
+
+def build_report(i, fmt, output):
+    """Write the report of row `i`; runs in a worker process."""
+    start = time.perf_counter()
+    fig = draw_profile(_data, i)
+    path = Path(output) / f"{_data.codes[i]}.{fmt}"
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    if fmt == "pdf":
+        fig.savefig(tmp, format="pdf")
+    else:
+        tmp.write_text(_html(_data, i, fig), encoding="utf-8")
+    os.replace(tmp, path)
+    return i, time.perf_counter() - start
+
+
+def write_index(output, data, reports):
+    """Link the reports recorded in the manifest whose files exist, by country name."""
+    names = dict(zip(data.codes, data.names))
+    built = [(names.get(code, code), report["file"]) for code, report in reports.items()
+             if (output / report["file"]).exists()]
+    links = "".join(f'<li><a href="{html.escape(file)}">{html.escape(name)}</a></li>' for name, file in sorted(built))
+    (output / "index.html").write_text(
+        f'<!DOCTYPE html>\n<html lang="en">\n<head><meta charset="utf-8"><title>CO₂ country profiles</title></head>\n'
+        f"<body>\n<h1>CO₂ country profiles</h1>\n<ul>{links}</ul>\n</body>\n</html>\n", encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("codes", nargs="*", help="Country codes to build (default: all)")
+    parser.add_argument("--output", default="reports", help="Directory to write the reports to")
+    parser.add_argument("--format", choices=("html", "pdf"), default="html")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--force", action="store_true", help="Rebuild reports whose inputs did not change")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = load_profile_data()
+    loaded = time.perf_counter() - start
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    manifest_path = output / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    manifest.setdefault("reports", {})
+    unknown = sorted(set(args.codes) - set(data.codes))
+    if unknown:
+        sys.exit(f"Unknown country codes: {', '.join(unknown)}")
+
+    hashes, todo = {}, []
+    for i, code in enumerate(data.codes):
+        if args.codes and code not in args.codes:
+            continue
+        hashes[code] = hashlib.sha1(data.inputs(i) + f"{CODE_VERSION}{args.format}".encode()).hexdigest()[:16]
+        previous = manifest["reports"].get(code, {})
+        if args.force or previous.get("inputs") != hashes[code] or not (output / f"{code}.{args.format}").exists():
+            todo.append(i)
+
+    built = time.perf_counter()
+    seconds = []
+    if todo:
+        # Forked workers read `_data` from the parent's memory; spawned ones get it once each
+        _attach(data)
+        forked = "fork" in mp.get_all_start_methods()
+        context = mp.get_context("fork" if forked else "spawn")
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(todo)), mp_context=context,
+                                 initializer=None if forked else _attach, initargs=() if forked else (data,)) as pool:
+            chunksize = max(1, len(todo) // (4 * args.workers))
+            for i, took in pool.map(build_report, todo, [args.format] * len(todo), [output] * len(todo),
+                                    chunksize=chunksize):
+                code = data.codes[i]
+                manifest["reports"][code] = {"inputs": hashes[code], "file": f"{code}.{args.format}"}
+                seconds.append(took)
+    elapsed = time.perf_counter() - built
+
+    write_index(output, data, manifest["reports"])
+    manifest["last_run"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "workers": args.workers,
+        "load_s": round(loaded, 2),
+        "built": len(todo),
+        "skipped": len(hashes) - len(todo),
+        "build_s": round(elapsed, 2),
+        "reports_per_minute": round(len(todo) / elapsed * 60, 1) if todo else None,
+        "mean_report_s": round(float(np.mean(seconds)), 3) if seconds else None,
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    run = manifest["last_run"]
+    print(f"Loaded inputs in {loaded:.1f} s; built {run['built']} and skipped {run['skipped']} unchanged reports "
+          f"in {elapsed:.1f} s" + (f" ({run['reports_per_minute']:.0f} reports/min)" if todo else ""))
+
+
+if __name__ == "__main__":
+    main()
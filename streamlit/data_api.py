@@ -0,0 +1,347 @@
+"""HTTP API with the derived numbers of the app, for other dashboards on the same host.
+
+Serves every dataset below as JSON, CSV or Arrow (IPC stream) from an asyncio server bound to
+127.0.0.1 only:
+
+    GET /                                   list of datasets
+    GET /datasets/<name>.<json|csv|arrow>   one dataset; ?scope=World etc. where it applies
+
+Responses carry an ETag made from the content hash of the data files behind the dataset, so a
+client sending it back in If-None-Match gets 304 Not Modified until the data changes. Bodies are
+compressed with zstd (when `zstandard` is installed) or gzip as the client accepts, and each
+encoded body is kept in memory per data version. When several requests miss the cache for the
+same body at once, one of them computes it and the others wait for its result (single-flight).
+
+    python streamlit/data_api.py                  # serve on 127.0.0.1:8765
+    python streamlit/data_api.py --port 9000
+    python streamlit/data_api.py --check          # start on a free port and test the endpoints
+"""
+import io
+import json
+import gzip
+import asyncio
+import argparse
+import pandas as pd
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import co2_data
+import co2_query
+import world_scale
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+FORMATS = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+HTTP_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 500: "Internal Server Error"}
+
+# Encoded bodies kept in memory, oldest dropped first
+CACHE_ENTRIES = 256
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+# Threads computing bodies, so a slow dataset never blocks the event loop
+WORKERS = 4
+
+FORECASTS_PATH = co2_data.DATA_DIR / "forecasts_sarima.csv"
+
+
+def encodings():
+    """Content encodings the server can produce, preferred first."""
+    try:
+        import zstandard  # noqa: F401
+        return ("zstd", "gzip")
+    except ImportError:
+        return ("gzip",)
+
+
+def _emissions(scope, per=None):
+    return co2_query.frame(co2_query.scope_codes(scope), per=per)
+
+
+def _clusters(scope, year=2020, n_clusters=3):
+    """K-means of the countries of `scope` by CO₂ and GDP per capita in `year`, standardised."""
+    codes = co2_query.scope_codes(scope)
+    rows = co2_query.rows(codes)
+    data = co2_query.table()
+    column = year - co2_query.FIRST_YEAR
+    df = pd.DataFrame({
+        'Country_code': data.codes[rows],
+        'Name': data.names[rows],
+        'co2_per_capita': co2_query.metric("per_capita")[rows, column],
+        'gdp_per_capita': data.gdp[rows, column] / data.population[rows, column],
+    }).dropna().reset_index(drop=True)
+    features = df[['co2_per_capita', 'gdp_per_capita']]
+    features = (features - features.mean()) / features.std(ddof=0)
+    df['cluster'] = world_scale.kmeans(n_clusters, len(df)).fit_predict(features.to_numpy())
+    return df
+
+
+def _forecasts(scope):
+    df = pd.read_csv(FORECASTS_PATH, sep=';', index_col=0)
+    return df.rename(columns={'year': 'Year'})[['Name', 'Year', 'CO2_emissions']]
+
+
+# name -> (description, builder(scope), data files, takes a scope)
+DATASETS = {
+    # The GDP panel holds the regions of the region scopes
+    "emissions": ("Total CO₂ emissions per country and year (kt)",
+                  _emissions, (co2_data.CO2_PATH, co2_data.GDP_PATH), True),
+    "per_capita": ("CO₂ emissions per capita (t)",
+                   lambda scope: _emissions(scope, "capita"), (co2_data.CO2_PATH, co2_data.GDP_PATH), True),
+    "per_gdp": ("CO₂ emissions per million USD of GDP (t)",
+                lambda scope: _emissions(scope, "gdp"), (co2_data.CO2_PATH, co2_data.GDP_PATH), True),
+    "clusters": ("K-means clusters by CO₂ and GDP per capita (2020)",
+                 _clusters, (co2_data.CO2_PATH, co2_data.GDP_PATH), True),
+    "forecasts": ("SARIMA forecasts of total CO₂ emissions per European country (kt)",
+                  _forecasts, (FORECASTS_PATH,), False),
+}
+
+
+def serialize(df, fmt):
+    if fmt == "json":
+        return df.to_json(orient="records", force_ascii=False).encode()
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def compress(body, encoding):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return body
+
+
+def pick_encoding(accept_encoding):
+    """Best encoding the client accepts ('identity' when none)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class DataAPI:
+    """Request handling, the body cache and single-flight state of one server."""
+
+    def __init__(self):
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.stats = {"requests": 0, "hits": 0, "computed": 0, "coalesced": 0, "not_modified": 0}
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="data-api")
+
+    async def body(self, key, build):
+        """Encoded body for `key`: from the cache, from a computation already running, or computed here."""
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return self.cache[key]
+        if key in self.in_flight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            self.stats["computed"] += 1
+            body = await asyncio.get_running_loop().run_in_executor(self.executor, build)
+            self.cache[key] = body
+            while len(self.cache) > CACHE_ENTRIES:
+                self.cache.popitem(last=False)
+            future.set_result(body)
+            return body
+        except Exception as error:
+            future.set_exception(error)
+            # Retrieved here so an error no other request waited for is not reported as unhandled
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def handle(self, method, target, headers):
+        """(status, headers, body) of one request."""
+        self.stats["requests"] += 1
+        if method not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, b""
+
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path.rstrip("/") == "":
+            listing = {name: {"description": description, "scopes": list(co2_data.SCOPES) if scoped else None,
+                              "formats": list(FORMATS)}
+                       for name, (description, _, _, scoped) in DATASETS.items()}
+            return 200, {"Content-Type": FORMATS["json"]}, json.dumps(listing, ensure_ascii=False).encode()
+
+        name, _, fmt = url.path.removeprefix("/datasets/").rpartition(".")
+        if not url.path.startswith("/datasets/") or name not in DATASETS or fmt not in FORMATS:
+            return 404, {"Content-Type": "text/plain"}, b"Not found\n"
+        description, builder, paths, scoped = DATASETS[name]
+        scope = query.get("scope", world_scale.DEFAULT_SCOPE) if scoped else None
+        if scoped and scope not in co2_data.SCOPES:
+            return 400, {"Content-Type": "text/plain"}, f"Unknown scope {scope!r}\n".encode()
+
+        version = co2_data.data_version(*paths)
+        etag = f'"{name}-{(scope or "all").replace(" ", "_")}-{fmt}-{version}"'
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag_matches(headers.get("if-none-match", ""), etag):
+            self.stats["not_modified"] += 1
+            return 304, response_headers, b""
+
+        raw = await self.body((name, scope, fmt, "identity", version),
+                              lambda: serialize(builder(scope), fmt))
+        encoding = pick_encoding(headers.get("accept-encoding", "")) if len(raw) >= MIN_COMPRESS_BYTES else "identity"
+        body = raw if encoding == "identity" else \
+            await self.body((name, scope, fmt, encoding, version), lambda: compress(raw, encoding))
+        response_headers["Content-Type"] = FORMATS[fmt]
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return 200, response_headers, body
+
+    async def serve_connection(self, reader, writer):
+        """HTTP/1.1 with keep-alive: one request after the other until the client closes."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    status, response_headers, body = await self.handle(method, target, headers)
+                except Exception as error:
+                    status, response_headers, body = 500, {"Content-Type": "text/plain"}, f"{error}\n".encode()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                head = f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n" + \
+                    "".join(f"{key}: {value}\r\n" for key, value in response_headers.items()) + "\r\n"
+                writer.write(head.encode("latin-1") + (body if method != "HEAD" and status != 304 else b""))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start(port=PORT):
+    """Start serving on 127.0.0.1:`port` (0 picks a free port); returns (server, api)."""
+    api = DataAPI()
+    server = await asyncio.start_server(api.serve_connection, HOST, port)
+    return server, api
+
+
+def _get(port, path, headers=None):
+    import urllib.request
+
+    request = urllib.request.Request(f"http://{HOST}:{port}{path}", headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, dict(error.headers), error.read()
+
+
+async def check():
+    """Exercise every endpoint of a server on a free local port; raises AssertionError on failure."""
+    import pyarrow as pa
+
+    server, api = await start(0)
+    port = server.sockets[0].getsockname()[1]
+    clients = ThreadPoolExecutor(max_workers=8)
+    get = lambda *args: asyncio.get_running_loop().run_in_executor(clients, _get, port, *args)  # noqa: E731
+
+    status, _, body = await get("/")
+    assert status == 200 and set(json.loads(body)) == set(DATASETS)
+
+    # Concurrent identical misses compute the body once
+    responses = await asyncio.gather(*[get("/datasets/per_capita.json?scope=World") for _ in range(8)])
+    assert all(status == 200 for status, _, _ in responses)
+    assert len({body for _, _, body in responses}) == 1
+    assert api.stats["computed"] == 1, api.stats
+    rows = json.loads(responses[0][2])
+    assert len(rows) == len(co2_query.scope_codes("World"))
+    print(f"single-flight: 8 concurrent requests, {api.stats['computed']} computation, "
+          f"{api.stats['coalesced']} coalesced")
+
+    for name, (_, _, _, scoped) in DATASETS.items():
+        for fmt in FORMATS:
+            status, headers, body = await get(f"/datasets/{name}.{fmt}", {"Accept-Encoding": "gzip"})
+            assert status == 200, (name, fmt, status, body[:200])
+            if headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            if fmt == "arrow":
+                table = pa.ipc.open_stream(body).read_all()
+                assert table.num_rows > 0
+            elif fmt == "json":
+                assert len(json.loads(body)) > 0
+            else:
+                assert body.count(b"\n") > 1
+
+            status, _, body = await get(f"/datasets/{name}.{fmt}", {"If-None-Match": headers["ETag"]})
+            assert status == 304 and body == b"", (name, fmt, status)
+            print(f"{name:<12} {fmt:<6} {headers.get('Content-Encoding', 'identity'):<8} ETag {headers['ETag']}")
+
+    status, headers, _ = await get("/datasets/emissions.csv", {"Accept-Encoding": ", ".join(encodings())})
+    assert headers.get("Content-Encoding") == encodings()[0]
+    assert (await get("/datasets/emissions.csv?scope=Mars"))[0] == 400
+    assert (await get("/datasets/unknown.json"))[0] == 404
+
+    server.close()
+    await server.wait_closed()
+    clients.shutdown()
+    print(f"all checks passed: {api.stats}")
+
+
+async def main(port):
+    server, _ = await start(port)
+    print(f"Serving {', '.join(DATASETS)} on http://{HOST}:{port}/ (encodings: {', '.join(encodings())})")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port on {HOST} (default: {PORT})")
+    parser.add_argument("--check", action="store_true", help="Test every endpoint on a free port and exit")
+    args = parser.parse_args()
+    asyncio.run(check() if args.check else main(args.port))
@@ -0,0 +1,15 @@
+"""Locations of the data files and caches, importable without pandas (e.g. by pipeline.py)."""
+from pathlib import Path
+
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+# Derived results (bootstrap draws, distance matrices, ...) are written here
+CACHE_DIR = Path(__file__).resolve().parents[1] / ".cache"
+
+CO2_PATH = DATA_DIR / "co2_emmisions_complicated.csv"
+SECTORS_PATH = DATA_DIR / "co2_emmisions_by_sector.csv"
+GDP_PATH = DATA_DIR / "co2-emissions-vs-gdp.csv"
+POPULATION_PATH = DATA_DIR / "world_population.csv"
+CLIMATE_PATH = DATA_DIR / "Climate_Indicators_Annual_Mean_Global_Surface_Temperature.csv"
+WORLD_PATH = DATA_DIR / "cultural" / "ne_110m_admin_0_countries.shp"
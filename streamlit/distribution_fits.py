@@ -0,0 +1,177 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+
+import co2_data
+
+
+METRICS = {
+    "growth": "Yearly log growth rate of CO₂ emissions",
+    "level": "Yearly CO₂ emissions (kt)",
+}
+
+GROUPINGS = ["country", "sector", "decade"]
+
+# Candidate distributions per metric. Growth rates can be negative, levels are positive.
+CANDIDATES = {
+    "growth": ["norm", "laplace", "t", "logistic"],
+    "level": ["lognorm", "expon", "gamma", "weibull_min"],
+}
+
+# Fixed location for the positive distributions, so they have the usual 2 (or 1) parameters
+FIXED_LOC = {"lognorm", "expon", "gamma", "weibull_min"}
+
+
+def _long_samples(grouping, metric):
+    """Return a long frame with columns ['group', 'value'] for the given grouping."""
+    if grouping == "sector":
+        df = co2_data.load_sectors()
+        id_col = "Sector"
+    else:
+        df = co2_data.load_emissions()
+        id_col = "Name"
+    years = co2_data.year_columns(df)
+    values = df[years].to_numpy(dtype=float)
+
+    if metric == "growth":
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_values = np.log(np.where(values > 0, values, np.nan))
+        values = np.diff(log_values, axis=1)
+        years = years[1:]
+
+    long = pd.DataFrame(values, columns=years)
+    long["id"] = df[id_col].to_numpy()
+    long = long.melt(id_vars="id", var_name="year", value_name="value").dropna()
+    if metric == "level":
+        long = long[long["value"] > 0]
+
+    if grouping == "decade":
+        long["group"] = (long["year"].astype(int) // 10 * 10).astype(str) + "s"
+    else:
+        long["group"] = long["id"]
+    return long[["group", "value"]]
+
+
+@lru_cache(maxsize=None)
+def padded_samples(grouping, metric):
+    """Stack every group's sample into a (groups x max sample size) array padded with NaN."""
+    long = _long_samples(grouping, metric)
+    long["i"] = long.groupby("group").cumcount()
+    wide = long.pivot(index="group", columns="i", values="value")
+    return wide.index.to_numpy(), wide.to_numpy(dtype=float)
+
+
+def _closed_form(name, x):
+    """Vectorized MLE along axis 1 for distributions with closed-form estimators.
+
+    Returns (params, loglik) where params is a list of per-group arrays in scipy's order.
+    """
+    n = np.isfinite(x).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if name == "norm":
+            loc = np.nanmean(x, axis=1)
+            scale = np.nanstd(x, axis=1)
+            loglik = -n / 2 * (np.log(2 * np.pi * scale ** 2) + 1)
+            return [loc, scale], loglik
+        if name == "laplace":
+            loc = np.nanmedian(x, axis=1)
+            scale = np.nanmean(np.abs(x - loc[:, None]), axis=1)
+            loglik = -n * (np.log(2 * scale) + 1)
+            return [loc, scale], loglik
+        if name == "lognorm":
+            log_x = np.log(x)
+            mu = np.nanmean(log_x, axis=1)
+            sigma = np.nanstd(log_x, axis=1)
+            loglik = -n / 2 * (np.log(2 * np.pi * sigma ** 2) + 1) - np.nansum(log_x, axis=1)
+            return [sigma, np.zeros_like(mu), np.exp(mu)], loglik
+        if name == "expon":
+            scale = np.nanmean(x, axis=1)
+            loglik = -n * (np.log(scale) + 1)
+            return [np.zeros_like(scale), scale], loglik
+    return None
+
+
+def _fit_numeric(name, samples):
+    """Worker: numerical MLE with scipy for a chunk of groups (one 1-D sample each)."""
+    dist = getattr(stats, name)
+    results = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for x in samples:
+            try:
+                params = dist.fit(x, floc=0) if name in FIXED_LOC else dist.fit(x)
+                results.append((params, dist.logpdf(x, *params).sum()))
+            except Exception:
+                results.append((None, np.nan))
+    return results
+
+
+def _fit_in_pool(name, x, workers):
+    samples = [row[np.isfinite(row)] for row in x]
+    chunks = [list(chunk) for chunk in np.array_split(np.arange(len(samples)), workers) if len(chunk)]
+    sample_chunks = [[samples[i] for i in chunk] for chunk in chunks]
+    if len(chunks) == 1:
+        parts = [_fit_numeric(name, sample_chunks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            parts = list(pool.map(_fit_numeric, [name] * len(chunks), sample_chunks))
+    results = [result for part in parts for result in part]
+    return [params for params, _ in results], np.array([loglik for _, loglik in results])
+
+
+def fit_all(groups, x, candidates, workers=None, min_size=8):
+    """Fit every candidate distribution to every group and rank the fits by AIC."""
+    workers = workers or os.cpu_count() or 1
+    n = np.isfinite(x).sum(axis=1)
+    keep = n >= min_size
+    groups, x, n = groups[keep], x[keep], n[keep]
+
+    rows = []
+    for name in candidates:
+        closed = _closed_form(name, x)
+        if closed is not None:
+            params, loglik = closed
+            params = list(zip(*params))
+        else:
+            params, loglik = _fit_in_pool(name, x, workers)
+        k = getattr(stats, name).numargs + 2 - (name in FIXED_LOC)
+        rows.append(pd.DataFrame({
+            "group": groups,
+            "distribution": name,
+            "n": n,
+            "params": params,
+            "loglik": loglik,
+            "aic": 2 * k - 2 * loglik,
+        }))
+
+    fits = pd.concat(rows, ignore_index=True)
+    fits = fits[np.isfinite(fits["aic"])]
+    fits["rank"] = fits.groupby("group")["aic"].rank(method="first").astype(int)
+    fits["delta_aic"] = fits["aic"] - fits.groupby("group")["aic"].transform("min")
+    return fits.sort_values(["group", "rank"]).reset_index(drop=True)
+
+
+@lru_cache(maxsize=None)
+def distribution_fits(grouping="country", metric="growth"):
+    """AIC-ranked fits for one grouping and metric, stored on disk once per data version."""
+    version = co2_data.data_version(co2_data.CO2_PATH, co2_data.SECTORS_PATH)
+    path = co2_data.CACHE_DIR / f"distribution_fits_{version}_{grouping}_{metric}.pkl"
+    if path.exists():
+        return pd.read_pickle(path)
+
+    groups, x = padded_samples(grouping, metric)
+    fits = fit_all(groups, x, CANDIDATES[metric])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fits.to_pickle(path)
+    return fits
+
+
+def group_sample(grouping, metric, group):
+    groups, x = padded_samples(grouping, metric)
+    row = x[list(groups).index(group)]
+    return row[np.isfinite(row)]
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+from scipy import stats
+
+import co2_data
+
+
+# Policy and crisis dates the page lets you pick from
+EVENTS = {
+    1997: "Kyoto Protocol signed",
+    2005: "Kyoto Protocol enters into force",
+    2015: "Paris Agreement",
+    2020: "COVID-19 lockdowns",
+}
+
+METRICS = {
+    "per_capita": "Annual CO₂ emissions (tons per capita)",
+    "total": "Total CO₂ emissions (kt)",
+}
+
+FIRST_YEAR, LAST_YEAR = 1970, 2023
+
+
+@lru_cache(maxsize=None)
+def emissions_panel(metric="per_capita"):
+    """Return a country x year matrix (1970–2023) for the given metric, indexed by country code."""
+    if metric == "per_capita":
+        df_gdp = co2_data.owid_countries(co2_data.load_gdp())
+        df_gdp = df_gdp[df_gdp['Year'].between(FIRST_YEAR, LAST_YEAR)]
+        panel = df_gdp.pivot_table(index='Code', columns='Year', values=co2_data.CO2_PER_CAPITA)
+        names = df_gdp.groupby('Code')['Entity'].first()
+    elif metric == "total":
+        df_co2 = co2_data.load_emissions()
+        years = [str(y) for y in range(FIRST_YEAR, LAST_YEAR + 1)]
+        panel = df_co2.groupby('Country_code')[years].sum(min_count=1)
+        panel.columns = panel.columns.astype(int)
+        names = df_co2.groupby('Country_code')['Name'].first()
+    else:
+        raise ValueError(f"Unknown metric: {metric!r}")
+
+    panel.index.name = 'Code'
+    panel.columns.name = 'Year'
+    panel.insert(0, 'Name', names.reindex(panel.index))
+    return panel
+
+
+@lru_cache(maxsize=None)
+def country_groups():
+    """Return {group name: list of country codes} using the OWID world regions."""
+    regions = co2_data.owid_regions(co2_data.load_gdp())
+    groups = {"All countries": sorted(regions.index)}
+    for region, codes in regions.groupby(regions).groups.items():
+        groups[region] = sorted(codes)
+    return groups
+
+
+def segmented_design(years, event_year):
+    """Design matrix [1, t, after, t * after] with t measured in years from the event."""
+    t = np.asarray(years, dtype=float) - event_year
+    after = (t >= 0).astype(float)
+    return np.column_stack([np.ones_like(t), t, after, t * after])
+
+
+def fit_segmented(values, years, event_year, window=10, confidence=0.95, min_obs=3):
+    """Fit a segmented regression around `event_year` for every row of `values` at once.
+
+    `values` is a (countries x years) array which may contain NaN. All countries
+    share one design matrix, so the normal equations are built with einsum and
+    inverted in a single batched `np.linalg.inv` call; missing years simply get
+    zero weight. Countries with fewer than `min_obs` observations on either side of
+    the event get NaN results.
+    """
+    values = np.asarray(values, dtype=float)
+    years = np.asarray(years)
+    in_window = np.abs(years - event_year) <= window
+    y = values[:, in_window]
+    X = segmented_design(years[in_window], event_year)
+    k = X.shape[1]
+
+    observed = np.isfinite(y)
+    w = observed.astype(float)
+    y = np.where(observed, y, 0.0)
+
+    XtX = np.einsum('ct,tj,tk->cjk', w, X, X)
+    Xty = np.einsum('ct,tj->cj', w * y, X)
+
+    after = X[:, 2].astype(bool)
+    n_before = observed[:, ~after].sum(axis=1)
+    n_after = observed[:, after].sum(axis=1)
+    n_obs = n_before + n_after
+    valid = (n_before >= min_obs) & (n_after >= min_obs) & (n_obs > k)
+
+    # Identity keeps the batch solvable for countries we are going to discard anyway
+    XtX[~valid] = np.eye(k)
+    XtX_inv = np.linalg.inv(XtX)
+    beta = np.einsum('cjk,ck->cj', XtX_inv, Xty)
+
+    resid = (y - beta @ X.T) * w
+    dof = np.maximum(n_obs - k, 1)
+    sigma2 = (resid ** 2).sum(axis=1) / dof
+    se = np.sqrt(sigma2[:, None] * np.diagonal(XtX_inv, axis1=1, axis2=2))
+    t_crit = stats.t.ppf(0.5 + confidence / 2, dof)[:, None]
+
+    beta[~valid] = np.nan
+    se[~valid] = np.nan
+
+    return {
+        "n_obs": n_obs,
+        "beta": beta,
+        "se": se,
+        "low": beta - t_crit * se,
+        "high": beta + t_crit * se,
+    }
+
+
+@lru_cache(maxsize=None)
+def event_impact(event_year, metric="per_capita", window=10, confidence=0.95):
+    """Level and slope change at `event_year` for every country, cached per event.
+
+    Columns:
+    - pre_level / pre_slope: fitted value at the event and yearly trend before it
+    - level_change: jump at the event year, with confidence interval
+    - slope_change: change of the yearly trend after the event, with confidence interval
+    """
+    panel = emissions_panel(metric)
+    years = panel.columns[1:].to_numpy(dtype=int)
+    fit = fit_segmented(panel[years].to_numpy(), years, event_year, window, confidence)
+
+    beta, low, high = fit["beta"], fit["low"], fit["high"]
+    result = pd.DataFrame({
+        "Name": panel["Name"].to_numpy(),
+        "n_obs": fit["n_obs"],
+        "pre_level": beta[:, 0],
+        "pre_slope": beta[:, 1],
+        "level_change": beta[:, 2],
+        "level_change_low": low[:, 2],
+        "level_change_high": high[:, 2],
+        "slope_change": beta[:, 3],
+        "slope_change_low": low[:, 3],
+        "slope_change_high": high[:, 3],
+    }, index=panel.index)
+    result["level_change_pct"] = result["level_change"] / result["pre_level"] * 100
+    result["significant"] = (result["level_change_low"] > 0) | (result["level_change_high"] < 0)
+    return result.dropna(subset=["level_change"])
+
+
+def fitted_lines(event_year, code, metric="per_capita", window=10):
+    """Return observed values and the fitted pre/post segments for one country."""
+    panel = emissions_panel(metric)
+    impact = event_impact(event_year, metric, window)
+    years = np.arange(max(event_year - window, FIRST_YEAR), min(event_year + window, LAST_YEAR) + 1)
+    observed = panel.loc[code, years].astype(float)
+
+    row = impact.loc[code]
+    beta = row[["pre_level", "pre_slope", "level_change", "slope_change"]].to_numpy(dtype=float)
+    fitted = segmented_design(years, event_year) @ beta
+    counterfactual = segmented_design(years, event_year)[:, :2] @ beta[:2]
+    return pd.DataFrame({
+        "observed": observed.to_numpy(),
+        "fitted": fitted,
+        "counterfactual": counterfactual,
+    }, index=years)
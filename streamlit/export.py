@@ -0,0 +1,493 @@
+"""Static export of the dashboard: every page rendered once to HTML, images and JSON.
+
+Every page runs through Streamlit's AppTest in a pool of worker processes. Each select slider
+(the year sliders of the page 5 maps) is then moved through all of its values, and each keyed
+`st.tabs` through all of its tabs, again in parallel. The result is a folder that any web server
+can host without a running Streamlit process:
+
+    index.html, <page>.html   one file per page, the slider and tab states switch in the browser
+    images/                   every chart as PNG/SVG, named by content hash
+    data/                     every table as JSON records
+    manifest.json             data version, pages, files and render times
+
+Other widgets (selectboxes, numeric sliders, checkboxes) keep their default value.
+
+    python streamlit/export.py --output site
+    python streamlit/export.py pages/5_CO2_visualization.py --workers 4
+"""
+import os
+import re
+import sys
+import html
+import json
+import math
+import time
+import hashlib
+import logging
+import argparse
+import pandas as pd
+import multiprocessing as mp
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import co2_data
+
+APP_DIR = Path(__file__).resolve().parent
+MAIN_SCRIPT = APP_DIR / "CO2_streamlit.py"
+
+# Tables with more rows are only linked as JSON, not written into the page
+MAX_HTML_ROWS = 500
+
+STYLE = """
+body { font-family: "Source Sans Pro", system-ui, sans-serif; margin: 0; display: flex; color: #31333f; }
+nav { width: 16rem; min-height: 100vh; padding: 1rem; background: #f0f2f6; box-sizing: border-box; flex-shrink: 0; }
+nav a { display: block; padding: 0.3rem 0.5rem; color: inherit; text-decoration: none; border-radius: 0.3rem; }
+nav a.current { background: #e0e3ea; font-weight: 600; }
+main { flex: 1; max-width: 90rem; padding: 1rem 3rem; min-width: 0; }
+img { max-width: 100%; }
+.row { display: flex; gap: 1rem; } .row > div { flex: 1; min-width: 0; }
+.table { overflow-x: auto; max-height: 30rem; margin-bottom: 1rem; }
+table { border-collapse: collapse; font-size: 0.9rem; } td, th { border: 1px solid #ddd; padding: 0.2rem 0.5rem; }
+.widget, .caption, footer { color: #6b6f7b; font-size: 0.9rem; margin: 0.5rem 0; }
+.metric .value { font-size: 2rem; } .alert { padding: 0.8rem; background: #fff8e1; border-radius: 0.3rem; }
+.tabs button { border: none; background: none; padding: 0.5rem 1rem; cursor: pointer; font: inherit; }
+.tabs button.current { border-bottom: 2px solid #ff4b4b; color: #ff4b4b; }
+"""
+
+# Tab buttons and the select boxes standing in for select sliders show one variant at a time
+SCRIPT = """
+function showVariant(group, index) {
+  group.querySelectorAll(":scope > .variant").forEach((variant, i) => { variant.hidden = i !== index; });
+  group.querySelectorAll(":scope > .tabs button").forEach((button, i) => button.classList.toggle("current", i === index));
+  const control = group.querySelectorAll(":scope > .variant")[index].querySelector("select.switch");
+  if (control) { control.value = index; }
+}
+document.querySelectorAll(".variants").forEach(group => {
+  group.addEventListener("change", event => {
+    if (event.target.matches("select.switch")) { showVariant(group, Number(event.target.value)); }
+  });
+  group.querySelectorAll(":scope > .tabs button").forEach((button, i) => button.addEventListener("click", () => showVariant(group, i)));
+});
+"""
+
+
+def default_scripts():
+    return [MAIN_SCRIPT] + sorted(APP_DIR.glob("pages/*.py"), key=lambda path: int(path.name.split("_")[0]))
+
+
+def page_name(script):
+    """File name and navigation label Streamlit uses for a page script."""
+    if Path(script) == MAIN_SCRIPT:
+        return "index.html", "CO2 streamlit"
+    stem = Path(script).stem.split("_", 1)[1]
+    return f"{stem}.html", stem.replace("_", " ")
+
+
+def _user_key(element_id):
+    # Element ids look like "$$ID-<hash>-<key>"; the key is None for widgets without one
+    parts = element_id.split("-", 2)
+    return parts[2] if len(parts) == 3 and parts[2] != "None" else None
+
+
+def _write(directory, data, suffix):
+    """Store bytes under their content hash; identical files from other workers are only written once."""
+    name = f"{hashlib.sha1(data).hexdigest()[:16]}.{suffix}"
+    path = directory / name
+    if not path.exists():
+        tmp = directory / f"{name}.{os.getpid()}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    return f"{directory.name}/{name}"
+
+
+def _describe(node, images, output):
+    """JSON-able description of an AppTest node. Image bytes are taken from `images` in page order."""
+    from streamlit.testing.v1 import element_tree as et
+
+    kind = node.type
+    if isinstance(node, et.Block):
+        item = {"type": kind, "children": [_describe(child, images, output) for child in node.children.values()]}
+        if kind == "tab":
+            item["label"] = node.label
+        elif kind == "tab_container":
+            item["key"] = _user_key(node.proto.id)
+        elif kind == "expandable":
+            item["label"] = node.proto.expandable.label
+        return item
+
+    if kind == "image":
+        data, fmt = next(images)
+        return {"type": "image", "src": _write(output / "images", data, fmt)}
+    if kind in ("dataframe", "table"):
+        df = node.value
+        if not (isinstance(df.index, pd.RangeIndex) and df.index.name is None):
+            df = df.reset_index()
+        records = df.to_json(orient="records", force_ascii=False, date_format="iso").encode()
+        return {"type": "table", "rows": len(df), "src": _write(output / "data", records, "json"),
+                "html": df.head(MAX_HTML_ROWS).to_html(border=0, index=False, na_rep="")}
+    if kind == "divider":
+        return {"type": "markdown", "value": "---"}
+    if kind in ("title", "header", "subheader", "markdown", "caption", "latex", "text", "code"):
+        return {"type": kind, "value": node.value}
+    if kind == "metric":
+        return {"type": kind, "label": node.proto.label, "value": node.proto.body, "delta": node.proto.delta}
+    if kind in ("info", "warning", "error", "success"):
+        return {"type": "alert", "value": node.value}
+    if kind == "exception":
+        return {"type": kind, "value": node.value}
+    if hasattr(node, "label") and hasattr(node, "value"):
+        return {"type": "widget", "widget": kind, "label": node.label, "value": str(node.value)}
+    return {"type": kind}
+
+
+def _find(tree, path):
+    for index in path:
+        tree = tree["children"][index]
+    return tree
+
+
+def _is_row(item):
+    children = item.get("children")
+    return item["type"] == "flex_container" and bool(children) and all(child["type"] == "column" for child in children)
+
+
+def _switches(root):
+    """Select sliders inside fragments and keyed tabs of a described page, with the container each switches."""
+    found = []
+
+    def walk(node, path):
+        for index, child in enumerate(node.get("children", [])):
+            here = path + (index,)
+            if child["type"] == "widget" and child["widget"] == "select_slider":
+                # Columns are only layout, the slider switches the fragment around them. Sliders directly
+                # on the page change all of it and keep their default value, like other widgets.
+                container = path
+                while container and (_find(root, container)["type"] == "column" or _is_row(_find(root, container))):
+                    container = container[:-1]
+                if container and all(item["container"] != container for item in found):
+                    found.append({"kind": "select_slider", "path": here, "container": container,
+                                  "name": child["label"]})
+            elif child["type"] == "tab_container" and child.get("key"):
+                found.append({"kind": "tabs", "path": here, "container": here, "name": child["key"]})
+            walk(child, here)
+
+    walk(root, ())
+    return found
+
+
+def _run(at, output, timeout):
+    import rendering
+
+    rendering.captured = []
+    at.run(timeout=timeout)
+    images = iter(rendering.captured)
+    tree = _describe(at.main, images, output)
+    if next(images, None) is not None:
+        raise RuntimeError(f"{at._script_path}: more images shown than the page contains")
+    return tree
+
+
+def _select_slider(at, path):
+    """The AppTest select slider at a position in the described tree."""
+    node = at.main
+    for index in path:
+        node = list(node.children.values())[index]
+    return node
+
+
+def _setup():
+    sys.path.insert(0, str(APP_DIR))
+    # AppTest runs the pages without a browser session, which Streamlit warns about on every run
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest
+
+
+def export_page(script, output, timeout=600):
+    """Render a page in its default state; runs in a worker process."""
+    AppTest = _setup()
+    start = time.perf_counter()
+    at = AppTest.from_file(str(script), default_timeout=timeout)
+    tree = _run(at, output, timeout)
+    switches = []
+    for switch in _switches(tree):
+        if switch["kind"] == "select_slider":
+            widget = _select_slider(at, switch["path"])
+            # Options are the formatted labels; they can only be set back when formatting leaves them unchanged
+            if isinstance(widget.value, (list, tuple)) or \
+                    any(str(widget.format_func(option)) != option for option in widget.options):
+                continue
+            values, default = list(widget.options), str(widget.format_func(widget.value))
+        else:
+            values = [tab["label"] for tab in _find(tree, switch["path"])["children"]]
+            default = at.session_state[switch["name"]] if switch["name"] in at.session_state else values[0]
+        switches.append({**switch, "values": values, "default": default})
+    return {"tree": tree, "switches": switches, "seconds": time.perf_counter() - start}
+
+
+def export_variants(script, switch, values, output, timeout=600):
+    """Render a page once per value of one switch; returns the switch's container per value."""
+    AppTest = _setup()
+    start = time.perf_counter()
+    at = AppTest.from_file(str(script), default_timeout=timeout)
+    at.run(timeout=timeout)
+    variants = {}
+    for value in values:
+        if switch["kind"] == "select_slider":
+            _select_slider(at, switch["path"]).set_value(value)
+            variants[value] = _find(_run(at, output, timeout), switch["container"])
+        else:
+            at.session_state[switch["name"]] = value
+            tabs = _find(_run(at, output, timeout), switch["path"])["children"]
+            variants[value] = tabs[switch["values"].index(value)]
+    return {"variants": variants, "seconds": time.perf_counter() - start}
+
+
+def _inline(text):
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)\*(?!\*)", r"<em>\1</em>", text)
+    text = re.sub(r"\[([^\]]+)\]\(([^)\s]+)\)", r'<a href="\2">\1</a>', text)
+    return re.sub(r"  $", "<br>", text)
+
+
+def markdown(text):
+    """The markdown the pages use (headings, lists, emphasis, code and links) as HTML."""
+    blocks, paragraph, items = [], [], None
+
+    def flush():
+        nonlocal items
+        if paragraph:
+            blocks.append(f"<p>{' '.join(paragraph)}</p>")
+            paragraph.clear()
+        if items:
+            tag, entries = items
+            blocks.append(f"<{tag}>" + "".join(f"<li>{entry}</li>" for entry in entries) + f"</{tag}>")
+            items = None
+
+    for line in html.escape(text, quote=False).splitlines():
+        stripped = line.strip()
+        heading = re.match(r"(#{1,6})\s+(.*)", stripped)
+        bullet = re.match(r"[-*]\s+(.*)", stripped)
+        numbered = re.match(r"\d+\.\s+(.*)", stripped)
+        if not stripped:
+            flush()
+        elif re.fullmatch(r"(-{3,}|\*{3,}|_{3,})", stripped):
+            flush()
+            blocks.append("<hr>")
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif bullet or numbered:
+            tag = "ul" if bullet else "ol"
+            if paragraph or (items and items[0] != tag):
+                flush()
+            items = items or (tag, [])
+            items[1].append(_inline((bullet or numbered).group(1)))
+        elif items and line.startswith(" "):
+            items[1][-1] += " " + _inline(stripped)
+        else:
+            if items:
+                flush()
+            paragraph.append(_inline(line.rstrip("\n").lstrip()))
+    flush()
+    return "\n".join(blocks)
+
+
+def _control(item, switch, index):
+    options = "".join(f'<option value="{i}"{" selected" if i == index else ""}>{html.escape(value)}</option>'
+                      for i, value in enumerate(switch["values"]))
+    return (f'<div class="widget"><label>{html.escape(item["label"])} '
+            f'<select class="switch">{options}</select></label></div>')
+
+
+def to_html(item, variants, path=(), switch=None, index=0):
+    """HTML of a described node. `variants` maps a container path to its switch and its variant per value."""
+    kind = item["type"]
+    if path in variants and switch is None:
+        switch, values = variants[path]
+        default = switch["values"].index(switch["default"])
+        if switch["kind"] == "tabs":
+            buttons = "".join(f'<button{" class=current" if i == default else ""}>{html.escape(value)}</button>'
+                              for i, value in enumerate(switch["values"]))
+            panels = "".join(f'<div class="variant"{"" if i == default else " hidden"}>'
+                             + "".join(to_html(child, variants, path + (i, j))
+                                       for j, child in enumerate(values[value]["children"])) + "</div>"
+                             for i, value in enumerate(switch["values"]))
+            return f'<div class="variants"><div class="tabs">{buttons}</div>{panels}</div>'
+        panels = "".join(f'<div class="variant"{"" if i == default else " hidden"}>'
+                         + to_html(values[value], variants, path, switch, i) + "</div>"
+                         for i, value in enumerate(switch["values"]))
+        return f'<div class="variants">{panels}</div>'
+
+    children = "".join(to_html(child, variants, path + (i,), switch, index)
+                       for i, child in enumerate(item.get("children", [])))
+    if _is_row(item):
+        return f'<div class="row">{children}</div>'
+    if kind == "expandable":
+        return f"<details><summary>{html.escape(item['label'])}</summary>{children}</details>"
+    if "children" in item:
+        return f"<div>{children}</div>"
+
+    if kind == "widget" and switch and item["widget"] == "select_slider" and item["label"] == switch["name"]:
+        return _control(item, switch, index)
+    if kind in ("title", "header", "subheader"):
+        level = {"title": 1, "header": 2, "subheader": 3}[kind]
+        return f"<h{level}>{_inline(html.escape(item['value'], quote=False))}</h{level}>"
+    if kind == "markdown":
+        return markdown(item["value"])
+    if kind == "caption":
+        return f'<div class="caption">{markdown(item["value"])}</div>'
+    if kind in ("latex", "code", "text"):
+        return f"<pre>{html.escape(item['value'])}</pre>"
+    if kind == "image":
+        return f'<img src="{item["src"]}" loading="lazy" alt="">'
+    if kind == "table":
+        more = f", first {MAX_HTML_ROWS} shown" if item["rows"] > MAX_HTML_ROWS else ""
+        return (f'<div class="table">{item["html"]}</div>'
+                f'<div class="caption">{item["rows"]} rows{more} · <a href="{item["src"]}">JSON</a></div>')
+    if kind == "metric":
+        delta = f'<div>{html.escape(item["delta"])}</div>' if item["delta"] else ""
+        return (f'<div class="metric"><div>{html.escape(item["label"])}</div>'
+                f'<div class="value">{html.escape(item["value"])}</div>{delta}</div>')
+    if kind == "alert":
+        return f'<div class="alert">{markdown(item["value"])}</div>'
+    if kind == "widget":
+        return f'<div class="widget">{html.escape(item["label"])}: <strong>{html.escape(item["value"])}</strong></div>'
+    return ""
+
+
+def write_page(output, script, page, pages, version):
+    file_name, label = page_name(script)
+    variants = {}
+    for switch, values in page["variants"]:
+        variants[switch["container"]] = (switch, values)
+    body = "".join(to_html(child, variants, (i,)) for i, child in enumerate(page["tree"]["children"]))
+    links = "".join(f'<a href="{name}"{" class=current" if name == file_name else ""}>{html.escape(text)}</a>'
+                    for name, text in pages)
+    document = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(label)} · CO₂ Emissions in Europe</title>
+<style>{STYLE}</style>
+</head>
+<body>
+<nav>{links}</nav>
+<main>
+{body}
+<footer>Static export of data version {version}. Controls other than the year sliders and tabs show the value
+the export used.</footer>
+</main>
+<script>{SCRIPT}</script>
+</body>
+</html>
+"""
+    (output / file_name).write_text(document, encoding="utf-8")
+    return file_name
+
+
+def _trees(page):
+    """The default render of a page and every variant of its switches."""
+    return [page["tree"]] + [tree for _, values in page["variants"] for tree in values.values()]
+
+
+def _files(tree):
+    if "src" in tree:
+        return [tree["src"]]
+    return [name for child in tree.get("children", []) for name in _files(child)]
+
+
+def _errors(tree):
+    if tree["type"] == "exception":
+        return [tree["value"]]
+    return [error for child in tree.get("children", []) for error in _errors(child)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("scripts", nargs="*", help="Scripts relative to streamlit/ (default: all pages)")
+    parser.add_argument("--output", default="site", help="Directory to write the site to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed for a single rerun")
+    args = parser.parse_args()
+
+    scripts = [APP_DIR / script for script in args.scripts] or default_scripts()
+    output = Path(args.output).resolve()
+    for directory in (output, output / "images", output / "data"):
+        directory.mkdir(parents=True, exist_ok=True)
+    version = co2_data.data_version(*sorted(co2_data.DATA_DIR.rglob("*.csv")))
+
+    # Same settings as the benchmark: no metrics port, no background warm-up next to the renders
+    os.environ.setdefault("CO2_METRICS_PORT", "0")
+    os.environ.setdefault("CO2_WARMUP", "0")
+
+    start = time.perf_counter()
+    pages = {script: None for script in scripts}
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp.get_context("spawn")) as pool:
+        tasks = {pool.submit(export_page, script, output, args.timeout): (script, None) for script in scripts}
+        while tasks:
+            done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+            for task in done:
+                script, switch = tasks.pop(task)
+                result = task.result()
+                print(f"{page_name(script)[0]}: {'page' if switch is None else switch['name']} "
+                      f"rendered in {result['seconds']:.1f} s")
+                if switch is not None:
+                    for item, values in pages[script]["variants"]:
+                        if item is switch:
+                            values.update(result["variants"])
+                    pages[script]["seconds"] += result["seconds"]
+                    continue
+
+                pages[script] = {**result, "variants": []}
+                # The default state is already rendered; the other values are spread over the workers
+                for item in result["switches"]:
+                    container = _find(result["tree"], item["container"])
+                    if item["kind"] == "tabs":
+                        container = container["children"][item["values"].index(item["default"])]
+                    pages[script]["variants"].append((item, {item["default"]: container}))
+                    values = [value for value in item["values"] if value != item["default"]]
+                    parts = max(1, min(len(values), args.workers // len(result["switches"])))
+                    size = math.ceil(len(values) / parts) if values else 1
+                    for i in range(0, len(values), size):
+                        chunk = pool.submit(export_variants, script, item, values[i:i + size], output, args.timeout)
+                        tasks[chunk] = (script, item)
+
+    navigation = [page_name(script) for script in scripts]
+    manifest = {"data_version": version, "generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "pages": []}
+    errors = 0
+    for script, page in pages.items():
+        file_name = write_page(output, script, page, navigation, version)
+        page_errors = [error for tree in _trees(page) for error in _errors(tree)]
+        errors += len(page_errors)
+        manifest["pages"].append({
+            "file": file_name,
+            "script": str(script.relative_to(APP_DIR)),
+            "render_s": round(page["seconds"], 2),
+            "states": [{"control": item["name"], "values": item["values"]} for item, _ in page["variants"]],
+            "errors": page_errors,
+        })
+    # Only what the pages use; files of earlier exports into the same directory are removed
+    files = {name for page in pages.values() for tree in _trees(page) for name in _files(tree)}
+    for path in [*(output / "images").iterdir(), *(output / "data").iterdir()]:
+        if f"{path.parent.name}/{path.name}" not in files:
+            path.unlink()
+    manifest["images"] = sorted(name for name in files if name.startswith("images/"))
+    manifest["tables"] = sorted(name for name in files if name.startswith("data/"))
+    (output / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+    print(f"Wrote {len(pages)} pages, {len(manifest['images'])} images and {len(manifest['tables'])} tables "
+          f"to {output} in {time.perf_counter() - start:.1f} s" + (f", {errors} page errors" if errors else ""))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    # Run from the imported module: AppTest replaces __main__ with the page it runs, after which the
+    # workers could no longer unpickle functions defined in __main__
+    import export
+    export.main()
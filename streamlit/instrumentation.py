@@ -0,0 +1,313 @@
+import io
+import os
+import marshal
+import sys
+import time
+import pstats
+import cProfile
+import functools
+import uuid
+import threading
+import psutil
+import numpy as np
+import streamlit as st
+
+from pathlib import Path
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Stages every page is split into
+STAGES = ("load", "transform", "model", "render", "encode")
+
+# Last N stage timings of this process, shared by all sessions
+RING_SIZE = int(os.environ.get("CO2_METRICS_RING_SIZE", 5000))
+records = deque(maxlen=RING_SIZE)
+_records_lock = threading.Lock()
+
+# Address of the Prometheus text endpoint, port 0 disables it
+METRICS_HOST = os.environ.get("CO2_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("CO2_METRICS_PORT", 9464))
+
+# Whether the first page run starts the background warm-up (see warmup.py)
+WARMUP = os.environ.get("CO2_WARMUP", "1") != "0"
+
+_process = psutil.Process()
+_current = threading.local()
+
+
+def _rss():
+    return _process.memory_info().rss
+
+
+def start_run(page):
+    """Mark the start of a page rerun; call once at the top of every page with `__file__`."""
+    # Imported here because rendering imports this one
+    import rendering
+
+    start_metrics_server()
+    if WARMUP:
+        import warmup
+
+        warmup.start()
+    _mark_run(page)
+    rendering.start_run()
+
+    if st.query_params.get("profile") and not getattr(_current, "profiling", False):
+        _profile_rest_of_page(page, sys._getframe(1))
+
+
+def _mark_run(page):
+    _current.page = Path(page).stem
+    _current.run_id = uuid.uuid4().hex[:8]
+    _current.last_mark = time.perf_counter()
+    _current.last_rss = _rss()
+
+
+def fragment(func):
+    """`st.fragment` whose partial reruns are recorded like reruns of the page defining `func`."""
+    page = func.__globals__.get("__file__", "unknown")
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _mark_run(page)
+        return func(*args, **kwargs)
+    return st.fragment(wrapper)
+
+
+def _profile_rest_of_page(page, frame):
+    """Run the rest of the calling page under cProfile and offer the stats for download.
+
+    Only used with `?profile=1`; other sessions never create a profiler.
+    """
+    from streamlit.runtime.scriptrunner_utils.exceptions import StopException
+
+    # Blank out everything up to the start_run call so line numbers stay correct
+    lines = Path(page).read_text(encoding="utf-8").splitlines()
+    rest = "\n" * frame.f_lineno + "\n".join(lines[frame.f_lineno:])
+    code = compile(rest, page, "exec")
+
+    profiler = cProfile.Profile()
+    _current.profiling = True
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+        exec(code, frame.f_globals)
+    except StopException:
+        pass
+    finally:
+        profiler.disable()
+        _current.profiling = False
+    elapsed = time.perf_counter() - start
+
+    stats = pstats.Stats(profiler)
+    report = io.StringIO()
+    stats.stream = report
+    stats.sort_stats("cumulative").print_stats(40)
+
+    name = Path(page).stem
+    st.divider()
+    st.subheader("Profile of this rerun")
+    st.caption(f"{elapsed:.2f} s under cProfile. Open the .prof file with snakeviz or `python -m pstats`.")
+    # Same bytes pstats.Stats.dump_stats writes
+    st.download_button("Download pstats file", data=marshal.dumps(stats.stats),
+                       file_name=f"{name}.prof", mime="application/octet-stream")
+    st.code(report.getvalue(), language="text")
+    st.stop()
+
+
+def _record(stage_name, seconds, memory_delta):
+    record = {
+        "timestamp": time.time(),
+        "page": getattr(_current, "page", "unknown"),
+        "run_id": getattr(_current, "run_id", ""),
+        "stage": stage_name,
+        "seconds": seconds,
+        "memory_delta": memory_delta,
+    }
+    with _records_lock:
+        records.append(record)
+
+
+@contextmanager
+def stage(name):
+    """Time a block of a page and record its duration and RSS change."""
+    start, rss = time.perf_counter(), _rss()
+    try:
+        yield
+    finally:
+        end, end_rss = time.perf_counter(), _rss()
+        _record(name, end - start, end_rss - rss)
+        _current.last_mark, _current.last_rss = end, end_rss
+
+
+def timed(name):
+    """Decorator version of `stage`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def mark(name):
+    """Record everything since the previous recorded stage as stage `name`."""
+    now, rss = time.perf_counter(), _rss()
+    _record(name, now - getattr(_current, "last_mark", now), rss - getattr(_current, "last_rss", rss))
+    _current.last_mark, _current.last_rss = now, rss
+
+
+def snapshot():
+    with _records_lock:
+        return list(records)
+
+
+def summary():
+    """Per page and stage: count, mean, p50, p95 and max seconds and mean RSS change."""
+    grouped = {}
+    for record in snapshot():
+        grouped.setdefault((record["page"], record["stage"]), []).append(record)
+
+    rows = []
+    for (page, stage_name), items in sorted(grouped.items()):
+        seconds = np.array([item["seconds"] for item in items])
+        rows.append({
+            "page": page,
+            "stage": stage_name,
+            "count": len(items),
+            "mean_s": seconds.mean(),
+            "p50_s": np.percentile(seconds, 50),
+            "p95_s": np.percentile(seconds, 95),
+            "max_s": seconds.max(),
+            "mean_memory_delta_mb": np.mean([item["memory_delta"] for item in items]) / 2 ** 20,
+        })
+    return rows
+
+
+def prometheus_text():
+    """Render the ring buffer in the Prometheus text exposition format."""
+    lines = [
+        "# HELP co2_stage_seconds Duration of page stages over the last recorded reruns.",
+        "# TYPE co2_stage_seconds summary",
+    ]
+    for row in summary():
+        labels = f'page="{row["page"]}",stage="{row["stage"]}"'
+        lines.append(f'co2_stage_seconds{{{labels},quantile="0.5"}} {row["p50_s"]:.6f}')
+        lines.append(f'co2_stage_seconds{{{labels},quantile="0.95"}} {row["p95_s"]:.6f}')
+        lines.append(f'co2_stage_seconds_sum{{{labels}}} {row["mean_s"] * row["count"]:.6f}')
+        lines.append(f'co2_stage_seconds_count{{{labels}}} {row["count"]}')
+    lines += [
+        "# HELP co2_stage_memory_delta_bytes Mean RSS change of page stages.",
+        "# TYPE co2_stage_memory_delta_bytes gauge",
+    ]
+    for row in summary():
+        labels = f'page="{row["page"]}",stage="{row["stage"]}"'
+        lines.append(f'co2_stage_memory_delta_bytes{{{labels}}} {row["mean_memory_delta_mb"] * 2 ** 20:.0f}')
+    lines += [
+        "# HELP co2_process_resident_memory_bytes Resident memory of the Streamlit process.",
+        "# TYPE co2_process_resident_memory_bytes gauge",
+        f"co2_process_resident_memory_bytes {_rss()}",
+    ]
+    # Only once a page has imported it; the metrics thread must not import matplotlib itself
+    rendering = sys.modules.get("rendering")
+    if rendering:
+        process, _ = rendering.memory_report()
+        lines += [
+            "# HELP co2_open_figures Matplotlib figures currently open in the process.",
+            "# TYPE co2_open_figures gauge",
+            f"co2_open_figures {process['open_figures']}",
+            "# HELP co2_cached_render_bytes Bytes held by the cached chart renders.",
+            "# TYPE co2_cached_render_bytes gauge",
+            f"co2_cached_render_bytes {sum(rendering.cached_bytes.values())}",
+            "# HELP co2_render_evictions_total Times the memory budget cleared cached renders.",
+            "# TYPE co2_render_evictions_total counter",
+            f"co2_render_evictions_total {process['evictions']}",
+            "# HELP co2_chart_cache_bytes Bytes of images in the shared chart cache.",
+            "# TYPE co2_chart_cache_bytes gauge",
+            f"co2_chart_cache_bytes {rendering.chart_stats['bytes']}",
+            "# HELP co2_chart_cache_requests_total Chart cache lookups by result.",
+            "# TYPE co2_chart_cache_requests_total counter",
+        ]
+        for result in ("hits", "disk_hits", "misses"):
+            lines.append(f'co2_chart_cache_requests_total{{result="{result}"}} {rendering.chart_stats[result]}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@st.cache_resource
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on `port` from a background thread, once per process."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, port), _MetricsHandler)
+    except OSError:
+        # Another replica already serves this port
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def render_diagnostics():
+    """Hidden diagnostics view, shown on the main page with `?diagnostics=1`."""
+    import pandas as pd
+
+    st.title("Diagnostics")
+    st.caption(f"Process RSS {_rss() / 2 ** 20:.0f} MB · {len(records)} of {RING_SIZE} recorded stages · "
+               f"metrics endpoint http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+    st.subheader("Stage timings per page")
+    st.dataframe(pd.DataFrame(summary()))
+
+    st.subheader("Most recent stages")
+    recent = pd.DataFrame(snapshot()[-200:][::-1])
+    if not recent.empty:
+        recent["timestamp"] = pd.to_datetime(recent["timestamp"], unit="s")
+        recent["memory_delta_mb"] = recent.pop("memory_delta") / 2 ** 20
+    st.dataframe(recent)
+
+    import rendering
+
+    st.subheader("Memory")
+    process, rows = rendering.memory_report()
+    budget = f"budget {process['budget_mb']:.0f} MB, evicting above {process['high_water_mb']:.0f} MB" \
+        if process["budget_mb"] else "no memory budget (set CO2_MEMORY_BUDGET_MB)"
+    st.caption(f"Process RSS {process['rss_mb']:.0f} MB · {budget} · {process['open_figures']} open figures · "
+               f"{process['cached_render_mb']:.1f} MB of cached renders")
+    st.caption(f"Chart cache {process['chart_cache_mb']:.1f} of {rendering.CHART_CACHE_MB:.0f} MB in "
+               f"{process['chart_cache_entries']} charts · {process['chart_hits']} hits, "
+               f"{process['chart_disk_hits']} from disk, {process['chart_misses']} misses, "
+               f"{process['chart_evictions']} evicted")
+    st.dataframe(pd.DataFrame({"MB": pd.Series(rendering.cached_bytes, dtype=float) / 2 ** 20}))
+    st.dataframe(pd.DataFrame(rows))
+    if rendering.evictions:
+        st.dataframe(pd.DataFrame(rendering.evictions))
+
+    import warmup
+
+    st.subheader("Cache warm-up")
+    st.dataframe(pd.DataFrame({
+        "seconds": pd.Series(warmup.timings, dtype=float),
+        "error": pd.Series(warmup.errors, dtype=object),
+    }))
+
+    st.subheader("Prometheus text")
+    st.code(prometheus_text(), language="text")
@@ -0,0 +1,246 @@
+"""Concurrent-session load test of the Streamlit app over its websocket protocol.
+
+Starts the app on localhost (or uses a running one with --url), then for every session count N
+keeps N simulated users busy for a fixed time. Each user opens a session, navigates between pages
+and moves sliders and selectboxes, waiting for every rerun to finish before the next action.
+Throughput, p50/p95/p99 latency and the server's CPU and memory are reported per N.
+
+    python streamlit/loadtest.py --sessions 1 2 4 8 --duration 60
+    python streamlit/loadtest.py --url ws://127.0.0.1:8501 --pid 12345 --pages visualization forecasts
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+import psutil
+import numpy as np
+import websockets
+
+from pathlib import Path
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Slider_pb2 import Slider
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_DIR = Path(__file__).resolve().parent
+MAIN_SCRIPT = APP_DIR / "CO2_streamlit.py"
+
+# Default share of actions that switch to another page, the rest move a widget on the current page
+NAVIGATION_SHARE = 0.3
+
+
+def start_server(port):
+    """Run the app headless on `port` and wait until it answers the health check."""
+    # Without the background warm-up, whose process pools would take the CPU from the first sessions
+    env = dict(os.environ, CO2_METRICS_PORT="0", CO2_WARMUP="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(MAIN_SCRIPT), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("Streamlit exited during startup")
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Streamlit did not become healthy within 60 s")
+
+
+def _widget_state(widget, rng):
+    """A state for `widget` with a random value other than its default."""
+    state = WidgetState(id=widget.id)
+    if isinstance(widget, Slider) and widget.type == Slider.SELECT_SLIDER:
+        picks = sorted(rng.choice(len(widget.options), size=len(widget.default), replace=False))
+        state.string_array_value.data[:] = [widget.options[i] for i in picks]
+    elif isinstance(widget, Slider):
+        steps = int(round((widget.max - widget.min) / (widget.step or 1)))
+        picks = sorted(rng.choice(steps + 1, size=len(widget.default), replace=steps + 1 < len(widget.default)))
+        state.double_array_value.data[:] = [widget.min + i * (widget.step or 1) for i in picks]
+    else:
+        state.string_value = widget.options[rng.integers(len(widget.options))]
+    return state
+
+
+class SimulatedUser:
+    """One browser session: navigates pages and moves widgets, timing every rerun."""
+
+    def __init__(self, url, pages, seed, think_time, navigation_share=NAVIGATION_SHARE):
+        self.url = url
+        self.pages = pages
+        self.navigation_share = navigation_share
+        self.rng = np.random.default_rng(seed)
+        self.think_time = think_time
+        self.latencies = []
+        self.errors = 0
+
+    async def rerun(self, ws, page_hash, states, fragment_id=""):
+        """Send one rerun request and wait for the script to finish.
+
+        Returns the time taken, the widgets drawn as (widget, fragment id) pairs and the app's pages.
+        Like the browser, a widget inside an `st.fragment` only reruns that fragment.
+        """
+        back = BackMsg()
+        back.rerun_script.page_script_hash = page_hash
+        back.rerun_script.widget_states.widgets.extend(states.values())
+        back.rerun_script.fragment_id = fragment_id
+        start = time.perf_counter()
+        await ws.send(back.SerializeToString())
+
+        widgets, app_pages = [], None
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "navigation":
+                app_pages = msg.navigation.app_pages
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                name = element.WhichOneof("type")
+                if name in ("slider", "selectbox"):
+                    widgets.append((getattr(element, name), msg.delta.fragment_id))
+                elif name == "exception":
+                    self.errors += 1
+            elif kind == "script_finished":
+                return time.perf_counter() - start, widgets, app_pages
+
+    async def run(self, deadline):
+        async with websockets.connect(f"{self.url}/_stcore/stream", subprotocols=["streamlit"],
+                                      max_size=None) as ws:
+            seconds, widgets, app_pages = await self.rerun(ws, "", {})
+            if self.pages:
+                app_pages = [page for page in app_pages if any(name in page.url_pathname for name in self.pages)]
+            page_hash, states = "", {}
+
+            while time.perf_counter() < deadline:
+                fragment_id = ""
+                if not widgets or self.rng.random() < self.navigation_share:
+                    action = "navigate"
+                    page_hash, states = app_pages[self.rng.integers(len(app_pages))].page_script_hash, {}
+                else:
+                    action = "widget"
+                    widget, fragment_id = widgets[self.rng.integers(len(widgets))]
+                    states[widget.id] = _widget_state(widget, self.rng)
+
+                seconds, new_widgets, _ = await self.rerun(ws, page_hash, states, fragment_id)
+                self.latencies.append((action, seconds))
+                if fragment_id:
+                    # Only the fragment's own widgets were sent again
+                    widgets = [item for item in widgets if item[1] != fragment_id] + new_widgets
+                else:
+                    # Widgets can disappear when the page stops early (e.g. a warning and st.stop)
+                    widgets = new_widgets or widgets
+                await asyncio.sleep(self.rng.uniform(0, self.think_time))
+
+
+async def _sample_server(process, samples, stop):
+    processes = [process] + process.children(recursive=True)
+    for p in processes:
+        p.cpu_percent()
+    while not stop.is_set():
+        await asyncio.sleep(0.5)
+        processes = [process] + process.children(recursive=True)
+        cpu, rss = 0.0, 0
+        for p in processes:
+            try:
+                cpu += p.cpu_percent()
+                rss += p.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        samples.append((cpu, rss))
+
+
+def percentiles(seconds):
+    if not seconds:
+        return {}
+    return {f"p{q}_s": round(float(np.percentile(seconds, q)), 4) for q in (50, 95, 99)}
+
+
+async def run_level(url, sessions, duration, pages, think_time, process, seed, navigation_share=NAVIGATION_SHARE):
+    users = [SimulatedUser(url, pages, seed + i, think_time, navigation_share) for i in range(sessions)]
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(_sample_server(process, samples, stop)) if process else None
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(user.run(start + duration) for user in users), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    if sampler:
+        stop.set()
+        await sampler
+
+    latencies = [item for user in users for item in user.latencies]
+    level = {
+        "sessions": sessions,
+        "elapsed_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+        **percentiles([seconds for _, seconds in latencies]),
+        "navigation": percentiles([seconds for action, seconds in latencies if action == "navigate"]),
+        "widget": percentiles([seconds for action, seconds in latencies if action == "widget"]),
+        "script_errors": sum(user.errors for user in users),
+        "failed_sessions": [repr(outcome) for outcome in outcomes if isinstance(outcome, Exception)],
+    }
+    if samples:
+        cpu, rss = np.array(samples).T
+        level.update({
+            "server_cpu_mean_pct": round(float(cpu.mean()), 1),
+            "server_cpu_max_pct": round(float(cpu.max()), 1),
+            "server_rss_max_mb": round(float(rss.max()) / 2 ** 20, 1),
+            "server_cpu_s_per_rerun": round(float(cpu.mean()) / 100 * elapsed / max(len(latencies), 1), 3),
+        })
+    return level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrent sessions per level")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per level")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Maximum pause between actions")
+    parser.add_argument("--pages", nargs="*", help="Only visit pages whose URL contains one of these strings")
+    parser.add_argument("--navigation-share", type=float, default=NAVIGATION_SHARE,
+                        help="Share of actions that open a page instead of moving a widget")
+    parser.add_argument("--port", type=int, default=8599, help="Port for the app started by the load test")
+    parser.add_argument("--url", help="Websocket base URL of an already running app, e.g. ws://127.0.0.1:8501")
+    parser.add_argument("--pid", type=int, help="Process id of that app, for CPU and memory figures")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest.json", help="JSON file to write")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.pid
+    else:
+        server = start_server(args.port)
+        url, pid = f"ws://127.0.0.1:{args.port}", server.pid
+    process = psutil.Process(pid) if pid else None
+
+    report = {"cpu_count": os.cpu_count(), "duration_s": args.duration, "think_time_s": args.think_time, "levels": []}
+    try:
+        for sessions in args.sessions:
+            level = asyncio.run(run_level(url, sessions, args.duration, args.pages, args.think_time, process,
+                                          args.seed, args.navigation_share))
+            report["levels"].append(level)
+            print(f"{sessions:>3} sessions: {level['throughput_rps']:.2f} reruns/s, "
+                  f"p50 {level.get('p50_s', float('nan')):.2f} s, p95 {level.get('p95_s', float('nan')):.2f} s, "
+                  f"p99 {level.get('p99_s', float('nan')):.2f} s"
+                  + (f", CPU {level['server_cpu_mean_pct']:.0f}%, RSS {level['server_rss_max_mb']:.0f} MB"
+                     if "server_cpu_mean_pct" in level else ""))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""All sector emissions as one compact long table, sorted so wide views need no reshaping.
+
+Every (country, sector, substance) series of the sector table is one run of rows, one per year
+1970–2023, NaN where the year is unknown. Duplicate sector rows are summed and Serbia and
+Montenegro are split as on the pages. The key columns are categoricals (int8/int16 codes), the
+year an int16 and the value a float32, about a tenth of the melted string frame.
+
+Because the rows are sorted by country, sector, substance and year and every series has every
+year, row `series * n_years + (year - 1970)` is that value: a country or a year range is a range
+scan without a search, and the wide (series x years) table is a reshape of the value column
+that shares its memory.
+
+    python streamlit/master_table.py             # memory and timings against melt and pivot
+    python streamlit/master_table.py --repeat 20
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+import co2_data
+
+# Key columns of a series, in sort order
+KEYS = ['Country_code', 'Sector', 'Substance']
+# Attributes that belong to the country of a series
+COUNTRY_COLUMNS = ['Name', 'Region']
+
+
+@dataclass(frozen=True)
+class MasterTable:
+    """The long table, its years and the first series of every country."""
+    long: pd.DataFrame          # Country_code, Name, Region, Sector, Substance, Year, Emissions
+    years: np.ndarray           # int16, the years of every series in order
+    series: pd.DataFrame        # one row per series: its keys and country attributes
+    country_starts: np.ndarray  # series of country i are country_starts[i]:country_starts[i + 1]
+
+
+def data_version():
+    return co2_data.data_version(co2_data.SECTORS_PATH)
+
+
+def build():
+    """Read the sector table into a `MasterTable`."""
+    df = co2_data.load_sectors()
+    year_columns = co2_data.year_columns(df)
+    df = df.groupby(KEYS + COUNTRY_COLUMNS, sort=False)[year_columns].sum(min_count=1).reset_index()
+    df = co2_data.split_serbia_montenegro(df).sort_values(KEYS, ignore_index=True)
+
+    n_series, n_years = len(df), len(year_columns)
+    series = pd.DataFrame({column: pd.Categorical(df[column]) for column in KEYS + COUNTRY_COLUMNS})
+    # Row-major: the years of a series follow each other, so the flat array is already in sort order
+    values = df[year_columns].to_numpy(dtype=np.float32).ravel()
+    years = np.array(year_columns, dtype=np.int16)
+
+    long = pd.DataFrame({
+        **{column: pd.Categorical.from_codes(np.repeat(series[column].cat.codes.to_numpy(), n_years),
+                                             series[column].cat.categories)
+           for column in ['Country_code', 'Name', 'Region', 'Sector', 'Substance']},
+        'Year': np.tile(years, n_series),
+        'Emissions': values,
+    })
+
+    country_codes = series['Country_code'].cat.codes.to_numpy()
+    country_starts = np.searchsorted(country_codes, np.arange(len(series['Country_code'].cat.categories) + 1))
+    return MasterTable(long=long, years=years, series=series, country_starts=country_starts)
+
+
+@lru_cache(maxsize=None)
+def master():
+    """The master table, built once per process; treat it as read-only."""
+    return build()
+
+
+def values(table=None):
+    """(series x years) float32 view of the value column, no copy."""
+    table = table or master()
+    return table.long['Emissions'].to_numpy().reshape(len(table.series), len(table.years))
+
+
+def wide(table=None):
+    """The wide table of all series: keys as index, years as columns, sharing memory with `long`."""
+    table = table or master()
+    index = pd.MultiIndex.from_frame(table.series[KEYS])
+    return pd.DataFrame(values(table), index=index, columns=table.years, copy=False)
+
+
+def scan(country, sector=None, years=None, table=None):
+    """Rows of one country (one sector of it) for a (first, last) year range, without a search."""
+    table = table or master()
+    categories = table.series['Country_code'].cat.categories
+    country_index = categories.get_loc(country)
+    first, last = table.country_starts[country_index], table.country_starts[country_index + 1]
+    series = np.arange(first, last)
+    if sector is not None:
+        series = series[table.series['Sector'].to_numpy()[first:last] == sector]
+
+    n_years = len(table.years)
+    first_year, last_year = years or (int(table.years[0]), int(table.years[-1]))
+    columns = np.arange(first_year - int(table.years[0]), last_year - int(table.years[0]) + 1)
+    return table.long.iloc[(series[:, None] * n_years + columns[None, :]).ravel()]
+
+
+@lru_cache(maxsize=None)
+def country_totals():
+    """(countries x years) float32 frame of every country's emissions summed over its sectors."""
+    table = master()
+    present = table.country_starts[:-1] < table.country_starts[1:]
+    starts = table.country_starts[:-1][present]
+    series_values = values(table)
+    sums = np.add.reduceat(np.nan_to_num(series_values, nan=0.0), starts, axis=0, dtype=np.float64)
+    counts = np.add.reduceat(np.isfinite(series_values), starts, axis=0)
+    totals = np.where(counts > 0, sums, np.nan).astype(np.float32)
+    codes = table.series['Country_code'].cat.categories[present]
+    return pd.DataFrame(totals, index=pd.Index(codes, name='Country_code'), columns=table.years)
+
+
+def _best(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def report(repeat=5):
+    """Memory (MB) and best-of-`repeat` seconds of the melted string frame against the master table."""
+    df = pd.read_csv(co2_data.SECTORS_PATH)
+    id_columns = ['Region', 'Country_code', 'Name', 'Sector', 'Substance']
+
+    def melt():
+        long = df.melt(id_vars=id_columns, var_name='Year', value_name='Emissions')
+        long['Year'] = long['Year'].astype(int)
+        return long
+
+    melted = melt()
+    table = build()
+    rows = []
+    rows.append(("wide CSV frame", df.memory_usage(deep=True).sum(), None))
+    rows.append(("melted frame", melted.memory_usage(deep=True).sum(), _best(melt, repeat)))
+    rows.append(("master table (read and build)", table.long.memory_usage(deep=True).sum(), _best(build, repeat)))
+    rows.append(("pivot of the melted frame", None, _best(
+        lambda: melted.pivot_table(index=KEYS, columns='Year', values='Emissions', aggfunc='sum'), repeat)))
+    rows.append(("wide view of the master table", None, _best(lambda: wide(table), repeat)))
+    rows.append(("one country, 1990–2020 (filter)", None, _best(
+        lambda: melted[(melted['Country_code'] == 'DEU') & melted['Year'].between(1990, 2020)], repeat)))
+    rows.append(("one country, 1990–2020 (scan)", None, _best(
+        lambda: scan('DEU', years=(1990, 2020), table=table), repeat)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Timings are the best of this many runs")
+    args = parser.parse_args()
+
+    table = master()
+    print(f"{len(table.series)} series x {len(table.years)} years = {len(table.long)} rows; "
+          f"dtypes: {', '.join(f'{column} {dtype}' for column, dtype in table.long.dtypes.items())}")
+    print(f"wide view shares memory with the long table: "
+          f"{np.shares_memory(wide(table).to_numpy(), table.long['Emissions'].to_numpy())}")
+    for name, memory, seconds in report(args.repeat):
+        memory = f"{memory / 2 ** 20:8.2f} MB" if memory is not None else " " * 11
+        seconds = f"{seconds * 1000:9.2f} ms" if seconds is not None else ""
+        print(f"{name:<34} {memory} {seconds}")
@@ -1,15 +1,23 @@
-import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
 
 from pathlib import Path
 
+import co2_data
+import co2_query
+import instrumentation
+import rendering
+import world_scale
+
 st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
-st.title("CO₂ emissions in European Countries")
+instrumentation.start_run(__file__)
+scope = world_scale.select_scope()
+countries_label = world_scale.countries_label(scope)
+st.title(f"CO₂ emissions in {countries_label}")
 
 
-st.markdown("""
-Explore detailed visualizations showcasing CO₂ emissions across European countries.  
+st.markdown(f"""
+Explore detailed visualizations showcasing CO₂ emissions across {countries_label}.  
 This page presents:  
 - The average total CO₂ emissions for each country  
 - Emission patterns of the top 10 highest polluting countries  
@@ -23,65 +31,102 @@ Gain insights into historical and current emission levels, helping to understand
 BASE_DIR = Path(__file__)  
 data_path = BASE_DIR.parents[2] / "data" / "co2_emmisions_complicated.csv"
 
-df_co2 = pd.read_csv(data_path)
-# Filter European countries
-df_co2_europe = df_co2[df_co2['Region'].str.contains('Europe', case=False, na=False)]
-
-# Add specific countries
-df_russia = df_co2[df_co2['Name'].str.contains('Russian Federation', case=False, na=False)].copy()
-df_russia['Name'] = 'Russia'
-df_ukraine = df_co2[df_co2['Name'].str.contains('Ukraine', case=False, na=False)].copy()
-df_belarus = df_co2[df_co2['Name'].str.contains('Belarus', case=False, na=False)].copy()
-df_moldova = df_co2[df_co2['Name'].str.contains('Moldova', case=False, na=False)].copy()
-df_moldova['Name'] = 'Moldova'
-
-# Combine data
-df_co2_europe = pd.concat([df_co2_europe, df_russia, df_ukraine, df_belarus, df_moldova]).drop_duplicates()
-
-# Handle Serbia and Montenegro split
-row = df_co2_europe[df_co2_europe['Name'] == 'Serbia and Montenegro'].copy()
-serbia_row = row.copy()
-montenegro_row = row.copy()
-year_columns = [col for col in df_co2_europe.columns if col.isdigit()]
-serbia_row['Country_code'] = 'SRB'
-serbia_row['Name'] = 'Serbia'
-montenegro_row['Country_code'] = 'MNE'
-montenegro_row['Name'] = 'Montenegro'
-serbia_row[year_columns] = row[year_columns] * 0.96
-montenegro_row[year_columns] = row[year_columns] * 0.04
-df_co2_europe = df_co2_europe[df_co2_europe['Name'] != 'Serbia and Montenegro']
-df_co2_europe = pd.concat([df_co2_europe, serbia_row, montenegro_row], ignore_index=True)
-
-# Calculate average emissions
-df_avg = df_co2_europe.copy()
-df_avg["Average_CO2"] = df_avg[year_columns].mean(axis=1)
-df_avg_sorted = df_avg.sort_values(by="Average_CO2", ascending=False)[["Name", "Average_CO2"]].reset_index(drop=True)
+# Cache key of the charts below: they are only drawn again when a data file changes. The GDP panel
+# holds the region of every country, which decides the countries of a region scope.
+version = co2_data.data_version(data_path, co2_data.GDP_PATH)
+
+
+@st.cache_data(show_spinner=False)
+def load_tables(version, scope):
+    """Emissions of the countries in `scope` with the 1970–2023 average of every country."""
+    with instrumentation.stage("load"):
+        co2_query.table()
+    with instrumentation.stage("transform"):
+        # Europe as on every page (Russia, Ukraine, Belarus and Moldova added, Serbia and Montenegro split)
+        df_avg = co2_query.frame(co2_query.scope_codes(scope))
+        year_columns = co2_data.year_columns(df_avg)
+
+        # Average emissions, computed once per process for all countries
+        df_avg["Average_CO2"] = co2_query.period_mean("total")[co2_query.rows(df_avg["Country_code"])]
+    return df_avg, year_columns
+
+
+# The charts are drawn once per data version and scope and then served from the chart cache of all sessions
+def average_emissions_chart():
+    df_avg, year_columns = load_tables(version, scope)
+    # At world scale only the top countries fit as bars
+    df_bars = world_scale.bar_rows(df_avg, "Average_CO2")
+    fig1, ax1 = rendering.subplots(figsize=(14, 4))
+    ax1.bar(df_bars["Name"], df_bars["Average_CO2"], color='mediumseagreen')
+    ax1.set_ylabel("Average CO₂ Emissions (kt)")
+    ax1.set_xlabel("Country")
+    shown = f"Top {len(df_bars)} of {len(df_avg)} " if len(df_bars) < len(df_avg) else ""
+    ax1.set_title(f"Average CO₂ Emissions – {shown}{countries_label} (1970–2023)")
+    plt.setp(ax1.get_xticklabels(), rotation=45, ha='right')
+    return fig1
+
+
+def top10_average_chart():
+    df_avg, year_columns = load_tables(version, scope)
+    df_top10 = df_avg.nlargest(10, "Average_CO2")
+    fig1, ax1 = rendering.subplots(figsize=(14, 4))
+    ax1.bar(df_top10["Name"], df_top10["Average_CO2"], color='mediumseagreen')
+    ax1.set_ylabel("Average CO₂ Emissions (kt)")
+    ax1.set_xlabel("Country")
+    ax1.set_title(f"CO₂ Emissions by the Top 10 {countries_label} (1970–2023)")
+    plt.setp(ax1.get_xticklabels(), rotation=45, ha='right')
+    return fig1
+
+
+def top10_trends_chart():
+    df_avg, year_columns = load_tables(version, scope)
+    df_top10 = df_avg.nlargest(10, "Average_CO2")
+    df_plot = df_top10.set_index("Name")[year_columns].T
+    df_plot.index = df_plot.index.astype(int)
+    fig2, ax2 = rendering.subplots(figsize=(14, 6))
+    for country in df_plot.columns:
+        ax2.plot(df_plot.index, df_plot[country], label=country)
+    ax2.set_xlabel("Year")
+    ax2.set_ylabel("CO₂ Emissions (kt)")
+    ax2.set_title("CO₂ Emission Timeline - Top 10 Polluting Countries")
+    ax2.legend()
+    ax2.grid(True)
+    return fig2
+
+
+def bottom10_trends_chart():
+    df_avg, year_columns = load_tables(version, scope)
+    df_plot_bottom10 = df_avg.nsmallest(10, "Average_CO2")
+    df_plot_bottom10 = df_plot_bottom10.set_index("Name")[year_columns].T
+    df_plot_bottom10.index = df_plot_bottom10.index.astype(int)
+    fig3, ax3 = rendering.subplots(figsize=(14, 6))
+    for country in df_plot_bottom10.columns:
+        ax3.plot(df_plot_bottom10.index, df_plot_bottom10[country], label=country)
+    ax3.set_xlabel("Year")
+    ax3.set_ylabel("CO₂ Emissions (kt)")
+    ax3.set_title("CO₂ Emission Timeline - Least Polluting Countries")
+    ax3.legend()
+    ax3.grid(True)
+    return fig3
+
+
+# The commentary below each chart describes the European results, other scopes show the charts only
 
 # Plot all countries
-st.subheader("Average CO₂ Emissions in European countries (1970–2023)")
-fig1, ax1 = plt.subplots(figsize=(14, 4))
-ax1.bar(df_avg_sorted["Name"], df_avg_sorted["Average_CO2"], color='mediumseagreen')
-ax1.set_ylabel("Average CO₂ Emissions (kt)")
-ax1.set_xlabel("Country")
-ax1.set_title("Average CO₂ Emissions by European Country (1970–2023)")
-plt.xticks(rotation=45, ha='right')
-st.pyplot(fig1)
-
-st.markdown("""
+st.subheader(f"Average CO₂ Emissions in {countries_label} (1970–2023)")
+rendering.chart("average_emissions", average_emissions_chart, params=(scope,), version=version)
+
+if scope == "Europe":
+    st.markdown("""
 The chart above provides a clear overview of the average CO₂ emissions for every European country over the period from 1970 to 2023. The countries are ranked from highest to lowest average emissions, highlighting the major contributors and offering insight into the overall distribution of emissions across Europe.  
 """)
 
 # Plot the top 10 countries
-st.subheader("Average CO₂ Emissions in European countries (1970–2023)")
-fig1, ax1 = plt.subplots(figsize=(14, 4))
-ax1.bar(df_avg_sorted["Name"].head(10), df_avg_sorted["Average_CO2"].head(10), color='mediumseagreen')
-ax1.set_ylabel("Average CO₂ Emissions (kt)")
-ax1.set_xlabel("Country")
-ax1.set_title("CO₂ Emissions by the Top 10 European Countries (1970–2023)")
-plt.xticks(rotation=45, ha='right')
-st.pyplot(fig1)
-
-st.markdown("""
+st.subheader(f"Average CO₂ Emissions in {countries_label} (1970–2023)")
+rendering.chart("top10_average_emissions", top10_average_chart, params=(scope,), version=version)
+
+if scope == "Europe":
+    st.markdown("""
 This next plot focuses exclusively on the top 10 European countries with the highest average CO₂ emissions, allowing us to clearly identify the leading contributors to pollution on the continent.
 
 The top 10 countries are:
@@ -100,21 +145,11 @@ Russia stands out with significantly higher CO₂ emissions compared to the othe
 """)
 
 # Plot emission trends for top 10 emitters
-df_top10 = df_avg.sort_values(by="Average_CO2", ascending=False).head(10)
-df_plot = df_top10.set_index("Name")[year_columns].T
-df_plot.index = df_plot.index.astype(int)
 st.subheader("Emission Trends: Top 10 Polluting Countries (1970–2023)")
-fig2, ax2 = plt.subplots(figsize=(14, 6))
-for country in df_plot.columns:
-    ax2.plot(df_plot.index, df_plot[country], label=country)
-ax2.set_xlabel("Year")
-ax2.set_ylabel("CO₂ Emissions (kt)")
-ax2.set_title("CO₂ Emission Timeline - Top 10 Polluting Countries")
-ax2.legend()
-ax2.grid(True)
-st.pyplot(fig2)
-
-st.markdown("""
+rendering.chart("top10_emission_trends", top10_trends_chart, params=(scope,), version=version)
+
+if scope == "Europe":
+    st.markdown("""
 The plot above presents a time series visualization of CO₂ emissions from 1970 to 2023 for the top 10 most
 polluting European countries. This dynamic view helps us observe how emissions have changed over time 
 and whether countries are making progress in reducing their impact.
@@ -127,21 +162,11 @@ which may correspond to economic, political, or environmental events worth inves
 """)
 
 # Plot emission trends for bottom 10 emitters
-df_plot_bottom10 = df_avg.sort_values(by="Average_CO2", ascending=True).head(10)
-df_plot_bottom10 = df_plot_bottom10.set_index("Name")[year_columns].T
-df_plot_bottom10.index = df_plot_bottom10.index.astype(int)
 st.subheader("Emission Trends: 10 Least Polluting Countries (1970–2023)")
-fig3, ax3 = plt.subplots(figsize=(14, 6))
-for country in df_plot_bottom10.columns:
-    ax3.plot(df_plot_bottom10.index, df_plot_bottom10[country], label=country)
-ax3.set_xlabel("Year")
-ax3.set_ylabel("CO₂ Emissions (kt)")
-ax3.set_title("CO₂ Emission Timeline - Least Polluting Countries")
-ax3.legend()
-ax3.grid(True)
-st.pyplot(fig3)
-
-st.markdown("""
+rendering.chart("bottom10_emission_trends", bottom10_trends_chart, params=(scope,), version=version)
+
+if scope == "Europe":
+    st.markdown("""
 This plot shows the CO₂ emission trends from 1970 to 2023 for the 10 least polluting 
 countries in Europe. These countries are generally smaller in both geographic size and 
 population, which naturally contributes to their lower overall emissions.
@@ -151,4 +176,3 @@ This variability may be influenced by a range of factors such as economic shifts
 
 Tracking these trends is important for understanding how smaller nations contribute to and are 
 affected by global emissions patterns — and how their environmental strategies evolve over time. """)
-
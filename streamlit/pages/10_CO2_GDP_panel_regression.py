@@ -0,0 +1,74 @@
+import numpy as np
+import streamlit as st
+
+import panel_regression
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Panel Regression of CO₂ Emissions on GDP")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+On the GDP page we compared countries through their **average** CO₂ per million USD of GDP. Here we use
+every country and every year of the Our World in Data panel to estimate the **elasticity** of CO₂
+emissions per capita with respect to GDP per capita: by how many percent emissions change when GDP grows by 1%.
+
+- **Country fixed effects** remove everything that is constant for a country (climate, geography, energy mix history)
+- **Year fixed effects** remove shocks common to all countries in a year (oil crises, recessions, COVID-19)
+- Standard errors are **clustered by country**, because yearly observations of the same country are not independent
+""")
+
+with instrumentation.stage("load"):
+    panel = panel_regression.gdp_panel()
+regions = sorted(panel['Region'].dropna().unique())
+
+col1, col2 = st.columns(2)
+selected_regions = col1.multiselect("Regions (empty = whole world)", options=regions, default=["Europe"])
+years = col2.slider("Years", min_value=1950, max_value=int(panel['Year'].max()), value=(1970, 2023))
+
+col1, col2, col3 = st.columns(3)
+country_fe = col1.checkbox("Country fixed effects", value=True)
+year_fe = col2.checkbox("Year fixed effects", value=True)
+quadratic = col3.checkbox("Add log GDP² (environmental Kuznets curve)", value=False)
+
+with instrumentation.stage("transform"):
+    df = panel_regression.filter_panel(panel, regions=selected_regions, years=years)
+effects = [effect for effect, on in [('Code', country_fe), ('Year', year_fe)] if on]
+x = ['log_gdp', 'log_gdp_sq'] if quadratic else ['log_gdp']
+
+if df['Code'].nunique() < 2:
+    st.warning("Select at least two countries worth of data.")
+    st.stop()
+
+with instrumentation.stage("model"):
+    coefficients, info, within = panel_regression.fixed_effects_regression(df, x=x, effects=effects)
+
+elasticity = coefficients.loc['log_gdp']
+if quadratic:
+    # With log GDP² the elasticity changes with GDP: shown at the mean log GDP of the sample
+    mean_log_gdp = df['log_gdp'].mean()
+    at_mean = panel_regression.quadratic_elasticity(coefficients, info, mean_log_gdp)
+    st.metric("GDP elasticity of CO₂ per capita at the mean log GDP", f"{at_mean['coef']:.3f}",
+              help=f"b₁ + 2·b₂·log GDP at a GDP per capita of {np.exp(mean_log_gdp):,.0f} USD; "
+                   f"95% CI {at_mean['ci_low']:.3f} to {at_mean['ci_high']:.3f} (delta method)")
+else:
+    st.metric("GDP elasticity of CO₂ per capita", f"{elasticity['coef']:.3f}",
+              help=f"95% CI {elasticity['ci_low']:.3f} to {elasticity['ci_high']:.3f}")
+st.dataframe(coefficients)
+st.caption(f"{info['n_obs']:,} observations · {info['n_countries']} countries · {info['n_years']} years · "
+           f"within R² {info['within_r2']:.3f}")
+
+if not quadratic:
+    fig, ax = rendering.subplots(figsize=(10, 5))
+    ax.scatter(within['x'], within['y'], s=6, alpha=0.3, color='steelblue')
+    x_range = within['x'].agg(['min', 'max'])
+    ax.plot(x_range, elasticity['coef'] * x_range, color='red', linewidth=2,
+            label=f"Elasticity {elasticity['coef']:.2f}")
+    ax.set_xlabel('log GDP per capita (after removing fixed effects)')
+    ax.set_ylabel('log CO₂ per capita (after removing fixed effects)')
+    ax.set_title('Within-country relationship between GDP and CO₂ emissions')
+    ax.legend()
+    ax.grid(True, linestyle='--', alpha=0.5)
+    fig.tight_layout()
+    rendering.pyplot(fig)
@@ -0,0 +1,57 @@
+import streamlit as st
+
+import co2_data
+import similarity
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Countries with Similar Emission Trajectories")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+Which countries followed a path similar to Germany's or Poland's? Every country's 1970–2023 emission
+series is **standardised** (mean 0, standard deviation 1), so we compare the *shape* of the trajectory
+rather than its size. Countries can also be compared by their **sector mix** — the share of total
+emissions coming from each sector.
+
+All pairwise distances are computed once per data release, so looking up a country is instant.
+""")
+
+with instrumentation.stage("load"):
+    names, z, _ = similarity.country_series()
+    years = [int(year) for year in co2_data.year_columns(co2_data.load_emissions())]
+
+col1, col2, col3 = st.columns(3)
+options = names.sort_values().index
+country = col1.selectbox("Country", options=options, index=list(options).index('DEU'),
+                         format_func=lambda code: names[code])
+metric = col2.selectbox("Similarity measure", options=list(similarity.METRICS),
+                        format_func=similarity.METRICS.get)
+k = col3.slider("Number of similar countries", min_value=3, max_value=15, value=5)
+europe_only = st.checkbox("Only compare with European countries", value=False)
+
+with st.spinner("Computing distances (only needed once per data version)..."):
+    with instrumentation.stage("model"):
+        similarity.distance_matrices()
+
+with instrumentation.stage("model"):
+    candidates = None
+    if europe_only:
+        candidates = co2_data.europe_emissions(co2_data.load_emissions())['Country_code'].unique()
+    nearest = similarity.most_similar(country, metric, k, candidates)
+
+st.subheader(f"Most similar to {names[country]}")
+st.dataframe(nearest.reset_index(drop=True))
+
+fig, ax = rendering.subplots(figsize=(12, 5))
+ax.plot(years, z[names.index.get_loc(country)], color='black', linewidth=3, label=names[country])
+for code in nearest.index:
+    ax.plot(years, z[names.index.get_loc(code)], linewidth=1.5, alpha=0.8, label=names[code])
+ax.set_xlabel('Year')
+ax.set_ylabel('Standardised CO₂ emissions')
+ax.set_title(f'Emission trajectories of countries most similar to {names[country]}')
+ax.legend(fontsize='small', ncol=2)
+ax.grid(True, linestyle='--', alpha=0.5)
+fig.tight_layout()
+rendering.pyplot(fig)
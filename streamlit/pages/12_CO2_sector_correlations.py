@@ -0,0 +1,53 @@
+import seaborn as sns
+import streamlit as st
+
+import sector_correlation
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Correlation of Sectors with Total CO₂ Emissions")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+In our correlation analysis we looked at how strongly each sector follows the total CO₂ emissions for
+a handful of the largest emitters. Here the same correlations are available for **every country**:
+
+- **Pearson** — do the sector and the total move together linearly?
+- **Spearman** — do they rise and fall together, regardless of the exact shape?
+- **Year-to-year changes** — do yearly *changes* line up? This removes the shared long-term trend,
+  which otherwise makes almost every sector look correlated with the total.
+""")
+
+with instrumentation.stage("load"):
+    names, sectors, _, _ = sector_correlation.sector_cube()
+
+col1, col2 = st.columns(2)
+options = names.sort_values().index
+country = col1.selectbox("Country", options=options, index=list(options).index('DEU'),
+                         format_func=lambda code: names[code])
+method = col2.selectbox("Method", options=list(sector_correlation.METHODS),
+                        format_func=sector_correlation.METHODS.get)
+
+with instrumentation.stage("model"):
+    matrix = sector_correlation.country_matrix(country, method)
+
+st.subheader(f"Sector correlation matrix – {names[country]}")
+fig, ax = rendering.subplots(figsize=(14, 11))
+sns.heatmap(matrix, cmap='coolwarm', vmin=-1, vmax=1, center=0, square=True,
+            annot=len(matrix) <= 16, fmt='.2f', linewidths=0.5, ax=ax)
+ax.set_title(f"{sector_correlation.METHODS[method]} between sectors ({names[country]}, 1970–2023)")
+fig.tight_layout()
+rendering.pyplot(fig)
+
+st.subheader("Correlation of each sector with the total")
+with_total = matrix['Total'].drop('Total').dropna().sort_values()
+fig, ax = rendering.subplots(figsize=(10, max(3, 0.3 * len(with_total))))
+ax.barh(with_total.index, with_total.values,
+        color=['seagreen' if value > 0 else 'crimson' for value in with_total.values])
+ax.axvline(0, color='black', linewidth=0.8)
+ax.set_xlim(-1, 1)
+ax.set_xlabel('Correlation with total CO₂ emissions')
+ax.grid(axis='x', linestyle='--', alpha=0.5)
+fig.tight_layout()
+rendering.pyplot(fig)
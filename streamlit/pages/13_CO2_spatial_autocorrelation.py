@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from matplotlib.patches import Patch
+
+import spatial
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Spatial Clusters of CO₂ Emissions")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+Do neighbouring countries emit alike? **Moran's I** measures how much a country's value resembles the
+values of its neighbours: above 0 similar countries lie next to each other, around 0 the map looks random.
+
+The local version of the statistic finds where this happens:
+
+- **Hot spots** — high values surrounded by high values
+- **Cold spots** — low values surrounded by low values
+- **Outliers** — a country that differs from its neighbourhood
+
+Significance comes from 999 random reshuffles of the values over the map; only countries with a
+pseudo p-value of at most 0.05 are coloured.
+""")
+
+col1, col2 = st.columns(2)
+metric = col1.selectbox("Metric", options=list(spatial.METRICS), format_func=spatial.METRICS.get)
+kind = col2.selectbox("Neighbours", options=list(spatial.WEIGHTS), format_func=spatial.WEIGHTS.get)
+
+with instrumentation.stage("model"):
+    result = spatial.moran(metric, kind)
+version = spatial.data_version()
+years = np.arange(spatial.FIRST_YEAR, spatial.LAST_YEAR + 1)
+
+QUADRANT_COLORS = {0: '#eeeeee', 1: '#d7191c', 2: '#abd9e9', 3: '#2c7bb6', 4: '#fdae61'}
+
+
+def draw_global():
+    fig, ax = rendering.subplots(figsize=(12, 4))
+    significant = result["global_p"] <= spatial.SIGNIFICANCE
+    ax.plot(years, result["global_i"], color='black', linewidth=1)
+    ax.scatter(years[significant], result["global_i"][significant], color='crimson', zorder=3,
+               label=f"Significant (p ≤ {spatial.SIGNIFICANCE})")
+    ax.scatter(years[~significant], result["global_i"][~significant], facecolor='white', edgecolor='black',
+               zorder=3, label="Not significant")
+    ax.axhline(0, color='grey', linewidth=0.8)
+    ax.set_ylabel("Global Moran's I")
+    ax.set_title(f"{spatial.METRICS[metric]} – {spatial.WEIGHTS[kind].lower()}")
+    ax.grid(linestyle='--', alpha=0.5)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+st.subheader("Global Moran's I over time")
+rendering.chart("global_moran", draw_global, params=(metric, kind), version=version)
+
+
+def draw_clusters(year):
+    column = year - spatial.FIRST_YEAR
+    gdf = spatial.countries()
+    has_value = np.isfinite(result["local_i"][:, column])
+    colors = [QUADRANT_COLORS[quadrant] if present else 'white'
+              for quadrant, present in zip(result["quadrant"][:, column], has_value)]
+
+    fig, ax = rendering.subplots(figsize=(18, 9))
+    gdf.plot(color=colors, edgecolor='0.6', linewidth=0.4, ax=ax)
+    ax.set_xlim(-180, 180)
+    ax.set_ylim(-60, 85)
+    ax.axis('off')
+    ax.set_title(f"Hot and cold spots – {spatial.METRICS[metric]} ({year})", fontsize=18)
+    handles = [Patch(facecolor=QUADRANT_COLORS[quadrant], edgecolor='0.6', label=label)
+               for quadrant, label in spatial.QUADRANTS.items()]
+    handles.append(Patch(facecolor='white', edgecolor='0.6', label="No data"))
+    ax.legend(handles=handles, loc='lower left', fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+# The map is a fragment: moving the slider redraws only the map and its table
+@instrumentation.fragment
+def cluster_map():
+    st.subheader("Hot and cold spots")
+    year = st.slider("Year", min_value=int(years[0]), max_value=int(years[-1]), value=2020, key="spatial_year")
+    column = year - spatial.FIRST_YEAR
+    rendering.chart("moran_clusters", lambda: draw_clusters(year), params=(metric, kind, year), version=version)
+
+    p_value = result["global_p"][column]
+    if np.isnan(p_value):
+        st.info(f"Not enough countries have data for {year}.")
+        return
+    st.markdown(f"Global Moran's I in {year}: **{result['global_i'][column]:.3f}** (p = {p_value:.3f})")
+
+    gdf = spatial.countries()
+    quadrant = result["quadrant"][:, column]
+    significant = pd.DataFrame({
+        'Country': gdf['ADMIN'],
+        'Cluster': [spatial.QUADRANTS[value] for value in quadrant],
+        'Value': spatial.metric_values(metric)[:, column],
+        "Local Moran's I": result["local_i"][:, column],
+        'p-value': result["local_p"][:, column],
+    })[quadrant > 0].sort_values(['Cluster', 'Value'], ascending=[True, False])
+    st.dataframe(significant, hide_index=True)
+
+
+cluster_map()
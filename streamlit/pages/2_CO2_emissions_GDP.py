@@ -1,13 +1,20 @@
 import pandas as pd
-import seaborn as sns
 import streamlit as st
-import geopandas as gpd
 import matplotlib.pyplot as plt
 
 from pathlib import Path
 
+import co2_data
+import co2_query
+import instrumentation
+import rendering
+import world_scale
+
 st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
 st.title("Visualizing CO₂ Emissions in Relation to country's GDP")
+instrumentation.start_run(__file__)
+scope = world_scale.select_scope()
+place = world_scale.place_label(scope)
 
 st.markdown("""
 This page explores the relationship between a country's Gross Domestic Product (GDP) and its CO₂ emissions.
@@ -28,127 +35,153 @@ their emissions low despite economic activity.
 
 data_path1 = Path(__file__).resolve().parents[2] / "data" / "co2_emmisions_complicated.csv"
 data_path2 = Path(__file__).resolve().parents[2] / "data" / "co2-emissions-vs-gdp.csv"
-data_path3 = Path(__file__).resolve().parents[2] / "data" / "cultural" / "ne_110m_admin_0_countries.shp"
-df_co2 = pd.read_csv(data_path1)
-df_gdp  = pd.read_csv(data_path2)
-world = gpd.read_file(data_path3)
-
-
-# Filtering the data only for European countries
-df_co2_europe = df_co2[df_co2['Region'].str.contains('Europe', case=False, na=False)]
-
-# Add Russia
-df_russia = df_co2[df_co2['Name'].str.contains('Russian Federation', case=False, na=False)].copy()
-df_russia['Name'] = df_russia['Name'].replace('Russian Federation', 'Russia')
 
-# Add Ukraine
-df_ukraine = df_co2[df_co2['Name'].str.contains('Ukraine', case=False, na=False)].copy()
+# Cache key of the charts and tables below: they are only recomputed when a data file changes
+version = co2_data.data_version(data_path1, data_path2)
+
+
+@st.cache_data(show_spinner=False)
+def load_tables(version, scope):
+    """CO₂ emissions per million USD of GDP for every country in `scope`, worst and best ten."""
+    with instrumentation.stage("load"):
+        co2_query.table()
+        df_gdp = co2_data.load_gdp()
+
+    with instrumentation.stage("transform"):
+        # Europe as on every page (Russia, Ukraine, Belarus and Moldova added, Serbia and Montenegro split)
+        df_co2_scope = co2_query.frame(co2_query.scope_codes(scope))
+
+        if scope == "Europe":
+            # List of European countries (adjust if needed to match your data exactly)
+            european_countries = [
+                "Albania", "Andorra", "Armenia", "Austria", "Azerbaijan", "Belarus", "Belgium",
+                "Bosnia and Herzegovina", "Bulgaria", "Croatia", "Cyprus", "Czechia", "Denmark",
+                "Estonia", "Finland", "France", "Georgia", "Germany", "Greece", "Hungary",
+                "Iceland", "Ireland", "Italy", "Kazakhstan", "Kosovo", "Latvia", "Liechtenstein",
+                "Lithuania", "Luxembourg", "Malta", "Moldova", "Monaco", "Montenegro",
+                "Netherlands", "North Macedonia", "Norway", "Poland", "Portugal", "Romania",
+                "Russia", "San Marino", "Serbia", "Slovakia", "Slovenia", "Spain", "Sweden",
+                "Switzerland", "Turkey", "Ukraine", "United Kingdom", "Vatican"
+            ]
+
+            # Filter for European countries
+            df_gdp_scope = df_gdp[df_gdp['Entity'].isin(european_countries)].copy()
+        else:
+            # Other scopes take the GDP rows of the countries with emissions, by ISO code
+            df_gdp_scope = df_gdp[df_gdp['Code'].isin(df_co2_scope['Country_code'])].copy()
+
+
+        df_gdp_scope = df_gdp_scope[df_gdp_scope['Year'] >= 1970]
 
-# Add Belarus
-df_belarus = df_co2[df_co2['Name'].str.contains('Belarus', case=False, na=False)].copy()
+        gdp_avg = df_gdp_scope.groupby(['Code', 'Entity']).agg({
+            'GDP per capita': 'mean',
+            'Population (historical)': 'mean'
+        }).dropna()
 
-# Add Moldova
-df_moldova = df_co2[df_co2['Name'].str.contains('Moldova', case=False, na=False)].copy()
-df_moldova['Name'] = df_moldova['Name'].replace('Moldova, Republic of', 'Moldova')
+        gdp_avg['avg_total_gdp'] = gdp_avg['GDP per capita'] * gdp_avg['Population (historical)']
+        gdp_avg = gdp_avg.reset_index() 
 
-# Combine all
-df_co2_europe = pd.concat([df_co2_europe, df_russia, df_ukraine, df_belarus, df_moldova]).drop_duplicates()
 
-# List of European countries (adjust if needed to match your data exactly)
-european_countries = [
-    "Albania", "Andorra", "Armenia", "Austria", "Azerbaijan", "Belarus", "Belgium",
-    "Bosnia and Herzegovina", "Bulgaria", "Croatia", "Cyprus", "Czechia", "Denmark",
-    "Estonia", "Finland", "France", "Georgia", "Germany", "Greece", "Hungary",
-    "Iceland", "Ireland", "Italy", "Kazakhstan", "Kosovo", "Latvia", "Liechtenstein",
-    "Lithuania", "Luxembourg", "Malta", "Moldova", "Monaco", "Montenegro",
-    "Netherlands", "North Macedonia", "Norway", "Poland", "Portugal", "Romania",
-    "Russia", "San Marino", "Serbia", "Slovakia", "Slovenia", "Spain", "Sweden",
-    "Switzerland", "Turkey", "Ukraine", "United Kingdom", "Vatican"
-]
+        # Average emissions, computed once per process for all countries
+        df_co2_scope['avg_total_co2'] = co2_query.period_mean("total")[co2_query.rows(df_co2_scope['Country_code'])]
+        co2_avg = df_co2_scope[['Country_code', 'Name', 'avg_total_co2']]
 
-# Filter for European countries
-df_gdp_europe = df_gdp[df_gdp['Entity'].isin(european_countries)].copy()
+        # merge both dataframes in one
+        combined_df = pd.merge(
+            gdp_avg,
+            co2_avg,
+            left_on='Code',
+            right_on='Country_code',
+            how='inner'
+        )
 
-row = df_co2_europe[df_co2_europe['Name'] == 'Serbia and Montenegro'].copy()
+        # Calculate CO₂ per dollar and per million dollars
+        combined_df['co2_per_dollar'] = combined_df['avg_total_co2'] / combined_df['avg_total_gdp']
+        combined_df['co2_per_million_dollars'] = combined_df['co2_per_dollar'] * 1_000_000
 
-serbia_row = row.copy()
-montenegro_row = row.copy()
+        # clean up the dataframe
+        result_df = combined_df[['Entity', 'Code', 'avg_total_co2', 'avg_total_gdp', 'co2_per_dollar', 'co2_per_million_dollars']]
 
-serbia_row['Country_code'] = 'SRB'
-serbia_row['Name'] = 'Serbia'
+        # ten worst and best by CO2 per million dollars, without sorting every country
+        result_df_worst = result_df.nlargest(10, 'co2_per_million_dollars')
+        result_df_best = result_df.nsmallest(10, 'co2_per_million_dollars')
+    return result_df, result_df_worst, result_df_best
 
-montenegro_row['Country_code'] = 'MNE'
-montenegro_row['Name'] = 'Montenegro'
 
-year_columns = [col for col in df_co2_europe.columns if col.isdigit()]
+# The charts are drawn once per data version and then served from the chart cache of all sessions
+def worst_countries_chart():
+    result_df, result_df_worst, result_df_best = load_tables(version, scope)
+    fig, ax = rendering.subplots(figsize=(10, 4))
+    bars = ax.bar(result_df_worst['Entity'].head(10), result_df_worst['co2_per_million_dollars'].head(10), color='red')
 
-# Split the CO2 data by 85% and 15% because Serbia is much bigger than Montenegro by area and by population
-serbia_row[year_columns] = row[year_columns] * 0.96
-montenegro_row[year_columns] = row[year_columns] * 0.04
+    ax.set_title('Top 10 Worst Countries (Highest CO₂ per Million USD GDP)')
+    ax.set_ylabel('Tons CO₂ per Million USD GDP')
+    ax.tick_params(axis='x', labelrotation=45)
+    plt.setp(ax.get_xticklabels(), ha='right')
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
 
-# Drop the original Serbia and Montenegro row
-df_co2_europe = df_co2_europe[df_co2_europe['Name'] != 'Serbia and Montenegro']
+    # Add value labels on top of the bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, height + 0.01, f"{height:.2f}", ha='center', fontsize=8)
 
-# Append the two new rows
-df_co2_europe = pd.concat([df_co2_europe, serbia_row, montenegro_row], ignore_index=True)
+    fig.tight_layout()
+    return fig
 
 
-df_gdp_europe = df_gdp_europe[df_gdp_europe['Year'] >= 1970]
+def best_countries_chart():
+    result_df, result_df_worst, result_df_best = load_tables(version, scope)
+    fig, ax = rendering.subplots(figsize=(10, 4))
+    bars = ax.bar(result_df_best['Entity'].head(10), result_df_best['co2_per_million_dollars'].head(10), color='green')
 
-gdp_avg = df_gdp_europe.groupby(['Code', 'Entity']).agg({
-    'GDP per capita': 'mean',
-    'Population (historical)': 'mean'
-}).dropna()
+    ax.set_title('Top 10 Best Countries (Lowest CO₂ per Million USD GDP)')
+    ax.set_ylabel('Tons CO₂ per Million USD GDP')
+    ax.tick_params(axis='x', labelrotation=45)
+    plt.setp(ax.get_xticklabels(), ha='right')
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
 
-gdp_avg['avg_total_gdp'] = gdp_avg['GDP per capita'] * gdp_avg['Population (historical)']
-gdp_avg = gdp_avg.reset_index() 
+    # Add value labels on top of the bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, height + 0.01, f"{height:.2f}", ha='center', fontsize=8)
 
+    fig.tight_layout()
+    return fig
 
-co2_cols = df_co2_europe.columns[df_co2_europe.columns.str.fullmatch(r'\d{4}')]  # only year columns
-df_co2_europe['avg_total_co2'] = df_co2_europe[co2_cols].mean(axis=1)
-co2_avg = df_co2_europe[['Country_code', 'Name', 'avg_total_co2']]
 
-# merge both dataframes in one
-combined_df = pd.merge(
-    gdp_avg,
-    co2_avg,
-    left_on='Code',
-    right_on='Country_code',
-    how='inner'
-)
+def intensity_map():
+    result_df, result_df_worst, result_df_best = load_tables(version, scope)
 
-# Calculate CO₂ per dollar and per million dollars
-combined_df['co2_per_dollar'] = combined_df['avg_total_co2'] / combined_df['avg_total_gdp']
-combined_df['co2_per_million_dollars'] = combined_df['co2_per_dollar'] * 1_000_000
+    fig, ax = rendering.subplots(1, 1, figsize=(10, 5))
 
-# clean up the dataframe
-result_df = combined_df[['Entity', 'Code', 'avg_total_co2', 'avg_total_gdp', 'co2_per_dollar', 'co2_per_million_dollars']]
+    # Countries are matched by ISO code; the shapes are simplified to the level of detail of the map's size
+    world_scale.scope_map(
+        ax,
+        result_df.set_index('Code')['co2_per_million_dollars'],
+        scope,
+        cmap='YlGnBu',
+        linewidth=0.8 if scope == "Europe" else 0.3,
+        edgecolor='0.8',
+        legend=True,
+        legend_kwds={'label': "CO₂ Emissions per Million USD GDP", 'shrink': 0.9}
+    )
+    ax.set_title(f'CO₂ Emissions per Million USD GDP in {place}', fontsize=16, weight='bold')
 
-# sort by CO2 per million dollars
-result_df_worst = result_df.sort_values(by='co2_per_million_dollars', ascending=False)
-result_df_best = result_df.sort_values(by='co2_per_million_dollars', ascending=True)
+    fig.tight_layout()
+    return fig
 
 
-fig, ax = plt.subplots(figsize=(10, 4))
-bars = ax.bar(result_df_worst['Entity'].head(10), result_df_worst['co2_per_million_dollars'].head(10), color='red')
+# The commentary below each chart describes the European results, other scopes show the charts only
 
-ax.set_title('Top 10 Worst Countries (Highest CO₂ per Million USD GDP)')
-ax.set_ylabel('Tons CO₂ per Million USD GDP')
-ax.set_xticklabels(result_df_worst['Entity'].head(10), rotation=45, ha='right')
-ax.grid(axis='y', linestyle='--', alpha=0.7)
+_, result_df_worst, result_df_best = load_tables(version, scope)
 
-# Add value labels on top of the bars
-for bar in bars:
-    height = bar.get_height()
-    ax.text(bar.get_x() + bar.get_width() / 2, height + 0.01, f"{height:.2f}", ha='center', fontsize=8)
-
-plt.tight_layout()
-st.pyplot(fig)
+rendering.chart("worst_co2_per_gdp", worst_countries_chart, params=(scope,), version=version)
 
 # Optionally display the dataframe table below the chart
 st.dataframe(result_df_worst.head(10))
 
-st.markdown("""
+if scope == "Europe":
+    st.markdown("""
 As seen in the plot above, the top 10 worst-performing countries in terms of **CO₂ emissions
 per 1,000,000 USD of GDP** are:
 
@@ -178,26 +211,13 @@ This view helps us better understand which economies may benefit the most from c
 
 st.markdown("### Top 10 Best Countries (Lowest CO₂ per Million USD GDP)")
 
-fig, ax = plt.subplots(figsize=(10, 4))
-bars = ax.bar(result_df_best['Entity'].head(10), result_df_best['co2_per_million_dollars'].head(10), color='green')
-
-ax.set_title('Top 10 Best Countries (Lowest CO₂ per Million USD GDP)')
-ax.set_ylabel('Tons CO₂ per Million USD GDP')
-ax.set_xticklabels(result_df_best['Entity'].head(10), rotation=45, ha='right')
-ax.grid(axis='y', linestyle='--', alpha=0.7)
-
-# Add value labels on top of the bars
-for bar in bars:
-    height = bar.get_height()
-    ax.text(bar.get_x() + bar.get_width() / 2, height + 0.01, f"{height:.2f}", ha='center', fontsize=8)
-
-plt.tight_layout()
-st.pyplot(fig)
+rendering.chart("best_co2_per_gdp", best_countries_chart, params=(scope,), version=version)
 
 # Optionally display the dataframe table below the chart
 st.dataframe(result_df_best.head(10))
 
-st.markdown(""" 
+if scope == "Europe":
+    st.markdown(""" 
 On the above plot are the top 10 best-performing countries in terms of **CO₂ emissions per 1,000,000 
 USD of GDP**. These countries are:
 
@@ -230,43 +250,13 @@ This ranking shows a clear trend: **strong climate policy, clean energy investme
 economies** play a significant role in decoupling GDP growth from CO₂ emissions.
 """)
 
-st.markdown("### Map visualization of CO2 emissions per 1,000,000$ in Europe")
-
-# Rename and replace country names
-result_df = result_df.rename(columns={'Entity': 'Country'})
-result_df['Country'] = result_df['Country'].replace({'Czech Republic': 'Czechia'})
-result_df['Country'] = result_df['Country'].replace({'Bosnia and Herzegovina': 'Bosnia and Herz.'})
-
-# Merge world map with data
-map_df = world.merge(result_df, left_on='NAME', right_on='Country', how='inner')
-
-# Filter for Europe
-map_df = map_df[map_df['CONTINENT'] == 'Europe']
+st.markdown(f"### Map visualization of CO2 emissions per 1,000,000$ in {place}")
 
-# Set map bounds
-minx, miny, maxx, maxy = -25, 34, 45, 72
+rendering.chart("co2_per_gdp_map", intensity_map, params=(scope,), version=version)
 
-fig, ax = plt.subplots(1, 1, figsize=(10, 5))
 
-map_df.plot(
-    column='co2_per_million_dollars',
-    cmap='YlGnBu',
-    linewidth=0.8,
-    edgecolor='0.8',
-    legend=True,
-    ax=ax,
-    legend_kwds={'label': "CO₂ Emissions per Million USD GDP", 'shrink': 0.9}
-)
-
-ax.set_xlim(minx, maxx)
-ax.set_ylim(miny, maxy)
-ax.set_title('CO₂ Emissions per Million USD GDP by European Country', fontsize=16, weight='bold')
-ax.axis('off')
-
-plt.tight_layout()
-st.pyplot(fig)
-
-st.markdown(""" 
+if scope == "Europe":
+    st.markdown(""" 
 On the map above, you can see a visual representation of **CO₂ emissions per 1,000,000$ 
 of GDP** across European countries. The darker the shade, the higher the emissions relative to economic output.
 
@@ -279,4 +269,4 @@ appear much more efficient.
 This approach—calculating **CO₂ per economic output**—is a useful way to account for both emissions
 and the size of a country’s economy. It allows us to identify nations that generate more pollution
 relative to their productivity.
-""")
\ No newline at end of file
+""")
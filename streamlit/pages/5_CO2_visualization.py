@@ -1,26 +1,23 @@
 import warnings
 warnings.filterwarnings('ignore')
-import geodatasets
 import pandas as pd
-import seaborn as sns
 import streamlit as st
-import geopandas as gpd
-import matplotlib as mpl
-import ipywidgets as widgets
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import matplotlib.gridspec as gridspec
 
 from pathlib import Path
-from IPython.display import display
-from matplotlib.colors import Normalize
-from matplotlib.animation import FuncAnimation
-from ipywidgets import interact, IntSlider, widgets
-from cryptography.utils import CryptographyDeprecationWarning
+
+import co2_data
+import co2_query
+import instrumentation
+import rendering
+import timelapse
 
 
 st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
 st.title("CO₂ Emissions clustering")
+instrumentation.start_run(__file__)
 
 st.markdown("""
 This page has a few interactive visualizations about the CO2 emissions in Europe from 1970 to 2023.
@@ -30,117 +27,86 @@ This page has a few interactive visualizations about the CO2 emissions in Europe
 data_path1 = Path(__file__).resolve().parents[2] / "data" / "co2_emmisions_complicated.csv"
 data_path2 = Path(__file__).resolve().parents[2] / "data" / "co2-emissions-vs-gdp.csv"
 data_path3 = Path(__file__).resolve().parents[2] / "data" / "world_population.csv"
-data_path4 = Path(__file__).resolve().parents[2] / "data" / "cultural" / "ne_110m_admin_0_countries.shp"
-
-df_co2 = pd.read_csv(data_path1)
-df_gdp  = pd.read_csv(data_path2)
-df_pop = pd.read_csv(data_path3)
-world = gpd.read_file(data_path4)
-
-
-
-# Filtering the data only for European countries
-df_co2_europe = df_co2[df_co2['Region'].str.contains('Europe', case=False, na=False)]
 
-# Add Russia
-df_russia = df_co2[df_co2['Name'].str.contains('Russian Federation', case=False, na=False)].copy()
-df_russia['Name'] = df_russia['Name'].replace('Russian Federation', 'Russia')
+version = co2_data.data_version(data_path1, data_path2, data_path3)
 
-# Add Ukraine
-df_ukraine = df_co2[df_co2['Name'].str.contains('Ukraine', case=False, na=False)].copy()
+@st.cache_data
+def load_tables(version):
+    """European emissions, GDP panel and population table, loaded once per data version instead of on every rerun."""
+    # Europe as on every page (Russia, Ukraine, Belarus and Moldova added, Serbia and Montenegro split)
+    df_co2_europe = co2_query.frame(co2_query.scope_codes("Europe"))
+    return df_co2_europe, co2_data.load_gdp(), co2_data.load_population()
 
-# Add Belarus
-df_belarus = df_co2[df_co2['Name'].str.contains('Belarus', case=False, na=False)].copy()
 
-# Add Moldova
-df_moldova = df_co2[df_co2['Name'].str.contains('Moldova', case=False, na=False)].copy()
-df_moldova['Name'] = df_moldova['Name'].replace('Moldova, Republic of', 'Moldova')
+with instrumentation.stage("load"):
+    df_co2_europe, df_gdp, df_pop = load_tables(version)
+    world = co2_data.load_world()
 
-# Combine all
-df_co2_europe = pd.concat([df_co2_europe, df_russia, df_ukraine, df_belarus, df_moldova]).drop_duplicates()
-df_pop_europe = df_pop[df_pop['Continent'] == 'Europe']
 
-row = df_co2_europe[df_co2_europe['Name'] == 'Serbia and Montenegro'].copy()
 
-serbia_row = row.copy()
-montenegro_row = row.copy()
+with instrumentation.stage("transform"):
+    df_pop_europe = df_pop[df_pop['Continent'] == 'Europe']
 
-serbia_row['Country_code'] = 'SRB'
-serbia_row['Name'] = 'Serbia'
+    years = ['1970', '1980', '1990', '2000', '2010', '2015', '2020', '2022']
 
-montenegro_row['Country_code'] = 'MNE'
-montenegro_row['Name'] = 'Montenegro'
+    df_co2_filtered = df_co2_europe[['Name'] + years]
 
-year_columns = [col for col in df_co2_europe.columns if col.isdigit()]
+    pop_years = [f"{year} Population" for year in [1970, 1980, 1990, 2000, 2010, 2015, 2020, 2022]]
+    df_pop_filtered = df_pop_europe[['Country/Territory'] + pop_years]
 
-# Split the CO2 data by 85% and 15% because Serbia is much bigger than Montenegro by area and by population
-serbia_row[year_columns] = row[year_columns] * 0.96
-montenegro_row[year_columns] = row[year_columns] * 0.04
+    # total CO2 per year
+    co2_total = df_co2_filtered[years].sum()
 
-# Drop the original Serbia and Montenegro row
-df_co2_europe = df_co2_europe[df_co2_europe['Name'] != 'Serbia and Montenegro']
+    # total population per year
+    pop_total = df_pop_filtered[pop_years].sum()
+    pop_total.index = years # index -> years
+    co2__ = df_co2_europe[['Name']]
+    pop__ = df_pop_europe[['Country/Territory']]
 
-# Append the two new rows
-df_co2_europe = pd.concat([df_co2_europe, serbia_row, montenegro_row], ignore_index=True)
+    df_merged = pd.merge(df_co2_filtered,df_pop_filtered, left_on='Name', right_on='Country/Territory', how='inner')
 
-years = ['1970', '1980', '1990', '2000', '2010', '2015', '2020', '2022']
 
-df_co2_filtered = df_co2_europe[['Name'] + years]
+    # Calculate CO2 per capita for each year
+    df_per_capita = df_merged.copy()
 
-pop_years = [f"{year} Population" for year in [1970, 1980, 1990, 2000, 2010, 2015, 2020, 2022]]
-df_pop_filtered = df_pop_europe[['Country/Territory'] + pop_years]
+    for year in years:
+        co2_col = year
+        pop_col = f"{year} Population"
+        df_per_capita[year] = df_per_capita[co2_col] / df_per_capita[pop_col]
 
-# total CO2 per year
-co2_total = df_co2_filtered[years].sum()
+    # Keep only country names and per capita columns
+    df_per_capita = df_per_capita[['Name'] + years]
 
-# total population per year
-pop_total = df_pop_filtered[pop_years].sum()
-pop_total.index = years # index -> years
-co2__ = df_co2_europe[['Name']]
-pop__ = df_pop_europe[['Country/Territory']]
 
-df_merged = pd.merge(df_co2_filtered,df_pop_filtered, left_on='Name', right_on='Country/Territory', how='inner')
+    # Your CO2 data
+    df = df_per_capita
 
+    name_corrections = {
+        "Czech Republic": "Czechia",
+        "Bosnia and Herzovina": "Bosnia and Herz.",
+        "Macedonia": "Macedonia",
+        "United Kingdom": "United Kingdom",
+        "Russia": "Russia",
+        "Moldova": "Moldova",
+        "Slovakia": "Slovakia",
+        "Serbia": "Republic of Serbia",
+        "Montenegro": "Montenegro",
+        "Germany": "Germany"
+    }
 
-# Calculate CO2 per capita for each year
-df_per_capita = df_merged.copy()
+    df_melted = df.melt(id_vars=['Name'], var_name='Year', value_name='CO2_per_capita')
+    df_melted["Name"] = df_melted["Name"].replace(name_corrections)
 
-for year in years:
-    co2_col = year
-    pop_col = f"{year} Population"
-    df_per_capita[year] = df_per_capita[co2_col] / df_per_capita[pop_col]
-
-# Keep only country names and per capita columns
-df_per_capita = df_per_capita[['Name'] + years]
-
-
-# Your CO2 data
-df = df_per_capita
-
-name_corrections = {
-    "Czech Republic": "Czechia",
-    "Bosnia and Herzovina": "Bosnia and Herz.",
-    "Macedonia": "Macedonia",
-    "United Kingdom": "United Kingdom",
-    "Russia": "Russia",
-    "Moldova": "Moldova",
-    "Slovakia": "Slovakia",
-    "Serbia": "Republic of Serbia",
-    "Montenegro": "Montenegro",
-    "Germany": "Germany"
-}
+    # Convert 'Year' column to int
+    df_melted['Year'] = df_melted['Year'].astype(int)
 
-df_melted = df.melt(id_vars=['Name'], var_name='Year', value_name='CO2_per_capita')
-df_melted["Name"] = df_melted["Name"].replace(name_corrections)
+    # Your exact years list
+    years = [1970, 1980, 1990, 2000, 2010, 2015, 2020, 2022]
 
-# Convert 'Year' column to int
-df_melted['Year'] = df_melted['Year'].astype(int)
-
-# Your exact years list
-years = [1970, 1980, 1990, 2000, 2010, 2015, 2020, 2022]
-
-europe = world[world['CONTINENT'] == 'Europe']
+    europe = world[world['CONTINENT'] == 'Europe']
 
+# Each map is a fragment: moving its slider reruns only that map, not the whole page
+@instrumentation.fragment
 def create_map_app(df_melted, europe, years):
     # Calculate GLOBAL min and max values for consistent coloring
     vmin = df_melted['CO2_per_capita'].min()
@@ -157,8 +123,14 @@ def create_map_app(df_melted, europe, years):
         value=years[0]
     )
     
+    # Each year is drawn once and then served from the chart cache
+    rendering.chart("per_capita_year_map", lambda: plot_per_capita_map(df_melted, europe, year, norm, cmap),
+                    params=(year,), version=version)
+
+
+def plot_per_capita_map(df_melted, europe, year, norm, cmap):
     # Create plot
-    fig = plt.figure(figsize=(20, 10))  
+    fig = rendering.figure(figsize=(20, 10))  
     gs = gridspec.GridSpec(1, 2, width_ratios=[30, 1], wspace=0.05)  
     fig.subplots_adjust(left=0.02, right=0.95, top=0.95, bottom=0.05)
 
@@ -189,7 +161,7 @@ def create_map_app(df_melted, europe, years):
     cbar = fig.colorbar(sm, cax=cax, orientation="vertical")
     cbar.set_label("CO₂ per Capita (tons)", fontsize=16)
 
-    st.pyplot(fig)
+    return fig
 
 create_map_app(df_melted, europe, years)
 
@@ -230,7 +202,7 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 
 def plot_emissions_anim1(year):
-    fig = plt.figure(figsize=(20, 10))
+    fig = rendering.figure(figsize=(20, 10))
     gs = gridspec.GridSpec(1, 2, width_ratios=[30, 1], wspace=0.05)
     fig.subplots_adjust(left=0.02, right=0.95, top=0.95, bottom=0.05)
 
@@ -254,21 +226,25 @@ def plot_emissions_anim1(year):
     cbar = fig.colorbar(sm, cax=cax, orientation="vertical")
     cbar.set_label("Total CO₂ Emissions (tons)", fontsize=16)
 
-    st.pyplot(fig)
+    return fig
+
+@instrumentation.fragment
+def total_co2_map():
+    # Streamlit UI components
+    st.title("Total CO₂ Emissions in Europe")
 
-# Streamlit UI components
-st.title("Total CO₂ Emissions in Europe")
+    # Create unique key for the slider by adding a suffix
+    year = st.select_slider(
+        "Select Year",
+        options=years_anim1,
+        value=years_anim1[0],
+        key="total_co2_year_slider"  # Unique key added here
+    )
 
-# Create unique key for the slider by adding a suffix
-year = st.select_slider(
-    "Select Year",
-    options=years_anim1,
-    value=years_anim1[0],
-    key="total_co2_year_slider"  # Unique key added here
-)
+    # Call the plotting function with selected year
+    rendering.chart("total_co2_year_map", lambda: plot_emissions_anim1(year), params=(year,), version=version)
 
-# Call the plotting function with selected year
-plot_emissions_anim1(year)
+total_co2_map()
 
 
 
@@ -343,7 +319,7 @@ norm_gdp2 = mcolors.Normalize(vmin=vmin_gdp2, vmax=vmax_gdp2)
 cmap_gdp2 = plt.cm.viridis
 
 def plot_gdp_per_capita_anim2(year):
-    fig = plt.figure(figsize=(20, 10))
+    fig = rendering.figure(figsize=(20, 10))
     gs = gridspec.GridSpec(1, 2, width_ratios=[30, 1], wspace=0.05)
     fig.subplots_adjust(left=0.02, right=0.95, top=0.95, bottom=0.05)
 
@@ -367,18 +343,54 @@ def plot_gdp_per_capita_anim2(year):
     cbar = fig.colorbar(sm, cax=cax, orientation="vertical")
     cbar.set_label("GDP per Capita (USD)", fontsize=16)
 
-    st.pyplot(fig)
+    return fig
+
+@instrumentation.fragment
+def gdp_per_capita_map():
+    # Streamlit UI components
+    st.title("GDP per Capita in Europe")
+
+    # Create slider with unique key
+    year = st.select_slider(
+        "Select Year",
+        options=years_gdp2,
+        value=years_gdp2[0],
+        key="gdp_per_capita_year_slider"  # Unique key for this slider
+    )
+
+    # Call the plotting function
+    rendering.chart("gdp_per_capita_year_map", lambda: plot_gdp_per_capita_anim2(year), params=(year,),
+                    version=version)
+
+gdp_per_capita_map()
+
+
+
+# Every year from 1970 to 2023 as an animation, rendered by timelapse.py once per data version
+timelapse_titles = {metric: spec["title"] for metric, spec in timelapse.METRICS.items()}
+
+@instrumentation.fragment
+def timelapse_map():
+    st.title("Time-lapse 1970–2023")
+    metric = st.selectbox("Map", options=list(timelapse_titles), format_func=timelapse_titles.get,
+                          key="timelapse_metric")
 
-# Streamlit UI components
-st.title("GDP per Capita in Europe")
+    path = timelapse.cached_animation(metric)
+    if path is None:
+        notice = st.empty()
+        notice.info("The time-lapse has not been rendered for the current data yet.")
+        if not st.button("Render time-lapse", key="timelapse_render"):
+            return
+        with st.spinner("Rendering 54 frames..."):
+            with instrumentation.stage("render"):
+                timelapse.build([metric])
+        notice.empty()
+        path = timelapse.cached_animation(metric)
 
-# Create slider with unique key
-year = st.select_slider(
-    "Select Year",
-    options=years_gdp2,
-    value=years_gdp2[0],
-    key="gdp_per_capita_year_slider"  # Unique key for this slider
-)
+    with instrumentation.stage("encode"):
+        if path.suffix == ".gif":
+            rendering.image(path.read_bytes(), "gif")
+        else:
+            st.video(str(path), format=f"video/{path.suffix[1:]}", loop=True, autoplay=True, muted=True)
 
-# Call the plotting function
-plot_gdp_per_capita_anim2(year)
+timelapse_map()
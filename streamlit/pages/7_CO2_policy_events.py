@@ -0,0 +1,98 @@
+import streamlit as st
+
+import event_study
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Impact of Policy Events on CO₂ Emissions")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+Instead of comparing hand-picked averages before and after an agreement, this page fits a
+**segmented regression** (interrupted time series) around the selected event for every country.
+For each country we estimate:
+
+- the **level change** — the jump in emissions in the event year compared to the pre-event trend
+- the **slope change** — how much the yearly trend changed after the event
+
+Both come with confidence intervals, so we can see which changes are larger than the usual year-to-year noise.
+""")
+
+col1, col2, col3 = st.columns(3)
+event_year = col1.selectbox(
+    "Event",
+    options=list(event_study.EVENTS),
+    index=2,
+    format_func=lambda year: f"{year} – {event_study.EVENTS[year]}"
+)
+metric = col2.selectbox(
+    "Metric",
+    options=list(event_study.METRICS),
+    format_func=event_study.METRICS.get
+)
+groups = event_study.country_groups()
+group = col3.selectbox("Country group", options=list(groups), index=list(groups).index("Europe"))
+window = st.slider("Years before and after the event", min_value=5, max_value=15, value=10)
+
+with instrumentation.stage("model"):
+    impact = event_study.event_impact(event_year, metric, window)
+    impact = impact[impact.index.isin(groups[group])]
+
+if impact.empty:
+    st.warning("Not enough data around this event for the selected group.")
+    st.stop()
+
+st.subheader(f"Level change at {event_year} ({group})")
+top = impact.reindex(impact['level_change_pct'].abs().sort_values(ascending=False).index).head(20)
+top = top.sort_values('level_change_pct')
+
+fig, ax = rendering.subplots(figsize=(10, 6))
+scale = 100 / top['pre_level'].abs()
+ax.barh(top['Name'], top['level_change_pct'],
+        xerr=[(top['level_change'] - top['level_change_low']) * scale,
+              (top['level_change_high'] - top['level_change']) * scale],
+        color=['crimson' if v > 0 else 'seagreen' for v in top['level_change_pct']],
+        alpha=0.8, capsize=3)
+ax.axvline(0, color='black', linewidth=0.8)
+ax.set_xlabel('Level change (% of the pre-event trend)')
+ax.set_title(f'Largest level changes at {event_year} – {event_study.EVENTS[event_year]}')
+ax.grid(axis='x', linestyle='--', alpha=0.5)
+fig.tight_layout()
+rendering.pyplot(fig)
+
+st.dataframe(
+    impact[['Name', 'level_change', 'level_change_low', 'level_change_high', 'level_change_pct',
+            'slope_change', 'slope_change_low', 'slope_change_high', 'significant']]
+    .sort_values('level_change_pct')
+    .reset_index(drop=True)
+)
+
+st.subheader("Country detail")
+names = impact['Name'].sort_values()
+country = st.selectbox("Country", options=names.index, format_func=lambda code: names[code])
+with instrumentation.stage("model"):
+    lines = event_study.fitted_lines(event_year, country, metric, window)
+
+fig, ax = rendering.subplots(figsize=(10, 4))
+ax.plot(lines.index, lines['observed'], marker='o', color='dimgray', label='Observed')
+before = lines.index < event_year
+ax.plot(lines.index[before], lines['fitted'][before], color='royalblue', linewidth=2, label='Fitted trend')
+ax.plot(lines.index[~before], lines['fitted'][~before], color='royalblue', linewidth=2)
+ax.plot(lines.index[~before], lines['counterfactual'][~before], color='royalblue', linestyle='--',
+        label='Pre-event trend continued')
+ax.axvline(event_year, color='red', linestyle='--', label=event_study.EVENTS[event_year])
+ax.set_xlabel('Year')
+ax.set_ylabel(event_study.METRICS[metric])
+ax.set_title(f'{names[country]} around {event_year}')
+ax.legend()
+ax.grid(True, linestyle='--', alpha=0.5)
+fig.tight_layout()
+rendering.pyplot(fig)
+
+row = impact.loc[country]
+st.markdown(f"""
+- **Level change:** {row['level_change']:.3f} ({row['level_change_low']:.3f} to {row['level_change_high']:.3f}),
+{row['level_change_pct']:.1f}% of the pre-event trend
+- **Slope change:** {row['slope_change']:.3f} per year ({row['slope_change_low']:.3f} to {row['slope_change_high']:.3f})
+""")
@@ -0,0 +1,66 @@
+import streamlit as st
+
+import climate_response
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Cumulative CO₂ Emissions and Temperature Change")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+In our Kyoto Protocol analysis we correlated Europe's **cumulative CO₂ emissions** with the average
+**temperature anomaly** (compared to 1951–1980). This page repeats that regression for every country
+and region in the temperature dataset.
+
+Because yearly values are strongly autocorrelated, the confidence intervals come from a
+**block bootstrap**: whole runs of consecutive years are resampled together, which keeps the
+time structure of the data intact.
+""")
+
+col1, col2 = st.columns(2)
+block_length = col1.select_slider("Bootstrap block length (years)", options=[3, 5, 8, 10], value=5)
+confidence = col2.select_slider("Confidence level", options=[0.80, 0.90, 0.95, 0.99], value=0.95)
+
+with st.spinner("Running the bootstrap (only needed once per data version)..."):
+    with instrumentation.stage("model"):
+        summary = climate_response.response_summary(block_length, confidence=confidence)
+
+entities = summary.sort_values(['is_region', 'Name'], ascending=[False, True])
+default = list(entities.index).index('EURTMP')
+code = st.selectbox("Country or region", options=entities.index, index=default,
+                    format_func=lambda c: entities.loc[c, 'Name'])
+
+with instrumentation.stage("model"):
+    observed, band = climate_response.regression_band(code, block_length, confidence=confidence)
+row = summary.loc[code]
+
+fig, ax = rendering.subplots(figsize=(10, 5))
+scatter = ax.scatter(observed['cumulative_gt'], observed['temperature'], c=observed.index, cmap='viridis', s=25)
+ax.plot(band.index, band['fitted'], color='red', linewidth=2, label='Linear fit')
+ax.fill_between(band.index, band['low'], band['high'], color='red', alpha=0.2,
+                label=f'{confidence:.0%} block-bootstrap band')
+fig.colorbar(scatter, ax=ax, label='Year')
+ax.set_xlabel('Cumulative CO₂ Emissions since 1970 (Gt)')
+ax.set_ylabel('Temperature Anomaly (°C)')
+ax.set_title(f"Cumulative CO₂ vs Temperature Anomaly – {row['Name']}")
+ax.legend(loc='upper left')
+ax.grid(True, linestyle='--', alpha=0.5)
+fig.tight_layout()
+rendering.pyplot(fig)
+
+st.markdown(f"""
+- **Slope:** {row['slope']:.3f} °C per Gt of cumulative CO₂ ({row['slope_low']:.3f} to {row['slope_high']:.3f})
+- **Correlation:** {row['r']:.2f} ({row['r_low']:.2f} to {row['r_high']:.2f})
+""")
+
+st.subheader("All countries and regions")
+st.markdown("""
+Smaller countries have much steeper slopes because their own emissions are tiny compared to the
+global emissions that actually drive warming, so the correlation is the more comparable number.
+""")
+st.dataframe(
+    summary.sort_values('r', ascending=False)
+    [['Name', 'r', 'r_low', 'r_high', 'slope', 'slope_low', 'slope_high']]
+    .reset_index(drop=True)
+)
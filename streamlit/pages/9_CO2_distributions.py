@@ -0,0 +1,63 @@
+import numpy as np
+import streamlit as st
+
+from scipy import stats
+
+import distribution_fits
+import instrumentation
+import rendering
+
+st.set_page_config(page_title="CO₂ Emissions in Europe", layout="wide")
+st.title("Distributions of CO₂ Emissions")
+instrumentation.start_run(__file__)
+
+st.markdown("""
+In our distribution analysis we fitted a normal and a beta distribution to one pooled vector of
+per-country variances. Here every **country**, **sector** and **decade** gets its own set of fits.
+The candidate distributions are ranked by the **Akaike information criterion (AIC)** — the lower the AIC,
+the better the distribution describes the data while penalising extra parameters.
+""")
+
+col1, col2 = st.columns(2)
+grouping = col1.selectbox("Group by", options=distribution_fits.GROUPINGS, format_func=str.capitalize)
+metric = col2.selectbox("Values", options=list(distribution_fits.METRICS),
+                        format_func=distribution_fits.METRICS.get)
+
+with st.spinner("Fitting distributions (only needed once per data version)..."):
+    with instrumentation.stage("model"):
+        fits = distribution_fits.distribution_fits(grouping, metric)
+
+best = fits[fits['rank'] == 1]
+
+st.subheader("Best fitting distribution")
+fig, ax = rendering.subplots(figsize=(8, 3))
+counts = best['distribution'].value_counts()
+ax.bar(counts.index, counts.values, color='mediumseagreen')
+ax.set_ylabel(f'Number of {grouping} groups')
+ax.set_title(f'Best distribution by AIC ({distribution_fits.METRICS[metric].lower()})')
+ax.grid(axis='y', linestyle='--', alpha=0.5)
+fig.tight_layout()
+rendering.pyplot(fig)
+
+groups = sorted(best['group'])
+default = groups.index('Germany') if 'Germany' in groups else 0
+group = st.selectbox(grouping.capitalize(), options=groups, index=default)
+
+with instrumentation.stage("transform"):
+    sample = distribution_fits.group_sample(grouping, metric, group)
+    group_fits = fits[fits['group'] == group]
+
+fig, ax = rendering.subplots(figsize=(10, 5))
+ax.hist(sample, bins='auto', density=True, color='#2edf87', alpha=0.7, label='Data')
+xr = np.linspace(sample.min(), sample.max(), 500)
+for _, fit in group_fits.iterrows():
+    pdf = getattr(stats, fit['distribution']).pdf(xr, *fit['params'])
+    ax.plot(xr, pdf, linewidth=2, label=f"{fit['distribution']} (ΔAIC {fit['delta_aic']:.1f})")
+ax.set_xlabel(distribution_fits.METRICS[metric])
+ax.set_ylabel('P(X)')
+ax.set_title(f'Distribution fits – {group}')
+ax.legend(loc='upper right')
+fig.tight_layout()
+rendering.pyplot(fig)
+
+st.dataframe(group_fits[['distribution', 'n', 'loglik', 'aic', 'delta_aic', 'rank']].reset_index(drop=True))
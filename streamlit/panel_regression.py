@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from functools import lru_cache
+from scipy import stats
+from scipy.sparse.linalg import splu
+
+import co2_data
+import shared_data
+
+
+def build_gdp_panel():
+    """Country-year rows of the OWID panel with positive CO₂ and GDP per capita, in logs."""
+    df = co2_data.owid_countries(co2_data.load_gdp())
+    df = df[(df[co2_data.CO2_PER_CAPITA] > 0) & (df[co2_data.GDP_PER_CAPITA] > 0)]
+    regions = co2_data.owid_regions(co2_data.load_gdp())
+    return pd.DataFrame({
+        "Entity": df['Entity'].to_numpy(),
+        "Code": df['Code'].to_numpy(),
+        "Region": regions.reindex(df['Code']).to_numpy(),
+        "Year": df['Year'].to_numpy(),
+        "log_co2": np.log(df[co2_data.CO2_PER_CAPITA].to_numpy(dtype=float)),
+        "log_gdp": np.log(df[co2_data.GDP_PER_CAPITA].to_numpy(dtype=float)),
+    }).assign(log_gdp_sq=lambda d: d['log_gdp'] ** 2)
+
+
+@lru_cache(maxsize=None)
+def gdp_panel():
+    """`build_gdp_panel`, with the numeric columns mapped from the shared datasets when they are published."""
+    shared = shared_data.attach("panel")
+    if shared is None:
+        return build_gdp_panel()
+    panel = pd.DataFrame({column: shared[column] for column in shared}, copy=False)
+    panel['Region'] = panel['Region'].replace('', np.nan)
+    return panel[['Entity', 'Code', 'Region', 'Year', 'log_co2', 'log_gdp', 'log_gdp_sq']]
+
+
+def indicator(codes):
+    """Sparse (rows x groups) 0/1 matrix for integer group codes."""
+    n = len(codes)
+    return sp.csc_matrix((np.ones(n), (np.arange(n), codes)), shape=(n, codes.max() + 1))
+
+
+def within_transform(values, groups):
+    """Residualize the columns of `values` on the fixed effects given by `groups`.
+
+    `groups` is a list of integer code arrays (e.g. country and year). The
+    dummies are stacked into one sparse matrix D and we solve the sparse normal
+    equations D'D a = D'v with a single LU factorisation, so no dense dummy
+    matrix is ever built. One column of every extra effect is dropped to keep
+    D'D non-singular.
+    """
+    blocks = [indicator(groups[0])]
+    for codes in groups[1:]:
+        blocks.append(indicator(codes)[:, 1:])
+    D = sp.hstack(blocks).tocsc()
+    lu = splu((D.T @ D).tocsc())
+    return values - D @ lu.solve(D.T @ values)
+
+
+def cluster_covariance(X, resid, clusters):
+    """Cluster-robust (CR1) covariance of OLS coefficients, clustering on integer codes."""
+    n, k = X.shape
+    n_clusters = int(clusters.max()) + 1
+    bread = np.linalg.inv(X.T @ X)
+    scores = indicator(clusters).T @ (X * resid[:, None])
+    meat = scores.T @ scores
+    correction = n_clusters / (n_clusters - 1) * (n - 1) / (n - k)
+    return correction * bread @ meat @ bread, n_clusters
+
+
+def fixed_effects_regression(df, y='log_co2', x=('log_gdp',), effects=('Code', 'Year'),
+                             cluster='Code', confidence=0.95):
+    """OLS of `y` on `x` with the given fixed effects and cluster-robust standard errors."""
+    x = list(x)
+    # Without fixed effects we still remove the intercept (one group for all rows)
+    groups = [pd.factorize(df[effect])[0] for effect in effects] or [np.zeros(len(df), dtype=int)]
+    values = within_transform(df[[y] + x].to_numpy(dtype=float), groups)
+    y_within, X_within = values[:, 0], values[:, 1:]
+
+    beta = np.linalg.lstsq(X_within, y_within, rcond=None)[0]
+    resid = y_within - X_within @ beta
+    cov, n_clusters = cluster_covariance(X_within, resid, pd.factorize(df[cluster])[0])
+
+    se = np.sqrt(np.diag(cov))
+    t_stat = beta / se
+    p_value = 2 * stats.t.sf(np.abs(t_stat), n_clusters - 1)
+    t_crit = stats.t.ppf(0.5 + confidence / 2, n_clusters - 1)
+
+    coefficients = pd.DataFrame({
+        "coef": beta,
+        "std_err": se,
+        "t": t_stat,
+        "p_value": p_value,
+        "ci_low": beta - t_crit * se,
+        "ci_high": beta + t_crit * se,
+    }, index=x)
+    info = {
+        "n_obs": len(df),
+        "n_countries": df['Code'].nunique(),
+        "n_years": df['Year'].nunique(),
+        "n_clusters": n_clusters,
+        "within_r2": 1 - (resid ** 2).sum() / (y_within ** 2).sum(),
+        "cov": pd.DataFrame(cov, index=x, columns=x),
+    }
+    return coefficients, info, pd.DataFrame({"y": y_within, "x": X_within[:, 0]}, index=df.index)
+
+
+def quadratic_elasticity(coefficients, info, log_gdp, confidence=0.95):
+    """Elasticity b1 + 2·b2·log_gdp of the model with log GDP², at one log GDP, with a delta-method CI."""
+    gradient = np.array([1.0, 2 * log_gdp])
+    beta = coefficients.loc[['log_gdp', 'log_gdp_sq'], 'coef'].to_numpy()
+    cov = info['cov'].loc[['log_gdp', 'log_gdp_sq'], ['log_gdp', 'log_gdp_sq']].to_numpy()
+    coef = gradient @ beta
+    se = np.sqrt(gradient @ cov @ gradient)
+    t_crit = stats.t.ppf(0.5 + confidence / 2, info['n_clusters'] - 1)
+    return {"coef": coef, "std_err": se, "ci_low": coef - t_crit * se, "ci_high": coef + t_crit * se}
+
+
+def filter_panel(df, regions=None, codes=None, years=None):
+    """Select rows by OWID region, country codes and an inclusive (first, last) year range."""
+    mask = np.ones(len(df), dtype=bool)
+    if regions:
+        mask &= df['Region'].isin(regions).to_numpy()
+    if codes:
+        mask &= df['Code'].isin(codes).to_numpy()
+    if years:
+        mask &= df['Year'].between(*years).to_numpy()
+    return df[mask]
@@ -0,0 +1,389 @@
+"""Builds every derived file from the raw data, rebuilding only what a change invalidates.
+
+Each stage declares the files it reads (data and the modules whose code it runs) and the files it
+writes; a stage reading another stage's output runs after it. A stage runs again when one of its
+inputs or outputs no longer has the content hash recorded after its last run, so a changed file
+rebuilds the stages below it, and stops there when a rebuilt output comes out identical. Hashes are
+kept per (size, modification time) in `.cache/pipeline/state.json`, so a run with nothing to do
+only stats the files. Independent stages run in parallel in a process pool.
+
+    ingest ─┬─ europe ──── forecasts
+            ├─ crosswalk
+            └─ cubes ───┬─ clusters
+                        └─ assets
+
+    python streamlit/pipeline.py                     # rebuild what changed
+    python streamlit/pipeline.py --dry-run           # list the stages that would run
+    python streamlit/pipeline.py --force forecasts   # run a stage even if it is up to date
+    python streamlit/pipeline.py --touch             # record the current files as built
+
+`--touch` adopts files built by hand, e.g. the SARIMA forecasts of `forecast_co2.ipynb`, so the
+first run does not redo them. Stages below one that would run are listed as "may run": they only
+run if its outputs change.
+
+Only the file locations of `data_paths` are imported up front; pandas and the modules reading the
+data are imported by the stages that run.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import warnings
+
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import data_paths
+
+APP_DIR = Path(__file__).resolve().parent
+PIPELINE_DIR = data_paths.CACHE_DIR / "pipeline"
+STATE_PATH = PIPELINE_DIR / "state.json"
+
+INGEST_PATH = PIPELINE_DIR / "ingest.json"
+TRANSFORMED_PATH = data_paths.DATA_DIR / "co2_emissions_transformed.csv"
+FORECASTS_PATH = data_paths.DATA_DIR / "forecasts_sarima.csv"
+CROSSWALK_PATH = PIPELINE_DIR / "crosswalk.csv"
+CUBES_PATH = PIPELINE_DIR / "cubes.json"
+CLUSTERS_PATH = PIPELINE_DIR / "clusters.csv"
+ASSETS_PATH = PIPELINE_DIR / "assets.json"
+
+FORECAST_YEARS = (2024, 2030)
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    func: object
+    inputs: tuple
+    outputs: tuple
+
+
+def _code(*modules):
+    """Source files a stage runs: the given modules, the file locations and this file."""
+    return tuple(APP_DIR / f"{module}.py" for module in modules) + (APP_DIR / "data_paths.py", Path(__file__).resolve())
+
+
+def _stamp(path, files):
+    """Write a JSON list of `files` with their hashes: one declared output for a directory of files,
+    which changes exactly when one of them does."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({str(file): _sha1(file) for file in sorted(map(str, files))}, indent=1))
+    return [Path(file) for file in files]
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Stages. Each one writes its declared outputs and may return further files it produced,
+# which are checked like the declared ones.
+
+def ingest():
+    """Check the layout of the raw files and record it; fails before anything is built on bad data."""
+    import pandas as pd
+    import co2_data
+
+    required = {
+        co2_data.CO2_PATH: ['Region', 'Country_code', 'Name', 'Substance'],
+        co2_data.SECTORS_PATH: ['Region', 'Country_code', 'Name', 'Sector', 'Substance'],
+        co2_data.GDP_PATH: ['Entity', 'Code', 'Year', co2_data.CO2_PER_CAPITA, co2_data.GDP_PER_CAPITA,
+                            'Population (historical)', 'World regions according to OWID'],
+        co2_data.POPULATION_PATH: ['CCA3', 'Country/Territory', 'Continent'],
+    }
+    summary = {}
+    for path, columns in required.items():
+        df = pd.read_csv(path)
+        missing = [column for column in columns if column not in df.columns]
+        if missing:
+            raise ValueError(f"{path.name}: missing columns {', '.join(missing)}")
+        years = [int(column) for column in co2_data.year_columns(df)]
+        if years and years != list(range(years[0], years[-1] + 1)):
+            raise ValueError(f"{path.name}: year columns are not consecutive")
+        summary[path.name] = {"rows": len(df), "columns": len(df.columns),
+                              "years": [years[0], years[-1]] if years else None}
+
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    INGEST_PATH.write_text(json.dumps(summary, indent=1))
+
+
+def europe():
+    """The European emissions in long format, as `forecast_co2.ipynb` wrote them."""
+    import co2_data
+
+    df_co2_europe = co2_data.europe_emissions(co2_data.load_emissions())
+    df_co2 = df_co2_europe.melt(id_vars=['Region', 'Country_code', 'Name', 'Substance'],
+                                var_name='Year', value_name='CO2_emissions')
+    df_co2['Year'] = df_co2['Year'].astype(int)
+    df_co2.to_csv(TRANSFORMED_PATH, sep=';')
+
+
+def crosswalk():
+    """Country code and name of the emissions table next to those of the OWID panel, the population
+    table and the Natural Earth shapes."""
+    import pandas as pd
+    import co2_data
+
+    df_co2 = co2_data.world_emissions(co2_data.load_emissions())
+    df_gdp = co2_data.owid_countries(co2_data.load_gdp())
+    df_pop = pd.read_csv(co2_data.POPULATION_PATH)
+    world = co2_data.load_world()
+
+    owid = df_gdp.groupby('Code')['Entity'].first()
+    regions = co2_data.owid_regions(co2_data.load_gdp())
+    population = df_pop.set_index('CCA3')
+    shapes = world.drop_duplicates('ADM0_A3').set_index('ADM0_A3')
+    codes = df_co2['Country_code']
+    pd.DataFrame({
+        'Country_code': codes.to_numpy(),
+        'Name': df_co2['Name'].to_numpy(),
+        'Region': df_co2['Region'].to_numpy(),
+        'OWID_entity': owid.reindex(codes).to_numpy(),
+        'OWID_region': regions.reindex(codes).to_numpy(),
+        'Population_name': population['Country/Territory'].reindex(codes).to_numpy(),
+        'Continent': population['Continent'].reindex(codes).to_numpy(),
+        'Shape_name': shapes['ADMIN'].reindex(codes).to_numpy(),
+    }).sort_values('Country_code').to_csv(CROSSWALK_PATH, index=False)
+
+
+def cubes():
+    """The shared datasets: data tables, world shapes, arrays of `co2_query`, GDP panel and Europe shapes."""
+    import shared_data
+
+    directory = shared_data.publish()
+    return _stamp(CUBES_PATH, sorted(directory.rglob("*.npy")))
+
+
+def sarima_forecast(values, year_from=FORECAST_YEARS[0], year_to=FORECAST_YEARS[1]):
+    """One-step SARIMA(1,1,1)(1,1,1,12) forecasts, year by year, each added to the history of the
+    next, as in `forecast_co2.ipynb`."""
+    import numpy as np
+    import pandas as pd
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    history = pd.Series(values, dtype=float).reset_index(drop=True)
+    predictions = []
+    for year in range(year_from, year_to + 1):
+        y_train = history[history.notna()]
+        try:
+            result = SARIMAX(y_train, order=(1, 1, 1), seasonal_order=(1, 1, 1, 12)).fit(disp=False)
+            y_pred = result.forecast(steps=1).iloc[0]
+        except Exception:
+            y_pred = np.nan
+        history = pd.concat([history, pd.Series([y_pred])], ignore_index=True)
+        predictions.append({'year': year, 'CO2_emissions': y_pred})
+    return predictions
+
+
+def forecasts():
+    import pandas as pd
+
+    df_co2 = pd.read_csv(TRANSFORMED_PATH, sep=';', index_col=0)
+    rows = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for country in df_co2['Name'].unique():
+            history = df_co2[df_co2['Name'] == country].sort_values('Year')['CO2_emissions']
+            rows += [{**prediction, 'Name': country} for prediction in sarima_forecast(history)]
+    pd.DataFrame(rows).to_csv(FORECASTS_PATH, sep=';')
+
+
+def clusters():
+    """The k-means clusters of the data API for every scope."""
+    import pandas as pd
+    import co2_data
+    import data_api
+
+    build = data_api.DATASETS["clusters"][1]
+    pd.concat([build(scope).assign(Scope=scope) for scope in co2_data.SCOPES]) \
+        .to_csv(CLUSTERS_PATH, index=False)
+
+
+def assets():
+    """The time-lapse animations of Europe."""
+    import timelapse
+
+    timelapse.build()
+    files = [timelapse.animation_path(metric, fmt) for metric in timelapse.METRICS
+             for fmt in timelapse.available_formats()]
+    return _stamp(ASSETS_PATH, files)
+
+
+RAW = (data_paths.CO2_PATH, data_paths.SECTORS_PATH, data_paths.GDP_PATH, data_paths.POPULATION_PATH)
+
+STAGES = (
+    Stage("ingest", ingest, RAW + _code("co2_data"), (INGEST_PATH,)),
+    Stage("europe", europe, (INGEST_PATH, data_paths.CO2_PATH) + _code("co2_data"), (TRANSFORMED_PATH,)),
+    Stage("crosswalk", crosswalk, (INGEST_PATH,) + RAW + (data_paths.WORLD_PATH,) + _code("co2_data"),
+          (CROSSWALK_PATH,)),
+    Stage("cubes", cubes, (INGEST_PATH,) + RAW + (data_paths.WORLD_PATH,)
+          + _code("co2_data", "co2_query", "panel_regression", "sector_correlation", "shared_data"), (CUBES_PATH,)),
+    Stage("forecasts", forecasts, (TRANSFORMED_PATH,) + _code(), (FORECASTS_PATH,)),
+    Stage("clusters", clusters, (CUBES_PATH,) + _code("data_api", "world_scale"), (CLUSTERS_PATH,)),
+    Stage("assets", assets, (CUBES_PATH, data_paths.WORLD_PATH) + _code("timelapse"), (ASSETS_PATH,)),
+)
+
+
+def dependencies(stages=STAGES):
+    """{stage name: names of the stages writing one of its inputs}."""
+    writers = {str(path): stage.name for stage in stages for path in stage.outputs}
+    return {stage.name: {writers[str(path)] for path in stage.inputs if str(path) in writers} for stage in stages}
+
+
+class State:
+    """Hashes of every file seen, by (size, mtime), and the files of every stage's last run."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        try:
+            saved = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            saved = {}
+        self.files = saved.get("files", {})
+        self.stages = saved.get("stages", {})
+
+    def hash(self, path):
+        """Content hash of `path`, or None if it is missing; only read when the file changed."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = str(path)
+        known = self.files.get(key)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = _sha1(path)
+        self.files[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def hashes(self, paths):
+        return {str(path): self.hash(path) for path in paths}
+
+    def is_current(self, stage):
+        """Whether the last run of `stage` saw the current inputs and left the current outputs."""
+        last = self.stages.get(stage.name)
+        if last is None:
+            return False
+        outputs = last["outputs"]
+        return last["inputs"] == self.hashes(stage.inputs) and \
+            None not in self.hashes(map(Path, outputs)).values() and outputs == self.hashes(map(Path, outputs))
+
+    def record(self, stage, produced=()):
+        outputs = list(map(str, stage.outputs)) + [str(path) for path in produced or ()]
+        self.stages[stage.name] = {"inputs": self.hashes(stage.inputs), "outputs": self.hashes(map(Path, outputs))}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"files": self.files, "stages": self.stages}, indent=1))
+        os.replace(tmp, self.path)
+
+
+def _run_stage(name):
+    """Run one stage in a worker; returns (files it produced, seconds)."""
+    start = time.perf_counter()
+    produced = {stage.name: stage for stage in STAGES}[name].func()
+    return [str(path) for path in produced or ()], time.perf_counter() - start
+
+
+def run(force=(), dry_run=False, workers=None, stages=STAGES):
+    """Run every stage that is not current, parents first and independent ones in parallel.
+
+    Returns {stage name: 'current' | 'would run' | 'may run' | 'failed' | 'skipped' | seconds of its run};
+    'may run' is a stage of a dry run that is current but below one that would run.
+    """
+    state = State()
+    by_name = {stage.name: stage for stage in stages}
+    parents = dependencies(stages)
+    results = {}
+    running = {}
+    pool = None
+    try:
+        while len(results) < len(stages):
+            for name, stage in by_name.items():
+                if name in results or name in running or not all(parent in results for parent in parents[name]):
+                    continue
+                if any(results[parent] in ("failed", "skipped") for parent in parents[name]):
+                    results[name] = "skipped"
+                elif dry_run:
+                    if name in force or not state.is_current(stage):
+                        results[name] = "would run"
+                    elif any(results[parent] in ("would run", "may run") for parent in parents[name]):
+                        # Runs only if the stage above changes its outputs
+                        results[name] = "may run"
+                    else:
+                        results[name] = "current"
+                elif name not in force and state.is_current(stage):
+                    results[name] = "current"
+                else:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+                    running[name] = pool.submit(_run_stage, name)
+            if not running:
+                continue
+
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name in [name for name, future in running.items() if future in done]:
+                future = running.pop(name)
+                try:
+                    produced, seconds = future.result()
+                except Exception as error:
+                    print(f"{name} failed: {type(error).__name__}: {error}", file=sys.stderr)
+                    results[name] = "failed"
+                    continue
+                state.record(by_name[name], produced)
+                state.save()
+                results[name] = seconds
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    if not dry_run:
+        # Saved even when nothing ran, so the hashes of changed but identical files are remembered
+        state.save()
+    return results
+
+
+# Stages that only check their inputs and describe them: `touch` runs them when their outputs are
+# missing, so the stages below them can be recorded
+CHECKS = ("ingest",)
+
+
+def touch(stages=STAGES):
+    """Record the current files of every stage whose outputs exist as built, without running it."""
+    state = State()
+    recorded = []
+    for stage in stages:
+        if stage.name in CHECKS and not all(Path(path).exists() for path in stage.outputs):
+            stage.func()
+        if all(Path(path).exists() for path in stage.outputs):
+            state.record(stage)
+            recorded.append(stage.name)
+    state.save()
+    return recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--force", nargs="+", default=[], choices=[stage.name for stage in STAGES], metavar="STAGE",
+                        help="Run these stages even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the stages that would run")
+    parser.add_argument("--touch", action="store_true", help="Record the current files as built and exit")
+    parser.add_argument("--workers", type=int, help="Stages run at once (default: one per CPU)")
+    args = parser.parse_args()
+
+    if args.touch:
+        print(f"recorded as built: {', '.join(touch())}")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    results = run(args.force, args.dry_run, args.workers)
+    for name, result in results.items():
+        print(f"{name:<10} {f'{result:8.2f} s' if isinstance(result, float) else result}")
+    print(f"{'total':<10} {time.perf_counter() - start:8.3f} s")
+    sys.exit(1 if "failed" in results.values() else 0)
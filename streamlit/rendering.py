@@ -0,0 +1,420 @@
+"""Figure lifecycle shared by all pages: creation, conversion to image bytes and cleanup.
+
+Pages create figures with `subplots` or `figure` and show them with `pyplot`, which encodes the
+figure to PNG, sends the bytes to the browser and closes it. Figures a rerun created but never
+showed (it stopped early or raised) are closed when the same session reruns.
+
+Charts that only depend on the data are drawn through `chart`. It keeps their PNG or SVG bytes in a
+process-wide cache keyed by (chart id, parameters, data version, code version), so every session
+after the first gets the image without matplotlib. The code version hashes the file that draws the
+chart and `CHART_VERSION`, so a changed page does not show old images. The cache drops the least
+recently used charts once it holds more than `CO2_CHART_CACHE_MB` and also writes the images to
+`.cache/charts`, so they survive restarts; there the oldest are deleted past `CO2_CHART_DISK_MB`.
+
+Functions decorated with `render_cache` are `st.cache_data` functions returning rendered charts.
+When the process RSS reaches the high-water mark of `CO2_MEMORY_BUDGET_MB`, these caches and the
+chart cache are cleared, largest first, until it is back below.
+"""
+import io
+import os
+import gc
+import sys
+import time
+import ctypes
+import hashlib
+import weakref
+import functools
+import tempfile
+import threading
+import pandas as pd
+import matplotlib.pyplot as plt
+import streamlit as st
+
+from pathlib import Path
+from collections import OrderedDict
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import co2_data
+import instrumentation
+
+# Same output as st.pyplot, so cached charts look like the ones drawn directly
+SAVEFIG_DEFAULTS = {"format": "png", "bbox_inches": "tight", "dpi": 200}
+
+# st.image scales wider images down to this width and re-encodes them on every call, so PNGs are
+# stored at this width once instead
+MAX_IMAGE_WIDTH = 2 * 730
+
+# Process RSS limit in MB, 0 disables it. Cached renders are evicted once RSS passes
+# MEMORY_HIGH_WATER of the budget, so the process is trimmed before it reaches the limit.
+MEMORY_BUDGET_MB = float(os.environ.get("CO2_MEMORY_BUDGET_MB", 0))
+MEMORY_HIGH_WATER = float(os.environ.get("CO2_MEMORY_HIGH_WATER", 0.9))
+
+# Size of the shared chart cache in memory, and whether charts are also kept on disk
+CHART_CACHE_MB = float(os.environ.get("CO2_CHART_CACHE_MB", 64))
+CHART_CACHE_DISK = os.environ.get("CO2_CHART_CACHE_DISK", "1") != "0"
+CHART_DISK_MB = float(os.environ.get("CO2_CHART_DISK_MB", 256))
+CHART_DIR = co2_data.CACHE_DIR / "charts"
+
+# Part of every chart key: bump it when a change outside the page files changes how charts look
+CHART_VERSION = 1
+
+# Sessions without a rerun for this many seconds are dropped from the accounting
+SESSION_TTL = 3600
+
+_lock = threading.Lock()
+
+# Session id -> figures and images of that session
+sessions = {}
+
+# Cache name -> `st.cache_data` function, and the bytes its entries hold
+_render_caches = {}
+cached_bytes = {}
+
+# Chart cache key -> image bytes, least recently used first
+_charts = OrderedDict()
+chart_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0, "bytes": 0}
+# Bytes of the charts on disk, counted on the first write
+_disk_bytes = None
+
+# One entry per budget enforcement that evicted something
+evictions = []
+
+# The static export sets this to a list to collect every (image bytes, format) shown, in order
+captured = None
+
+
+def _session():
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else "bare"
+    with _lock:
+        account = sessions.get(session_id)
+        if account is None:
+            account = sessions[session_id] = {
+                "figures": weakref.WeakSet(),
+                "figures_created": 0,
+                "figures_leaked": 0,
+                "images": 0,
+                "image_bytes": 0,
+            }
+        account["page"] = getattr(instrumentation._current, "page", "unknown")
+        account["last_seen"] = time.time()
+    return account
+
+
+def _track(fig):
+    account = _session()
+    account["figures"].add(fig)
+    account["figures_created"] += 1
+    return fig
+
+
+def subplots(*args, **kwargs):
+    """`plt.subplots` whose figure is closed by `pyplot`, or at the latest on the session's next rerun."""
+    fig, ax = plt.subplots(*args, **kwargs)
+    _track(fig)
+    return fig, ax
+
+
+def figure(*args, **kwargs):
+    """`plt.figure` whose figure is closed by `pyplot`, or at the latest on the session's next rerun."""
+    return _track(plt.figure(*args, **kwargs))
+
+
+def close(fig):
+    plt.close(fig)
+    _session()["figures"].discard(fig)
+
+
+def _fit_width(png):
+    from PIL import Image
+
+    picture = Image.open(io.BytesIO(png))
+    if picture.width <= MAX_IMAGE_WIDTH:
+        return png
+    height = int(picture.height * MAX_IMAGE_WIDTH / picture.width)
+    buffer = io.BytesIO()
+    picture.resize((MAX_IMAGE_WIDTH, height), resample=Image.BILINEAR).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def to_png(fig, **kwargs):
+    """Image bytes of `fig`, PNG by default. The figure is closed afterwards, also when saving fails."""
+    options = {**SAVEFIG_DEFAULTS, **kwargs}
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, **options)
+    finally:
+        close(fig)
+    return _fit_width(buffer.getvalue()) if options["format"] == "png" else buffer.getvalue()
+
+
+def image(data, fmt="png"):
+    """Show rendered image bytes and count them towards the session."""
+    account = _session()
+    account["images"] += 1
+    account["image_bytes"] += len(data)
+    if captured is not None:
+        captured.append((data, fmt))
+    # st.image takes SVG as markup, not bytes
+    st.image(data.decode() if fmt == "svg" else data, width="stretch")
+
+
+def pyplot(fig, **kwargs):
+    """Replaces `st.pyplot`: shows `fig` as PNG and closes it.
+
+    Everything since the previous recorded stage counts as building the figure ('render'),
+    saving and sending the image as 'encode'.
+    """
+    instrumentation.mark("render")
+    with instrumentation.stage("encode"):
+        image(to_png(fig, **kwargs))
+
+
+@functools.lru_cache(maxsize=None)
+def _source_digest(filename, mtime):
+    try:
+        return hashlib.sha1(Path(filename).read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
+
+def code_version(draw):
+    """Hash of `CHART_VERSION` and the source of the file defining `draw`."""
+    filename = draw.__code__.co_filename
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+    except OSError:
+        mtime = None
+    return hashlib.sha1(f"{CHART_VERSION}:{_source_digest(filename, mtime)}".encode()).hexdigest()[:8]
+
+
+def _chart_key(chart_id, params, version, fmt, code=""):
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return f"{chart_id}-{digest}-{version}-{code}.{fmt}"
+
+
+def _chart_get(key):
+    with _lock:
+        data = _charts.get(key)
+        if data is not None:
+            _charts.move_to_end(key)
+            chart_stats["hits"] += 1
+            return data
+    path = CHART_DIR / key
+    if CHART_CACHE_DISK:
+        try:
+            data = path.read_bytes()
+            # Recently used charts are the last to be pruned
+            os.utime(path)
+        except OSError:
+            return None
+        _chart_put(key, data, persist=False)
+        with _lock:
+            chart_stats["disk_hits"] += 1
+        return data
+    return None
+
+
+def _prune_disk(added):
+    """Delete the least recently used charts on disk once they take more than `CHART_DISK_MB`."""
+    global _disk_bytes
+    budget = CHART_DISK_MB * 2 ** 20
+    with _lock:
+        if _disk_bytes is not None:
+            _disk_bytes += added
+            if _disk_bytes <= budget:
+                return
+    files = []
+    for path in CHART_DIR.glob("*"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    # Down to 80% of the budget, so the directory isn't scanned on every write
+    for _, size, path in sorted(files, key=lambda file: file[0]):
+        if total <= 0.8 * budget:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+    with _lock:
+        _disk_bytes = total
+
+
+def _chart_put(key, data, persist=True):
+    with _lock:
+        if key in _charts:
+            chart_stats["bytes"] -= len(_charts.pop(key))
+        _charts[key] = data
+        chart_stats["bytes"] += len(data)
+        while chart_stats["bytes"] > CHART_CACHE_MB * 2 ** 20 and len(_charts) > 1:
+            _, dropped = _charts.popitem(last=False)
+            chart_stats["bytes"] -= len(dropped)
+            chart_stats["evicted"] += 1
+    if persist and CHART_CACHE_DISK:
+        CHART_DIR.mkdir(parents=True, exist_ok=True)
+        # Write to a file of its own next to the target and rename, so other sessions and replicas
+        # never read half a file
+        with tempfile.NamedTemporaryFile(dir=CHART_DIR, prefix=f".{key}.", suffix=".tmp", delete=False) as file:
+            file.write(data)
+        try:
+            os.replace(file.name, CHART_DIR / key)
+        except OSError:
+            # Another writer renamed the same chart into place first
+            Path(file.name).unlink(missing_ok=True)
+        _prune_disk(len(data))
+
+
+def clear_charts():
+    """Empty the in-memory chart cache; charts on disk stay."""
+    with _lock:
+        _charts.clear()
+        chart_stats["bytes"] = 0
+
+
+def cached_chart(chart_id, draw, params=(), version="", fmt="png"):
+    """Image bytes of a chart, calling `draw()` for the figure only if the cache has none yet.
+
+    `params` holds whatever besides the data files the chart depends on (a year, a country, ...)
+    and `version` is the `co2_data.data_version` of those files.
+    """
+    key = _chart_key(chart_id, params, version, fmt, code_version(draw))
+    data = _chart_get(key)
+    if data is None:
+        with _lock:
+            chart_stats["misses"] += 1
+        data = to_png(draw(), format=fmt)
+        _chart_put(key, data)
+    return data
+
+
+def chart(chart_id, draw, params=(), version="", fmt="png"):
+    """Show a chart from the shared chart cache; on a miss `draw()` builds its figure ('render')."""
+    with instrumentation.stage("render"):
+        data = cached_chart(chart_id, draw, params, version, fmt)
+    with instrumentation.stage("encode"):
+        image(data, fmt)
+
+
+def start_run():
+    """Close what the session's previous rerun left open, then enforce the memory budget."""
+    account = _session()
+    leftovers = list(account["figures"])
+    for fig in leftovers:
+        close(fig)
+    account["figures_leaked"] += len(leftovers)
+
+    cutoff = time.time() - SESSION_TTL
+    with _lock:
+        for session_id in [key for key, item in sessions.items() if item["last_seen"] < cutoff]:
+            del sessions[session_id]
+
+    enforce_budget()
+
+
+def _nbytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+def render_cache(func):
+    """`st.cache_data` for functions that return rendered charts; evicted first under memory pressure.
+
+    For a chart that is only an image, prefer `chart`; this is for results that bundle the image
+    with the tables shown next to it.
+    """
+    name = f"{Path(func.__globals__.get('__file__', func.__module__)).stem}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def compute(*args, **kwargs):
+        result = func(*args, **kwargs)
+        with _lock:
+            cached_bytes[name] = cached_bytes.get(name, 0) + _nbytes(result)
+        return result
+
+    cached = st.cache_data(show_spinner=False)(compute)
+    with _lock:
+        _render_caches[name] = cached
+    return cached
+
+
+def _release_memory():
+    gc.collect()
+    # Hand freed heap pages back to the OS, otherwise RSS stays high after clearing caches
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def enforce_budget():
+    """Clear render caches, largest first, while the process is above the high-water mark."""
+    if not MEMORY_BUDGET_MB:
+        return
+    high_water = MEMORY_BUDGET_MB * MEMORY_HIGH_WATER * 2 ** 20
+    rss = instrumentation._rss()
+    if rss < high_water:
+        return
+
+    before, evicted = rss, []
+    with _lock:
+        caches = [(name, cached_bytes.get(name, 0), cached.clear) for name, cached in _render_caches.items()]
+    caches.append(("chart cache", chart_stats["bytes"], clear_charts))
+    for name, size, clear in sorted(caches, key=lambda item: item[1], reverse=True):
+        if not size:
+            continue
+        clear()
+        with _lock:
+            cached_bytes.pop(name, None)
+        evicted.append((name, size))
+        _release_memory()
+        if instrumentation._rss() < high_water:
+            break
+    if evicted:
+        evictions.append({
+            "timestamp": time.time(),
+            "rss_before_mb": before / 2 ** 20,
+            "rss_after_mb": instrumentation._rss() / 2 ** 20,
+            "caches": ", ".join(name for name, _ in evicted),
+            "freed_cache_mb": sum(size for _, size in evicted) / 2 ** 20,
+        })
+
+
+def memory_report():
+    """Process-wide figures and cache sizes, and one row per session."""
+    process = {
+        "rss_mb": instrumentation._rss() / 2 ** 20,
+        "budget_mb": MEMORY_BUDGET_MB or None,
+        "high_water_mb": MEMORY_BUDGET_MB * MEMORY_HIGH_WATER or None,
+        "open_figures": len(plt.get_fignums()),
+        "cached_render_mb": sum(cached_bytes.values()) / 2 ** 20,
+        "chart_cache_mb": chart_stats["bytes"] / 2 ** 20,
+        "chart_cache_entries": len(_charts),
+        "chart_hits": chart_stats["hits"],
+        "chart_disk_hits": chart_stats["disk_hits"],
+        "chart_misses": chart_stats["misses"],
+        "chart_evictions": chart_stats["evicted"],
+        "evictions": len(evictions),
+    }
+    with _lock:
+        rows = [{
+            "session": session_id[:8],
+            "page": account["page"],
+            "last_seen": pd.Timestamp(account["last_seen"], unit="s"),
+            "open_figures": len(account["figures"]),
+            "figures_created": account["figures_created"],
+            "figures_leaked": account["figures_leaked"],
+            "images": account["images"],
+            "images_sent_mb": account["image_bytes"] / 2 ** 20,
+        } for session_id, account in sessions.items()]
+    return process, rows
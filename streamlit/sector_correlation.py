@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+from scipy.stats import rankdata
+
+import co2_data
+
+
+METHODS = {
+    "pearson": "Pearson correlation",
+    "spearman": "Spearman rank correlation",
+    "diff": "Pearson correlation of year-to-year changes",
+}
+
+
+@lru_cache(maxsize=None)
+def sector_cube():
+    """Emissions as a (countries x sectors x years) array; sectors a country doesn't have are 0.
+
+    Returns (names, sectors, years, cube) with `names` indexed by country code.
+    """
+    df = co2_data.load_sectors()
+    df = df[df['Substance'] == 'CO2']
+    years = co2_data.year_columns(df)
+    codes = np.sort(df['Country_code'].unique())
+    sectors = np.sort(df['Sector'].unique())
+
+    summed = df.groupby(['Country_code', 'Sector'])[years].sum()
+    full = pd.MultiIndex.from_product([codes, sectors], names=['Country_code', 'Sector'])
+    cube = summed.reindex(full, fill_value=0).to_numpy(dtype=float).reshape(len(codes), len(sectors), len(years))
+    names = df.groupby('Country_code')['Name'].first().reindex(codes)
+    return names, sectors, np.array(years, dtype=int), np.nan_to_num(cube)
+
+
+def correlation_matrices(series):
+    """Pearson correlation between all variables of every country in one pass.
+
+    `series` is (countries x variables x years); the result is (countries x variables x variables).
+    Variables with no variation get NaN.
+    """
+    centered = series - series.mean(axis=-1, keepdims=True)
+    norms = np.sqrt((centered ** 2).sum(axis=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        standardized = centered / norms[..., None]
+    return np.einsum('cvt,cwt->cvw', standardized, standardized)
+
+
+@lru_cache(maxsize=None)
+def sector_correlations(method="pearson"):
+    """(countries x variables x variables) float32 correlations, variable 0 being the country total.
+
+    Stored on disk once per data version.
+    """
+    version = co2_data.data_version(co2_data.SECTORS_PATH)
+    path = co2_data.CACHE_DIR / f"sector_correlations_{version}_{method}.npy"
+    if path.exists():
+        return np.load(path)
+
+    _, _, _, cube = sector_cube()
+    series = np.concatenate([cube.sum(axis=1, keepdims=True), cube], axis=1)
+    if method == "spearman":
+        series = rankdata(series, axis=-1)
+    elif method == "diff":
+        series = np.diff(series, axis=-1)
+    elif method != "pearson":
+        raise ValueError(f"Unknown method: {method!r}")
+
+    corr = correlation_matrices(series).astype(np.float32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(path, corr)
+    return corr
+
+
+def country_matrix(code, method="pearson", drop_empty=True):
+    """Correlation matrix of one country as a labelled DataFrame ('Total' + sectors)."""
+    names, sectors, _, cube = sector_cube()
+    row = names.index.get_loc(code)
+    labels = np.concatenate([["Total"], sectors])
+    matrix = pd.DataFrame(sector_correlations(method)[row], index=labels, columns=labels)
+    if drop_empty:
+        keep = np.concatenate([[True], cube[row].sum(axis=-1) > 0])
+        matrix = matrix.loc[keep, keep]
+    return matrix
+
+
+def sector_vs_total(method="pearson"):
+    """Correlation of every sector with the country total, countries x sectors."""
+    names, sectors, _, cube = sector_cube()
+    values = sector_correlations(method)[:, 0, 1:].astype(float)
+    values[cube.sum(axis=-1) == 0] = np.nan
+    return pd.DataFrame(values, index=names.index, columns=sectors)
@@ -0,0 +1,270 @@
+"""Datasets published once per host and memory-mapped read-only by every app process.
+
+Each replica of the app used to parse the CSV files and shapefile into its own DataFrames. The
+first one to start now writes the arrays behind them as `.npy` files into one directory per data
+version: the four data tables column by column (text as category codes), the world shapes as WKB,
+the arrays of `co2_query` (totals, population, GDP, sector cube), the GDP panel of the regression
+page and the Europe shapes as flat coordinate arrays. Every process then maps the files with
+`np.load(mmap_mode="r")`: no parsing, and the pages are shared between processes through the page
+cache instead of being copied into each one. The loaders of `co2_data` return frames rebuilt from
+the mapped columns, so the pages get them too.
+
+Frames and shapes rebuilt from the columns are copies owned by the caller, only the arrays of
+`co2_query`, the panel and the Europe shapes stay shared. The derived files (forecasts, the
+transformed emissions) are still read from their CSVs.
+
+The files go to `.cache/shared`, or to `CO2_SHARED_DIR`, e.g. `/dev/shm/co2` to keep them in
+POSIX shared memory. A directory is only used when its data version matches the data files.
+
+    python streamlit/shared_data.py publish
+    python streamlit/shared_data.py report --replicas 4   # memory of replicas with and without it
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+import co2_data
+
+SHARED_DIR = Path(os.environ.get("CO2_SHARED_DIR", co2_data.CACHE_DIR / "shared"))
+
+# Data tables published column by column, read by the loaders of `co2_data`
+FRAMES = {
+    "emissions": co2_data.CO2_PATH,
+    "sectors": co2_data.SECTORS_PATH,
+    "gdp": co2_data.GDP_PATH,
+    "population": co2_data.POPULATION_PATH,
+}
+
+DATASETS = (*FRAMES, "world", "query", "panel", "europe")
+
+# Dataset name -> (data version, arrays) of the datasets this process has attached
+_attached = {}
+
+
+def data_version():
+    return co2_data.data_version(*FRAMES.values(), co2_data.WORLD_PATH)
+
+
+def _strings(values):
+    """Fixed-width unicode array, which NumPy can map without pickling."""
+    return np.asarray(values).astype(str)
+
+
+def _frame_arrays(df):
+    """Numeric columns as they are, text columns as int32 codes into their distinct values (-1 missing)."""
+    arrays = {"columns": _strings(df.columns), "dtypes": _strings(df.dtypes.astype(str))}
+    for i, column in enumerate(df.columns):
+        if df[column].dtype.kind in "biuf":
+            arrays[f"column_{i}"] = df[column].to_numpy()
+        else:
+            codes, categories = pd.factorize(df[column])
+            arrays[f"column_{i}"] = codes.astype(np.int32)
+            arrays[f"categories_{i}"] = _strings(categories)
+    return arrays
+
+
+def _frame(arrays):
+    """DataFrame of the columns written by `_frame_arrays`, owning its data."""
+    data = {}
+    for i, (column, dtype) in enumerate(zip(arrays["columns"], arrays["dtypes"])):
+        values = arrays[f"column_{i}"]
+        if f"categories_{i}" in arrays:
+            # A missing value after the categories, which code -1 takes
+            values = pd.array([*arrays[f"categories_{i}"].astype(object), None], dtype=str(dtype)).take(values)
+        data[str(column)] = values
+    return pd.DataFrame(data)
+
+
+def _world_arrays():
+    import shapely
+
+    world = co2_data.read_world()
+    wkb = shapely.to_wkb(world.geometry.to_numpy())
+    return {
+        **_frame_arrays(world.drop(columns=world.geometry.name)),
+        "wkb": np.frombuffer(b"".join(wkb), dtype=np.uint8),
+        "wkb_offsets": np.cumsum([0, *map(len, wkb)]),
+        "crs": _strings([world.crs.to_string()]),
+    }
+
+
+def _query_arrays():
+    import co2_query
+
+    data = co2_query.build_table()
+    return {name: (_strings(getattr(data, name)) if name in ("codes", "names", "sectors") else getattr(data, name))
+            for name in ("codes", "names", "years", "total", "population", "gdp", "sectors", "by_sector")}
+
+
+def _panel_arrays():
+    import panel_regression
+
+    panel = panel_regression.build_gdp_panel()
+    # Countries without a region are stored as '' and read back as missing
+    return {column: _strings(panel[column].fillna('')) if panel[column].dtype.kind not in "biuf"
+            else panel[column].to_numpy() for column in panel.columns}
+
+
+def _europe_arrays():
+    import shapely
+
+    world = co2_data.load_world()
+    europe = world[world['CONTINENT'] == 'Europe']
+    geometry_type, coords, offsets = shapely.to_ragged_array(europe.geometry.to_numpy())
+    return {
+        "codes": _strings(europe['ADM0_A3']),
+        "names": _strings(europe['ADMIN']),
+        "geometry_type": np.array([int(geometry_type)]),
+        "coords": coords,
+        **{f"offsets_{level}": offset for level, offset in enumerate(offsets)},
+    }
+
+
+BUILDERS = {
+    **{name: (lambda path=path: _frame_arrays(pd.read_csv(path))) for name, path in FRAMES.items()},
+    "world": _world_arrays,
+    "query": _query_arrays,
+    "panel": _panel_arrays,
+    "europe": _europe_arrays,
+}
+
+
+def publish(datasets=DATASETS):
+    """Write the datasets of the current data version unless they are there; returns their directory.
+
+    Each dataset is written to a temporary directory and renamed into place, so another process
+    never maps a half-written one.
+    """
+    directory = SHARED_DIR / data_version()
+    for name in datasets:
+        target = directory / name
+        if (target / "manifest.json").exists():
+            continue
+        arrays = BUILDERS[name]()
+        tmp = directory / f".{name}.{os.getpid()}.tmp"
+        tmp.mkdir(parents=True, exist_ok=True)
+        for key, array in arrays.items():
+            np.save(tmp / f"{key}.npy", np.ascontiguousarray(array), allow_pickle=False)
+        (tmp / "manifest.json").write_text(json.dumps(sorted(arrays)))
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another replica published it first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # Versions of older data are no longer read by anyone
+    for old in SHARED_DIR.iterdir():
+        if old.is_dir() and old.name != directory.name:
+            shutil.rmtree(old, ignore_errors=True)
+    return directory
+
+
+def attach(name):
+    """{array name: read-only memory-mapped array} of a published dataset, or None if it isn't there.
+
+    A dataset is mapped once per data version; a miss is not remembered, so a process that looks
+    before another one has finished publishing attaches on a later call.
+    """
+    if os.environ.get("CO2_SHARED", "1") == "0":
+        return None
+    version = data_version()
+    attached = _attached.get(name)
+    if attached is not None and attached[0] == version:
+        return attached[1]
+    directory = SHARED_DIR / version / name
+    try:
+        keys = json.loads((directory / "manifest.json").read_text())
+    except FileNotFoundError:
+        return None
+    # Plain read-only ndarrays viewing the mapped files
+    arrays = {key: np.asarray(np.load(directory / f"{key}.npy", mmap_mode="r", allow_pickle=False)) for key in keys}
+    _attached[name] = (version, arrays)
+    return arrays
+
+
+def frame(name):
+    """A new DataFrame of one of the `FRAMES` tables from the published columns, or None."""
+    arrays = attach(name)
+    return None if arrays is None else _frame(arrays)
+
+
+def world():
+    """The Natural Earth shapes as a GeoDataFrame from the published dataset, or None."""
+    arrays = attach("world")
+    if arrays is None:
+        return None
+    import shapely
+
+    gpd = co2_data.import_geopandas()
+    offsets = arrays["wkb_offsets"]
+    wkb = arrays["wkb"].tobytes()
+    geometries = shapely.from_wkb([wkb[start:end] for start, end in zip(offsets[:-1], offsets[1:])])
+    return gpd.GeoDataFrame(_frame(arrays), geometry=geometries, crs=str(arrays["crs"][0]))
+
+
+def europe_geometry():
+    """(codes, names, shapely geometries) of Europe from the published dataset, or None."""
+    arrays = attach("europe")
+    if arrays is None:
+        return None
+    import shapely
+
+    levels = sorted(key for key in arrays if key.startswith("offsets_"))
+    geometries = shapely.from_ragged_array(shapely.GeometryType(int(arrays["geometry_type"][0])), arrays["coords"],
+                                           tuple(arrays[key] for key in levels))
+    return arrays["codes"], arrays["names"], geometries
+
+
+def memory_of_replica(shared):
+    """RSS and unique memory (bytes) of a fresh process after loading every dataset, and the
+    seconds the loading took."""
+    code = (
+        "import json, time, psutil, co2_data, co2_query, panel_regression, timelapse\n"
+        "start = time.perf_counter()\n"
+        "co2_data.load_emissions(); co2_data.load_sectors(); co2_data.load_gdp(); co2_data.load_population()\n"
+        "co2_data.load_world(); co2_query.table(); panel_regression.gdp_panel(); timelapse.europe_shapes()\n"
+        "seconds = time.perf_counter() - start\n"
+        "info = psutil.Process().memory_full_info()\n"
+        "print(json.dumps({'rss': info.rss, 'uss': info.uss, 'seconds': seconds}))\n"
+    )
+    env = dict(os.environ, CO2_SHARED="1" if shared else "0")
+    output = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(replicas=4):
+    """Memory of `replicas` processes loading the datasets, parsed in each of them and mapped."""
+    publish()
+    rows = []
+    for shared in (False, True):
+        runs = [memory_of_replica(shared) for _ in range(replicas)]
+        rows.append({
+            "mode": "memory-mapped" if shared else "parsed",
+            "rss_mb": np.mean([run["rss"] for run in runs]) / 2 ** 20,
+            "uss_mb": np.mean([run["uss"] for run in runs]) / 2 ** 20,
+            "load_s": np.mean([run["seconds"] for run in runs]),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=["publish", "report"])
+    parser.add_argument("--replicas", type=int, default=4, help="Processes started by the report")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        print(publish())
+    else:
+        rows = report(args.replicas)
+        print(f"{'mode':<14} {'RSS':>9} {'unique':>9} {'load':>8}")
+        for row in rows:
+            print(f"{row['mode']:<14} {row['rss_mb']:6.1f} MB {row['uss_mb']:6.1f} MB {row['load_s']:6.2f} s")
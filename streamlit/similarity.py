@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import co2_data
+
+
+METRICS = {
+    "correlation": "Correlation of yearly emissions (1 - r)",
+    "euclidean": "Euclidean distance of standardised series",
+    "dtw": "Dynamic time warping of standardised series",
+    "sector_mix": "Difference in sector mix (share of each sector)",
+}
+
+
+@lru_cache(maxsize=None)
+def country_series():
+    """Standardised 1970–2023 emission series and sector shares, one row per country code."""
+    df_co2 = co2_data.load_emissions()
+    years = co2_data.year_columns(df_co2)
+    series = df_co2.groupby('Country_code')[years].sum()
+    names = df_co2.groupby('Country_code')['Name'].first()
+
+    values = series.to_numpy(dtype=float)
+    std = values.std(axis=1, keepdims=True)
+    z = (values - values.mean(axis=1, keepdims=True)) / np.where(std > 0, std, 1)
+
+    df_sectors = co2_data.load_sectors()
+    sector_totals = df_sectors.assign(total=df_sectors[years].sum(axis=1)) \
+        .pivot_table(index='Country_code', columns='Sector', values='total', aggfunc='sum', fill_value=0)
+    sector_totals = sector_totals.reindex(series.index, fill_value=0)
+    row_sums = sector_totals.sum(axis=1).to_numpy()[:, None]
+    shares = sector_totals.to_numpy() / np.where(row_sums > 0, row_sums, 1)
+
+    return names, z, shares
+
+
+def dtw_pairs(a, b, window=None):
+    """DTW distance for many pairs at once: a and b are (pairs x length) arrays.
+
+    The dynamic programme runs over the (length x length) grid once, with every
+    cell updated for all pairs in a single vectorised step. `window` is an
+    optional Sakoe-Chiba band in years.
+    """
+    n_pairs, n = a.shape
+    window = n if window is None else window
+    # Only the previous row of the cost grid is needed, which keeps memory at 2 x length x pairs
+    previous = np.full((n + 1, n_pairs), np.inf)
+    previous[0] = 0
+    for i in range(1, n + 1):
+        current = np.full((n + 1, n_pairs), np.inf)
+        for j in range(max(1, i - window), min(n, i + window) + 1):
+            d = (a[:, i - 1] - b[:, j - 1]) ** 2
+            current[j] = d + np.minimum(np.minimum(previous[j], current[j - 1]), previous[j - 1])
+        previous = current
+    return np.sqrt(previous[n])
+
+
+def dtw_matrix(z, window=None, workers=None):
+    """Pairwise DTW distances, with the upper-triangle pairs split across a process pool."""
+    workers = workers or os.cpu_count() or 1
+    rows, cols = np.triu_indices(len(z), k=1)
+    chunks = [chunk for chunk in np.array_split(np.arange(len(rows)), workers) if len(chunk)]
+    args = [(z[rows[chunk]], z[cols[chunk]], window) for chunk in chunks]
+
+    if len(chunks) == 1:
+        parts = [dtw_pairs(*args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            parts = list(pool.map(dtw_pairs, *zip(*args)))
+
+    distances = np.zeros((len(z), len(z)))
+    distances[rows, cols] = np.concatenate(parts)
+    distances[cols, rows] = distances[rows, cols]
+    return distances
+
+
+def euclidean_matrix(x):
+    squared = (x ** 2).sum(axis=1)
+    return np.sqrt(np.maximum(squared[:, None] + squared[None, :] - 2 * x @ x.T, 0))
+
+
+@lru_cache(maxsize=None)
+def distance_matrices(dtw_window=10):
+    """All pairwise distance matrices, computed once per data version and stored on disk."""
+    version = co2_data.data_version(co2_data.CO2_PATH, co2_data.SECTORS_PATH)
+    path = co2_data.CACHE_DIR / f"similarity_{version}_{dtw_window}.npz"
+    if path.exists():
+        with np.load(path) as cached:
+            return {metric: cached[metric] for metric in METRICS}
+
+    _, z, shares = country_series()
+    matrices = {
+        "correlation": 1 - np.corrcoef(z),
+        "euclidean": euclidean_matrix(z),
+        "dtw": dtw_matrix(z, dtw_window),
+        "sector_mix": euclidean_matrix(shares),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, **matrices)
+    return matrices
+
+
+def most_similar(code, metric="correlation", k=10, candidates=None):
+    """The k countries closest to `code` under `metric`, optionally limited to `candidates`."""
+    names, _, _ = country_series()
+    distances = distance_matrices()[metric][names.index.get_loc(code)]
+
+    allowed = np.ones(len(names), dtype=bool) if candidates is None else names.index.isin(candidates)
+    allowed &= np.isfinite(distances)
+    allowed[names.index.get_loc(code)] = False
+    idx = np.flatnonzero(allowed)
+    k = min(k, len(idx))
+    nearest = idx[np.argpartition(distances[idx], k - 1)[:k]] if k else idx
+    nearest = nearest[np.argsort(distances[nearest])]
+
+    return pd.DataFrame({
+        "Name": names.iloc[nearest].to_numpy(),
+        "distance": distances[nearest],
+    }, index=names.index[nearest])
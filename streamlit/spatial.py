@@ -0,0 +1,236 @@
+"""Spatial weights between countries and Moran's I of the emission metrics for every year.
+
+The weights come from the Natural Earth shapes: either shared borders (contiguity, islands get
+their nearest neighbour) or the k nearest countries. They are a sparse binary matrix, built once
+per geometry version and stored in `.cache/`.
+
+Global and local Moran's I are computed for all years at once: the spatial lag of every year is one
+sparse product with the (countries x years) value matrix. Countries without a value in a year are
+left out of that year and the weights are row-standardised over the remaining neighbours.
+Significance comes from permutations (conditional ones for the local statistic, as in PySAL), run
+year by year in a process pool.
+"""
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import co2_data
+
+FIRST_YEAR, LAST_YEAR = 1970, 2023
+
+METRICS = {
+    "total": "Total CO₂ emissions (kt)",
+    "per_capita": "CO₂ emissions per capita (t)",
+    "intensity": "CO₂ intensity (kg per $ of GDP)",
+}
+
+WEIGHTS = {
+    "contiguity": "Shared borders",
+    "knn": "Nearest neighbours",
+}
+
+# The 110m shapes are simplified, so borders closer than this many degrees count as shared
+CONTIGUITY_TOLERANCE = 0.1
+KNN = 6
+
+PERMUTATIONS = 999
+SIGNIFICANCE = 0.05
+
+# LISA clusters as numbered in PySAL; 0 = not significant
+QUADRANTS = {
+    0: "Not significant",
+    1: "Hot spot (high-high)",
+    2: "Low-high outlier",
+    3: "Cold spot (low-low)",
+    4: "High-low outlier",
+}
+
+
+def data_version():
+    return co2_data.data_version(co2_data.CO2_PATH, co2_data.GDP_PATH, co2_data.WORLD_PATH)
+
+
+@lru_cache(maxsize=None)
+def countries():
+    """Natural Earth countries without Antarctica, in the row order of all matrices here."""
+    world = co2_data.load_world()
+    return world[world['CONTINENT'] != 'Antarctica'].reset_index(drop=True)
+
+
+def _nearest(gdf, k):
+    """(rows, neighbours) of the k nearest countries by great-circle distance between interior points."""
+    from scipy.spatial import cKDTree
+
+    points = gdf.geometry.representative_point()
+    lon, lat = np.radians(points.x.to_numpy()), np.radians(points.y.to_numpy())
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    # Chord length on the unit sphere orders points like the great-circle distance
+    _, neighbours = cKDTree(xyz).query(xyz, k=k + 1)
+    rows = np.repeat(np.arange(len(gdf)), k)
+    return rows, neighbours[:, 1:].ravel()
+
+
+def _contiguity(gdf):
+    import shapely
+
+    geometries = gdf.geometry.to_numpy()
+    left, right = shapely.STRtree(geometries).query(geometries, predicate="dwithin", distance=CONTIGUITY_TOLERANCE)
+    keep = left != right
+    rows, cols = left[keep], right[keep]
+
+    # Islands get their nearest country as neighbour, both ways, so no row is empty
+    isolated = np.setdiff1d(np.arange(len(gdf)), rows)
+    near_rows, near_cols = _nearest(gdf, 1)
+    near = np.isin(near_rows, isolated)
+    rows = np.concatenate([rows, near_rows[near], near_cols[near]])
+    cols = np.concatenate([cols, near_cols[near], near_rows[near]])
+    return rows, cols
+
+
+@lru_cache(maxsize=None)
+def weights(kind="contiguity", k=KNN):
+    """Binary (countries x countries) CSR matrix of neighbours, stored on disk per geometry version."""
+    version = co2_data.data_version(co2_data.WORLD_PATH)
+    path = co2_data.CACHE_DIR / f"spatial_weights_{kind}_{k if kind == 'knn' else 0}_{version}.npz"
+    if path.exists():
+        return sparse.load_npz(path).tocsr()
+
+    gdf = countries()
+    rows, cols = _nearest(gdf, k) if kind == "knn" else _contiguity(gdf)
+    matrix = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(gdf), len(gdf))).tocsr()
+    # Pairs found twice count once
+    matrix.data[:] = 1
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sparse.save_npz(path, matrix)
+    return matrix
+
+
+@lru_cache(maxsize=None)
+def metric_values(metric):
+    """(countries x years) values of a metric in the row order of `countries`, NaN where unknown."""
+    codes = countries()['ADM0_A3']
+    years = [str(year) for year in range(FIRST_YEAR, LAST_YEAR + 1)]
+    if metric == "total":
+        df_co2 = co2_data.load_emissions()
+        # Serbia and Montenegro are one row in the data but two shapes; split it like the Europe pages
+        europe = co2_data.europe_emissions(df_co2)
+        df_co2 = pd.concat([df_co2[df_co2['Country_code'] != 'SCG'],
+                            europe[europe['Country_code'].isin(['SRB', 'MNE'])]])
+        table = df_co2.groupby('Country_code')[years].sum(min_count=1)
+    else:
+        df_gdp = co2_data.owid_countries(co2_data.load_gdp())
+        per_capita = df_gdp.pivot_table(index='Code', columns='Year', values=co2_data.CO2_PER_CAPITA)
+        if metric == "per_capita":
+            table = per_capita
+        else:
+            gdp = df_gdp.pivot_table(index='Code', columns='Year', values=co2_data.GDP_PER_CAPITA)
+            table = per_capita * 1000 / gdp
+        table.columns = table.columns.astype(str)
+    return table.reindex(index=codes, columns=years).to_numpy(dtype=float)
+
+
+def _folded_p(observed, permuted):
+    """Pseudo p-value of `observed` against permutations along the last axis, as in PySAL."""
+    larger = (permuted >= observed[..., None]).sum(axis=-1)
+    n = permuted.shape[-1]
+    larger = np.where(n - larger < larger, n - larger, larger)
+    return (larger + 1) / (n + 1)
+
+
+def moran_years(matrix, values, permutations=PERMUTATIONS, seeds=None):
+    """Global and local Moran's I with permutation p-values for every column (year) of `values`.
+
+    Returns a dict of arrays: 'global_i' and 'global_p' (years), 'local_i', 'local_p' and
+    'quadrant' (countries x years). Without `seeds` (one per year) no p-values are computed.
+    """
+    n, years = values.shape
+    present = np.isfinite(values)
+    counts = present.sum(axis=0)
+    means = np.where(present, values, 0).sum(axis=0) / np.maximum(counts, 1)
+    z = np.where(present, values - means, 0.0)
+
+    # Row-standardised spatial lag over the neighbours with data, all years in one sparse product
+    degree = matrix @ present.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lag = np.where(degree > 0, (matrix @ z) / degree, 0.0)
+        used = present & (degree > 0)
+        squares = (z ** 2).sum(axis=0)
+        local_i = np.where(present, z * lag / (squares / counts), np.nan)
+        global_i = counts / used.sum(axis=0) * (z * lag * used).sum(axis=0) / squares
+
+    result = {
+        "global_i": global_i,
+        "global_p": np.full(years, np.nan),
+        "local_i": local_i,
+        "local_p": np.full((n, years), np.nan),
+        "quadrant": np.zeros((n, years), dtype=np.int8),
+    }
+    if seeds is None:
+        return result
+
+    for year, seed in enumerate(seeds):
+        rows = np.flatnonzero(present[:, year])
+        if len(rows) < 3:
+            continue
+        rng = np.random.default_rng(seed)
+        sub = matrix[rows][:, rows]
+        zt = z[rows, year]
+        m2 = (zt ** 2).mean()
+        cardinality = np.diff(sub.indptr)
+        has = cardinality > 0
+
+        # Global: the values shuffled over all countries
+        shuffled = rng.permuted(np.tile(zt, (permutations, 1)), axis=1).T
+        lag_p = (sub @ shuffled) / np.where(has, cardinality, 1)[:, None]
+        global_p = len(rows) / has.sum() * (shuffled * lag_p * has[:, None]).sum(axis=0) / (zt ** 2).sum()
+        result["global_p"][year] = _folded_p(np.array(global_i[year]), global_p)
+
+        # Local: each country keeps its value, its neighbours are drawn from the other countries.
+        # One set of draws serves every country (skipping itself), as in PySAL's conditional randomisation.
+        k = max(int(cardinality.max()), 1)
+        draws = rng.permuted(np.tile(np.arange(len(rows) - 1), (permutations, 1)), axis=1)[:, :k]
+        own = np.arange(len(rows))[:, None, None]
+        neighbours = zt[draws[None] + (draws[None] >= own)]
+        keep = np.arange(k)[None, None, :] < cardinality[:, None, None]
+        lag_p = (neighbours * keep).sum(axis=2) / np.where(has, cardinality, 1)[:, None]
+        local_p = _folded_p(local_i[rows, year], zt[:, None] * lag_p / m2)
+        result["local_p"][rows, year] = np.where(has, local_p, np.nan)
+
+        high, neighbours_high = zt > 0, lag[rows, year] > 0
+        quadrant = np.select([high & neighbours_high, ~high & neighbours_high, ~high & ~neighbours_high],
+                             [1, 2, 3], default=4)
+        result["quadrant"][rows, year] = np.where(has & (local_p <= SIGNIFICANCE), quadrant, 0)
+    return result
+
+
+def moran_parallel(matrix, values, permutations=PERMUTATIONS, seed=0, workers=None):
+    """`moran_years` with the years split across a process pool; one seed per year keeps results
+    independent of the number of workers."""
+    workers = workers or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(values.shape[1])
+    chunks = [chunk for chunk in np.array_split(np.arange(values.shape[1]), workers) if len(chunk)]
+
+    if len(chunks) == 1:
+        return moran_years(matrix, values, permutations, seeds)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        parts = list(pool.map(moran_years, [matrix] * len(chunks), [values[:, chunk] for chunk in chunks],
+                              [permutations] * len(chunks), [[seeds[i] for i in chunk] for chunk in chunks]))
+    return {key: np.concatenate([part[key] for part in parts], axis=-1) for key in parts[0]}
+
+
+@lru_cache(maxsize=None)
+def moran(metric, kind="contiguity", permutations=PERMUTATIONS, seed=0):
+    """Moran's I of a metric for all years, stored on disk once per data version."""
+    path = co2_data.CACHE_DIR / f"moran_{metric}_{kind}_{permutations}_{seed}_{data_version()}.npz"
+    if path.exists():
+        with np.load(path) as cached:
+            return dict(cached)
+
+    result = moran_parallel(weights(kind), metric_values(metric), permutations, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, **result)
+    return result
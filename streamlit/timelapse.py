@@ -0,0 +1,214 @@
+"""Animated maps of Europe for every year from 1970 to 2023.
+
+Each metric gets one frame per year, all drawn with the same colour scale so the years can be
+compared. The frames are split over a process pool; every worker turns the Natural Earth shapes
+into matplotlib paths once and then only recolours them. The animations are stored in
+`.cache/timelapse` once per data version: GIF always, MP4 and WebM when `ffmpeg` is installed.
+
+    python streamlit/timelapse.py                      # all metrics and formats
+    python streamlit/timelapse.py per_capita --formats gif
+"""
+import io
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import co2_data
+import shared_data
+
+FIRST_YEAR, LAST_YEAR = 1970, 2023
+
+METRICS = {
+    "total": {"title": "Total CO₂ emissions", "unit": "kt CO₂", "cmap": "Reds"},
+    "per_capita": {"title": "CO₂ emissions per capita", "unit": "t CO₂ per person", "cmap": "Reds"},
+    "gdp_per_capita": {"title": "GDP per capita", "unit": "USD", "cmap": "viridis"},
+}
+
+# Preferred first: browsers play MP4 and WebM as video, GIF needs no encoder
+FORMATS = ("mp4", "webm", "gif")
+FFMPEG_CODECS = {
+    "mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p"],
+    "webm": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "35"],
+}
+
+FRAMES_PER_SECOND = 4
+# Frame size in pixels (both even, as H.264 requires) and the part of Europe shown
+FRAME_SIZE = (1000, 640)
+EXTENT = (-25, 50, 34, 72)
+
+TIMELAPSE_DIR = co2_data.CACHE_DIR / "timelapse"
+
+# Held while a metric is rendered, so the warm-up and the page never render the same one twice
+_build_locks = {metric: threading.Lock() for metric in METRICS}
+
+
+def available_formats():
+    return tuple(fmt for fmt in FORMATS if fmt == "gif" or shutil.which("ffmpeg"))
+
+
+def data_version():
+    return co2_data.data_version(co2_data.CO2_PATH, co2_data.GDP_PATH, co2_data.WORLD_PATH)
+
+
+@lru_cache(maxsize=None)
+def europe_shapes():
+    """Country codes of Europe and one matplotlib path per country, built once per process."""
+    from matplotlib.path import Path
+
+    shared = shared_data.europe_geometry()
+    if shared is None:
+        europe = co2_data.load_world()
+        europe = europe[europe['CONTINENT'] == 'Europe']
+        codes, geometries = europe['ADM0_A3'], europe.geometry
+    else:
+        codes, _, geometries = shared
+    paths = []
+    for geometry in geometries:
+        polygons = getattr(geometry, "geoms", [geometry])
+        rings = [ring for polygon in polygons for ring in [polygon.exterior, *polygon.interiors]]
+        paths.append(Path.make_compound_path(*[Path(np.asarray(ring.coords)[:, :2]) for ring in rings]))
+    return tuple(str(code) for code in codes), tuple(paths)
+
+
+@lru_cache(maxsize=None)
+def metric_values(metric):
+    """Values of a metric as a (countries x years) array in the row order of `europe_shapes`."""
+    codes, _ = europe_shapes()
+    years = [str(year) for year in range(FIRST_YEAR, LAST_YEAR + 1)]
+    if metric == "total":
+        # Same country set as the other Europe pages, with Serbia and Montenegro split
+        df_co2 = co2_data.europe_emissions(co2_data.load_emissions())
+        table = df_co2.groupby('Country_code')[years].sum(min_count=1)
+    else:
+        column = co2_data.CO2_PER_CAPITA if metric == "per_capita" else co2_data.GDP_PER_CAPITA
+        df_gdp = co2_data.owid_countries(co2_data.load_gdp())
+        table = df_gdp.pivot_table(index='Code', columns='Year', values=column)
+        table.columns = table.columns.astype(str)
+    return table.reindex(index=list(codes), columns=years).to_numpy(dtype=float)
+
+
+def render_frames(metric, years):
+    """PNG bytes of the frames of `years`; runs in a worker process."""
+    from matplotlib.figure import Figure
+    from matplotlib.colors import Normalize
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import PathPatch
+    import matplotlib
+
+    _, paths = europe_shapes()
+    values = metric_values(metric)
+    spec = METRICS[metric]
+    # One colour scale over all years, so a colour means the same value in every frame
+    norm = Normalize(np.nanmin(values), np.nanmax(values))
+    cmap = matplotlib.colormaps[spec["cmap"]].with_extremes(bad="lightgrey")
+
+    frames = []
+    for year in years:
+        fig = Figure(figsize=(FRAME_SIZE[0] / 100, FRAME_SIZE[1] / 100), dpi=100)
+        ax = fig.add_axes([0.01, 0.02, 0.86, 0.88])
+        cax = fig.add_axes([0.89, 0.1, 0.025, 0.75])
+        shapes = PatchCollection([PathPatch(path) for path in paths], cmap=cmap, norm=norm,
+                                 edgecolor='0.8', linewidth=0.6)
+        shapes.set_array(np.ma.masked_invalid(values[:, year - FIRST_YEAR]))
+        ax.add_collection(shapes)
+        ax.set_xlim(*EXTENT[:2])
+        ax.set_ylim(*EXTENT[2:])
+        ax.set_aspect(1.5)
+        ax.axis('off')
+        fig.suptitle(f"{spec['title']} in Europe ({year})", fontsize=16, y=0.97)
+        fig.colorbar(shapes, cax=cax).set_label(spec["unit"])
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def animation_path(metric, fmt):
+    return TIMELAPSE_DIR / f"{metric}_{data_version()}.{fmt}"
+
+
+def cached_animation(metric):
+    """Path of the best animation of `metric` already stored for the current data, or None."""
+    for fmt in available_formats():
+        path = animation_path(metric, fmt)
+        if path.exists():
+            return path
+    return None
+
+
+def _encode(frames, fmt, path):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp")
+    os.close(fd)
+    if fmt == "gif":
+        from PIL import Image
+
+        images = [Image.open(io.BytesIO(frame)).convert("RGB") for frame in frames]
+        images[0].save(tmp, format="GIF", save_all=True, append_images=images[1:], loop=0,
+                       duration=int(1000 / FRAMES_PER_SECOND))
+    else:
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "image2pipe",
+                        "-framerate", str(FRAMES_PER_SECOND), "-i", "-", *FFMPEG_CODECS[fmt], "-f", fmt, str(tmp)],
+                       input=b"".join(frames), check=True)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Another process stored the same animation first
+        os.unlink(tmp)
+
+
+def build(metrics=tuple(METRICS), formats=None, workers=None):
+    """Render and encode the animations that are not stored yet; returns seconds per metric.
+
+    A metric another thread is rendering is waited for instead of rendered again.
+    """
+    formats = [fmt for fmt in (formats or available_formats()) if fmt in available_formats()]
+    workers = workers or os.cpu_count() or 1
+    years = np.arange(FIRST_YEAR, LAST_YEAR + 1)
+    TIMELAPSE_DIR.mkdir(parents=True, exist_ok=True)
+
+    timings = {}
+    for metric in metrics:
+        with _build_locks[metric]:
+            missing = [fmt for fmt in formats if not animation_path(metric, fmt).exists()]
+            if not missing:
+                continue
+            start = time.perf_counter()
+            chunks = [[int(year) for year in chunk] for chunk in np.array_split(years, workers) if len(chunk)]
+            if len(chunks) == 1:
+                frames = render_frames(metric, chunks[0])
+            else:
+                with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+                    frames = [frame for part in pool.map(render_frames, [metric] * len(chunks), chunks)
+                              for frame in part]
+            rendered = time.perf_counter() - start
+            for fmt in missing:
+                _encode(frames, fmt, animation_path(metric, fmt))
+            timings[metric] = {"frames_s": rendered, "total_s": time.perf_counter() - start}
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("metrics", nargs="*", help=f"Any of {', '.join(METRICS)} (default: all)")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, help="Default: every format that can be encoded")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    metrics = args.metrics or list(METRICS)
+    if set(metrics) - set(METRICS):
+        parser.error(f"unknown metric: {', '.join(sorted(set(metrics) - set(METRICS)))}")
+
+    skipped = [fmt for fmt in (args.formats or FORMATS) if fmt not in available_formats()]
+    if skipped:
+        print(f"ffmpeg not found, skipping {', '.join(skipped)}")
+    for metric, seconds in build(metrics, args.formats, args.workers).items():
+        print(f"{metric:<16} frames {seconds['frames_s']:6.1f} s, total {seconds['total_s']:6.1f} s")
+    for metric in metrics:
+        print(f"{metric:<16} {cached_animation(metric)}")
@@ -0,0 +1,101 @@
+"""Pre-populates the shared data, geometry and model caches after a deploy.
+
+Run `python streamlit/warmup.py` at boot, before `streamlit run` (e.g. as the deploy or container
+start hook): it runs every step, fills the on-disk caches in `.cache/` and prints how long every
+step took, so the first visitor finds them ready.
+
+In the app, `start()` also runs the cheap steps (the shared datasets, geometry, query tables and
+panel) in a background thread once per process; `instrumentation.start_run` calls it on the first
+page run unless `CO2_WARMUP=0`. The expensive model steps (bootstrap, time-lapse frames, Moran
+permutations, ...) are left to the boot run: in the app process they would take the CPU from the
+visitors it serves. Every analysis module is imported by its step, not when this module is.
+"""
+import os
+import time
+import importlib
+import threading
+import streamlit as st
+
+# Set CO2_WARMUP=0 to skip the background warm-up (e.g. when measuring cold starts)
+ENABLED = os.environ.get("CO2_WARMUP", "1") != "0"
+
+# Seconds per finished step and errors of failed steps, shown in the diagnostics view
+timings = {}
+errors = {}
+
+
+def _call(module, function, *args):
+    """A step calling `module.function(*args)`, importing the module when the step runs."""
+    return lambda: getattr(importlib.import_module(module), function)(*args)
+
+
+def _each(module, function, collection, *args):
+    """A step calling `module.function(item, *args)` for every item of `module.collection`."""
+    def step():
+        imported = importlib.import_module(module)
+        return [getattr(imported, function)(item, *args) for item in getattr(imported, collection)]
+    return step
+
+
+def _moran():
+    import spatial
+
+    return [spatial.moran(metric, kind) for metric in spatial.METRICS for kind in spatial.WEIGHTS]
+
+
+def steps(cheap_only=False):
+    """(name, callable) pairs in the order they are warmed, shared inputs first; the cheap ones
+    are run in the app process too."""
+    cheap = [
+        ("shared datasets", _call("shared_data", "publish")),
+        ("world geometry", _call("co2_data", "load_world")),
+        ("query tables", _each("co2_query", "metric", "METRICS")),
+        ("panel", _call("panel_regression", "gdp_panel")),
+    ]
+    if cheap_only:
+        return cheap
+    return cheap + [
+        ("event study", _call("event_study", "event_impact", 2015)),
+        ("sector correlations", _each("sector_correlation", "sector_correlations", "METHODS")),
+        ("distance matrices", _call("similarity", "distance_matrices")),
+        ("temperature bootstrap", _call("climate_response", "response_summary")),
+        ("distribution fits", _call("distribution_fits", "distribution_fits")),
+        ("time-lapse maps", _call("timelapse", "build")),
+        ("spatial autocorrelation", _moran),
+    ]
+
+
+def run(cheap_only=False):
+    for name, step in steps(cheap_only):
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as error:
+            # A failing step must not keep the others cold; the page itself will raise it again
+            errors[name] = repr(error)
+            continue
+        timings[name] = time.perf_counter() - start
+
+
+def _run_in_app():
+    # The geo stack is imported here, under the lock pages import it with, not on the request path
+    importlib.import_module("co2_data").import_geopandas()
+    run(cheap_only=True)
+
+
+@st.cache_resource
+def start():
+    """Warm the cheap caches in a daemon thread, once per process."""
+    if not ENABLED:
+        return None
+    thread = threading.Thread(target=_run_in_app, name="co2-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    run()
+    for name, seconds in timings.items():
+        print(f"{name:<30} {seconds:8.2f} s")
+    for name, error in errors.items():
+        print(f"{name:<30} failed: {error}")
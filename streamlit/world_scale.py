@@ -0,0 +1,147 @@
+"""Running the pages on the whole world or one region instead of Europe only.
+
+`select_scope` adds the country group picker to the sidebar; the choice is kept in the session, so
+every page that supports it opens on the same group. Going from Europe (~40 countries) to the world
+(~220) breaks a few things that were fine at small scale, and the helpers here cover them:
+
+- rankings pick the top k with a partial selection instead of sorting every country
+- bar charts show the top `MAX_BARS` countries and scatter plots label only the most extreme points
+- maps draw the shapes at a level of detail that matches the map's pixel size and skip shapes
+  outside the extent
+- clustering switches to mini-batch k-means for large groups
+"""
+import numpy as np
+import streamlit as st
+
+from functools import lru_cache
+
+import co2_data
+
+DEFAULT_SCOPE = "Europe"
+
+# (lon_min, lon_max, lat_min, lat_max) of the map of every scope
+EXTENTS = {
+    "Europe": (-25, 45, 34, 72),
+    "World": (-180, 180, -58, 84),
+    "Africa": (-20, 55, -36, 38),
+    "Asia": (25, 150, -12, 56),
+    "North America": (-170, -50, 5, 84),
+    "South America": (-85, -33, -57, 14),
+    "Oceania": (110, 180, -50, 0),
+}
+
+# Plural "countries" phrase of every scope, for titles
+COUNTRIES_LABELS = {
+    "Europe": "European countries",
+    "World": "countries of the world",
+    "Africa": "African countries",
+    "Asia": "Asian countries",
+    "North America": "North American countries",
+    "South America": "South American countries",
+    "Oceania": "countries of Oceania",
+}
+
+# Simplification tolerances in degrees; a map uses the coarsest one below its size of a pixel
+LEVELS_OF_DETAIL = (0.0, 0.02, 0.05, 0.1, 0.2)
+
+# Bar charts with more countries than this show the top ones only
+MAX_BARS = 40
+# Scatter plots with more points than this label only the `EXTREME_LABELS` most extreme ones
+MAX_LABELS = 40
+EXTREME_LABELS = 20
+# Above this many countries clustering uses mini-batch k-means
+MINI_BATCH_FROM = 1000
+
+
+def select_scope():
+    """Country group picked in the sidebar, 'Europe' until the user picks another one."""
+    # Streamlit drops the state of a widget on pages that do not show it, so the choice is kept
+    # under its own key and the picker starts from it on every page
+    if "scope_picker" not in st.session_state:
+        st.session_state["scope_picker"] = st.session_state.get("scope", DEFAULT_SCOPE)
+    scope = st.sidebar.selectbox("Countries", co2_data.SCOPES, key="scope_picker")
+    st.session_state["scope"] = scope
+    return scope
+
+
+def countries_label(scope):
+    """'European countries', 'countries of the world', ..., for titles."""
+    return COUNTRIES_LABELS[scope]
+
+
+def place_label(scope):
+    """'Europe', 'the world' or the region, for 'in ...' phrases."""
+    return "the world" if scope == "World" else scope
+
+
+def top_k(values, k, largest=True):
+    """Positions of the k largest (or smallest) values, in order; NaNs are never picked.
+
+    `np.argpartition` selects them in linear time and only the k picked values are sorted.
+    """
+    values = np.asarray(values, dtype=float)
+    key = -values if largest else values
+    valid = np.flatnonzero(~np.isnan(key))
+    k = min(k, len(valid))
+    if k == 0:
+        return valid[:0]
+    picked = valid[np.argpartition(key[valid], k - 1)[:k]]
+    return picked[np.argsort(key[picked], kind="stable")]
+
+
+def bar_rows(df, column, largest=True):
+    """Rows of `df` for a ranked bar chart: all of them when they fit, else the top `MAX_BARS`."""
+    return df.iloc[top_k(df[column].to_numpy(), MAX_BARS if len(df) > MAX_BARS else len(df), largest)]
+
+
+def label_positions(x, y):
+    """Points of a scatter plot that get a text label: all of them for small groups, otherwise the
+    `EXTREME_LABELS` farthest from the median in standardised units."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) <= MAX_LABELS:
+        return np.arange(len(x))
+    spread = [(values - np.nanmedian(values)) / (np.nanstd(values) or 1) for values in (x, y)]
+    return np.sort(top_k(np.hypot(*spread), EXTREME_LABELS))
+
+
+def kmeans(n_clusters, n_rows, random_state=42):
+    """K-means estimator for `n_rows` countries; mini-batch above `MINI_BATCH_FROM` rows and never
+    more clusters than countries (small regions can have only a few with data)."""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    n_clusters = min(n_clusters, max(n_rows, 1))
+
+    if n_rows > MINI_BATCH_FROM:
+        return MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3, batch_size=1024)
+    return KMeans(n_clusters=n_clusters, random_state=random_state)
+
+
+@lru_cache(maxsize=None)
+def simplified_world(tolerance):
+    """Natural Earth shapes simplified to `tolerance` degrees, once per process; read-only."""
+    world = co2_data.load_world()
+    if tolerance == 0:
+        return world
+    world = world.copy()
+    world['geometry'] = world.geometry.simplify(tolerance, preserve_topology=True)
+    return world
+
+
+def scope_shapes(scope, width_px=1000):
+    """Shapes for a map of `scope` about `width_px` pixels wide: the coarsest level of detail whose
+    error stays below a pixel, without the countries outside the map."""
+    lon_min, lon_max, lat_min, lat_max = EXTENTS[scope]
+    degrees_per_pixel = (lon_max - lon_min) / width_px
+    tolerance = max(level for level in LEVELS_OF_DETAIL if level <= degrees_per_pixel)
+    return simplified_world(tolerance).cx[lon_min:lon_max, lat_min:lat_max]
+
+
+def scope_map(ax, values, scope, width_px=1000, **plot_kwds):
+    """Draw `values` (a Series indexed by ISO3 code) on the map of `scope`."""
+    shapes = scope_shapes(scope, width_px)
+    shapes = shapes.assign(value=shapes['ADM0_A3'].map(values)).dropna(subset=['value'])
+    shapes.plot(column='value', ax=ax, **plot_kwds)
+    lon_min, lon_max, lat_min, lat_max = EXTENTS[scope]
+    ax.set_xlim(lon_min, lon_max)
+    ax.set_ylim(lat_min, lat_max)
+    ax.axis('off')